@@ -4,21 +4,9 @@ from argparse import ArgumentParser
 from os.path import realpath, join, dirname
 from sys import path, exit
 
-from PyQt4.QtCore import (QSettings,
-                          Qt,
-                          )
-from PyQt4.QtGui import (QApplication,
-                         QDockWidget,
-                         QMainWindow,
-                         )
-
-settings = QSettings("OpBox", "OpBox")
-VERSION = 2
-
 # ADD MODULE
 opbox_path = realpath(join(dirname(realpath(__file__)), '..'))
-path.append(opbox_path)
-from OpBoxPhys.ui import ControlPanel, Traces
+path.insert(0, opbox_path)  # before this folder, which has OpBoxPhys.py
 
 
 def _count_channels(analoginput):
@@ -27,25 +15,74 @@ def _count_channels(analoginput):
     Parameters
     ----------
     analoginput : str
-        string with the analog names ('0:1' or '0')
+        string with the analog names ('0:1' or '0' or '0:7,16:23')
 
     Returns
     -------
     int
         number of channels
     """
-    s = analoginput.split(':')
-    return int(s[-1]) - int(s[0]) + 1
+    if analoginput is None:
+        return 0
+    n_chan = 0
+    for one in analoginput.split(','):
+        s = one.split(':')
+        n_chan += int(s[-1]) - int(s[0]) + 1
+    return n_chan
 
 
 # INPUT ARGUMENTS
 parser = ArgumentParser(prog='OpBox',
                         description='GUI to interact with NI DAQ')
-parser.add_argument('-d', '--dev', required=True,
+parser.add_argument('-d', '--dev',
                     help='Device name (such as ''Dev1'' or ''Dev2'')')
-parser.add_argument('-a', '--analoginput', required=True,
+parser.add_argument('-a', '--analoginput',
                     help=('Analog channels to read (such as ''0:2'' for the ' +
-                          'first three channels)'))
+                          'first three channels or ''0:7,16:23'')'))
+parser.add_argument('--digitalinput',
+                    help=('Digital lines of port0 to read (such as ''0:31'')'))
+parser.add_argument('--slave',
+                    help=('Name of the slave device, which uses the sample '
+                          'clock of the master device (such as ''Dev2'')'))
+parser.add_argument('--slave_analoginput',
+                    help='Analog channels to read on the slave device')
+parser.add_argument('--slave_digitalinput',
+                    help='Digital lines of port0 to read on the slave device')
+parser.add_argument('--digital_mode', default='line', choices=('line', 'port'),
+                    help=('Read the digital inputs as one channel per line '
+                          '(''line'') or as one word per port (''port''), '
+                          'which is unpacked into lines only for display '
+                          '(default: line)'))
+parser.add_argument('--headless', action='store_true',
+                    help=('Record without the GUI (only the acquisition, EDF, '
+                          'detection and stream), until Ctrl+C'))
+parser.add_argument('--status_interval', type=float, default=10,
+                    help=('How often (in s) to print the state of the '
+                          'acquisition, with --headless (default: 10)'))
+parser.add_argument('--duration', type=float, default=0,
+                    help=('Stop after this duration (in s), with --headless, '
+                          '0 to record until Ctrl+C (default: 0)'))
+parser.add_argument('--process', action='store_true',
+                    help=('Acquire the data and write the EDF file in a '
+                          'separate process, which shares the data with the '
+                          'GUI through shared memory'))
+parser.add_argument('--shared_slots', type=int, default=32,
+                    help=('Number of buffers in shared memory, with '
+                          '--process (default: 32)'))
+parser.add_argument('--stream',
+                    help=('Send the data to other programs through a socket: '
+                          'host:port for TCP (such as localhost:5555) or the '
+                          'path of a Unix socket'))
+parser.add_argument('--stream_queue', type=int, default=20,
+                    help=('Maximum number of buffers waiting to be sent to '
+                          'each client, the others are dropped (default: 20)'))
+parser.add_argument('--metrics_csv',
+                    help=('Filename of the CSV file with the timing and state '
+                          'of the acquisition for each buffer'))
+parser.add_argument('--backend', default='daqmx', choices=('daqmx', 'sim'),
+                    help=('Library to acquire the data: NI devices (''daqmx'') '
+                          'or simulated device with synthetic signals (''sim'')'
+                          ' (default: daqmx)'))
 parser.add_argument('--s_freq', type=int, default=1000,
                     help='Sampling frequency (default: 1000)')
 parser.add_argument('--buffer_size', type=float, default=0.1,
@@ -58,48 +95,188 @@ parser.add_argument('--minval', type=float, default=-1,
                           'measure.'))
 parser.add_argument('--window_size', type=float, default=5,
                     help='The lenght (in s) of the window to display')
+parser.add_argument('--display', default='scroll', choices=('scroll', 'sweep'),
+                    help=('Scroll the traces with the most recent samples on '
+                          'the right (''scroll'') or draw them from left to '
+                          'right like an oscilloscope (''sweep'') '
+                          '(default: scroll)'))
+parser.add_argument('--refresh', type=float, default=30,
+                    help=('How often (in Hz) to redraw the traces '
+                          '(default: 30)'))
+parser.add_argument('--fft_length', type=float, default=1,
+                    help=('Duration (in s) of the segments to compute the '
+                          'spectrum (default: 1)'))
+parser.add_argument('--fft_refresh', type=float, default=2,
+                    help='How often (in Hz) to update the spectrum (default: 2)')
+parser.add_argument('--filter',
+                    help=('Filters for the display of the analog channels, '
+                          'separated by comma (such as ''notch:60,highpass:1'' '
+                          'or ''bandpass:300:6000'')'))
+parser.add_argument('--detect', type=float,
+                    help=('Detect events (such as spikes) when the analog '
+                          'channels cross this threshold, in standard '
+                          'deviations (such as -4.5 to detect negative '
+                          'spikes)'))
+parser.add_argument('--detect_filter',
+                    help=('Filters for the detection of the events, as in '
+                          '--filter (such as ''highpass:300'')'))
+parser.add_argument('--refractory', type=float, default=1,
+                    help=('Minimum time (in ms) between two events in the same '
+                          'channel (default: 1)'))
+parser.add_argument('--events_max', type=int, default=100,
+                    help=('Maximum number of events per second in the EDF+ '
+                          'annotations (default: 100)'))
+parser.add_argument('--average',
+                    help=('Digital lines (index among all the digital lines, '
+                          'master first, such as \'0,3\' or \'0:3\') whose '
+                          'edges trigger the average of the analog channels, '
+                          'one average for each line (default: none)'))
+parser.add_argument('--average_edge', default='rising',
+                    choices=('rising', 'falling', 'both'),
+                    help='Which edges trigger the average (default: rising)')
+parser.add_argument('--average_pre', type=float, default=0.1,
+                    help=('Duration (in s) of the epoch before the edge '
+                          '(default: 0.1)'))
+parser.add_argument('--average_post', type=float, default=0.5,
+                    help=('Duration (in s) of the epoch after the edge '
+                          '(default: 0.5)'))
+parser.add_argument('--calibration',
+                    help=('CSV file with one row for each analog channel '
+                          '(master first) and the columns label, unit, '
+                          'minval, maxval (input range in V), gain and offset '
+                          '(physical value = gain * V + offset), all '
+                          'optional'))
+parser.add_argument('--raw', action='store_true',
+                    help=('Read the counts of the ADC (int16) and write them '
+                          'to EDF without conversion, only the display '
+                          'converts them to V'))
 parser.add_argument('--timeout', type=float, default=10,
                     help=('The amount of time, in seconds, to wait for the '
                           'function to read the samples.'))
 parser.add_argument('--edf',
                     help='Filename of the EDF file to create')
-args = parser.parse_args()
-args.n_chan = _count_channels(args.analoginput)
+parser.add_argument('--file_format', default='edf',
+                    choices=('edf', 'flat', 'archive'),
+                    help=('Format of the file: EDF, flat binary with a '
+                          'JSON sidecar, for high sampling frequencies and '
+                          'many channels, or compressed archive with an '
+                          'index (default: edf)'))
+parser.add_argument('--archive_codec', default='zlib', choices=('zlib', 'lzma'),
+                    help=('Compression of the archive (default: zlib)'))
+parser.add_argument('--archive_level', type=int, default=6,
+                    help=('Compression level of the archive, from 0 to 9 '
+                          '(default: 6)'))
+parser.add_argument('--archive_chunk', type=int, default=10,
+                    help=('Duration, in s, of the chunks of the archive which '
+                          'are compressed together (default: 10)'))
+parser.add_argument('--archive_workers', type=int, default=2,
+                    help=('Number of processes which compress the archive '
+                          '(default: 2)'))
+parser.add_argument('--play',
+                    help=('EDF file to play back instead of acquiring from '
+                          '--dev'))
+parser.add_argument('--speed', type=float, default=1,
+                    help=('How many times faster than real time to play back '
+                          'the EDF file, 0 for as fast as possible '
+                          '(default: 1)'))
+parser.add_argument('--edf_flush', type=int, default=1,
+                    help=('Flush the EDF file every N records, 0 to let the '
+                          'operating system decide (default: 1)'))
+parser.add_argument('--edf_fsync', type=int, default=0,
+                    help=('Force the EDF file to disk (fsync) every N records, '
+                          '0 to never force it (default: 0)'))
+parser.add_argument('--edf_filter',
+                    help=('Filters for the analog channels before writing '
+                          'them to EDF, as in --filter (default: no filters)'))
+parser.add_argument('--edf_header', type=int, default=10,
+                    help=('Update the number of records in the EDF header '
+                          'every N records, 0 to update it only when closing '
+                          'the file (default: 10)'))
+parser.add_argument('--edf_prealloc', type=float, default=0,
+                    help=('Preallocate the EDF file in extents of this size '
+                          '(in MB), 0 to not preallocate (default: 0)'))
+parser.add_argument('--edf_segment', type=float, default=0,
+                    help=('Start a new EDF file (rec_000.edf, rec_001.edf, '
+                          '...) every N seconds, 0 for one file '
+                          '(default: 0)'))
+parser.add_argument('--edf_segment_size', type=float, default=0,
+                    help=('Start a new EDF file when it reaches this size '
+                          '(in MB), 0 for no limit (default: 0)'))
+parser.add_argument('--edf_queue', type=int, default=50,
+                    help=('Maximum number of buffers waiting to be written to '
+                          'the EDF file (default: 50)'))
+parser.add_argument('--edf_policy', default='block',
+                    choices=('block', 'grow', 'spill'),
+                    help=('What to do when the disk falls behind and the queue '
+                          'is full: wait (''block''), let the queue grow '
+                          '(''grow'') or drop the buffer (''spill'') '
+                          '(default: block)'))
+parser.add_argument('--pyramid',
+                    help=('Also write the min and max of the recordings every '
+                          'N samples, for the overview, such as '
+                          '\'10,100,1000\' (default: none)'))
+parser.add_argument('--overview',
+                    help=('Recordings (written with --pyramid) to review '
+                          'instead of acquiring'))
 
 
-class MainWindow(QMainWindow):
-    """Main Window that holds all the widgets (traces with raw signal, camera
-    and other behavioral data.)"""
-    def __init__(self):
-        super().__init__()
+def parse_args():
+    """Parse the arguments and compute the number of channels.
 
-        daq = Traces(args)
-        dock_daq = QDockWidget('DAQ', self)
-        dock_daq.setWidget(daq)
-        dock_daq.setObjectName('DAQ')
-        dock_daq.setFeatures(QDockWidget.DockWidgetMovable)
-        self.addDockWidget(Qt.TopDockWidgetArea, dock_daq)
+    Returns
+    -------
+    argparse.Namespace
+        arguments specified by the user, with n_chan
+    """
+    args = parser.parse_args()
+    if args.overview is not None:
+        return args
+    if args.headless and args.process:
+        parser.error('--process is only for the GUI (--headless already '
+                     'records without it)')
+    if args.play is not None:
+        from OpBoxPhys.rw.playback import playback_args
+        playback_args(args)
+    elif args.dev is None or args.analoginput is None:
+        parser.error('the following arguments are required: -d/--dev, '
+                     '-a/--analoginput (or --play)')
+    else:
+        if args.digital_mode == 'port':
+            _count_digital = lambda x: 0 if x is None else 1
+        else:
+            _count_digital = _count_channels
+        args.n_chan = (_count_channels(args.analoginput) +
+                       _count_digital(args.digitalinput))
+        if args.slave is not None:
+            args.n_chan += (_count_channels(args.slave_analoginput) +
+                            _count_digital(args.slave_digitalinput))
 
-        widgets = {'daq': daq,
-                   }
-        self.controlpanel = ControlPanel(widgets)
-        self.setCentralWidget(self.controlpanel)
+    if args.average is not None:
+        from OpBoxPhys.rw.digital import digital_ports, expand_lines
+        n_lines = sum(len(lines) for lines in digital_ports(args))
+        if n_lines == 0:
+            parser.error('--average needs digital lines (--digitalinput or '
+                         '--slave_digitalinput)')
+        if max(expand_lines(args.average)) >= n_lines:
+            parser.error('--average should be the index of the digital lines, '
+                         'from 0 to {}'.format(n_lines - 1))
+    return args
 
-        window_geometry = settings.value('window/geometry')
-        if window_geometry is not None:
-            self.restoreGeometry(window_geometry)
-        window_state = settings.value('window/state')
-        if window_state is not None:
-            self.restoreState(window_state, float(VERSION))
 
-    def closeEvent(self, event):
-        settings.setValue('window/geometry', self.saveGeometry())
-        settings.setValue('window/state', self.saveState(float(VERSION)))
-        event.accept()
+if __name__ == '__main__':
+    args = parse_args()
+    if args.headless:
+        from OpBoxPhys.rw.recorder import record
+        exit(record(args))
 
+    # the GUI is imported only when it's needed
+    from PyQt4.QtGui import QApplication
+    from OpBoxPhys.ui import MainWindow, Overview
 
-if __name__ == '__main__':
     app = QApplication([])
-    window = MainWindow()
+    if args.overview is not None:
+        window = Overview(args.overview)
+    else:
+        window = MainWindow(args)
     window.show()
     exit(app.exec_())
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""Benchmark of the acquisition (simulated device), EDF and display, for a
+range of number of channels, sampling frequencies and buffer sizes.
+
+Each configuration runs in a separate process for --duration seconds, in real
+time: the reader is DAQmxReader with the simulated backend, EDF is written by
+ExportEdf in AsyncWriter, and the display path is Traces (with --qt) or,
+without Qt, the same processing that Traces does (RingBuffer, Spectrum and
+minmax) without drawing.
+
+The results are written as JSON (one line per configuration, with the
+versions of the packages), so that they can be compared between versions.
+"""
+from argparse import ArgumentParser, Namespace
+from json import dumps
+from multiprocessing import get_context
+from os.path import realpath, join, dirname
+from platform import platform, python_version
+from queue import Empty, Queue
+try:
+    from resource import getrusage, RUSAGE_SELF
+except ImportError:  # Windows
+    getrusage = None
+from shutil import rmtree
+from subprocess import check_output, CalledProcessError
+from sys import path, stdout
+from tempfile import mkdtemp
+from time import perf_counter, sleep, thread_time, time
+
+# ADD MODULE
+opbox_path = realpath(join(dirname(realpath(__file__)), '..', '..'))
+path.insert(0, opbox_path)
+
+CHANNELS = [16, 32, 64, 96, 128, 256]
+S_FREQ = [1000, 5000, 10000, 20000, 30000, 50000]
+BUFFER_SIZE = [0.05, 0.1, 0.2]
+PLOT_WIDTH = 1000  # pixels, for the min/max decimation without Qt
+EXTENSIONS = {'edf': 'edf', 'flat': 'bin', 'archive': 'arc'}
+
+
+def _make_args(n_chan, s_freq, buffer_size, edf, filters=None, raw=False,
+               file_format='edf'):
+    """Arguments as they are created by OpBoxPhys.py (filters are used both
+    for display and EDF)"""
+    return Namespace(backend='sim', dev='Dev1',
+                     analoginput='0:{}'.format(n_chan - 1),
+                     digitalinput=None, slave=None, slave_analoginput=None,
+                     slave_digitalinput=None, digital_mode='line',
+                     n_chan=n_chan, s_freq=s_freq, buffer_size=buffer_size,
+                     minval=-1, maxval=1, calibration=None, raw=raw,
+                     timeout=10, window_size=5, display='scroll', refresh=30,
+                     fft_length=1, fft_refresh=2, filter=filters, detect=None,
+                     detect_filter=None, refractory=1, events_max=100,
+                     edf=edf, file_format=file_format, archive_codec='zlib',
+                     archive_level=6, archive_chunk=10, archive_workers=2,
+                     edf_flush=1,
+                     edf_fsync=0, edf_filter=filters, edf_header=10,
+                     edf_prealloc=0, edf_segment=0, edf_segment_size=0,
+                     edf_queue=50, edf_policy='block', pyramid=None,
+                     average=None, average_edge='rising', average_pre=0.1,
+                     average_post=0.5,
+                     process=False, shared_slots=32, stream=None,
+                     stream_queue=20, metrics_csv=None)
+
+
+class _Stage():
+    """Keep track of the CPU time of one stage."""
+    def __init__(self):
+        self.cpu = 0.
+        self.calls = 0
+
+    def wrap(self, funct):
+        def timed(*args):
+            t0 = thread_time()
+            out = funct(*args)
+            self.cpu += thread_time() - t0
+            self.calls += 1
+            return out
+        return timed
+
+
+def run_one(n_chan, s_freq, buffer_size, duration, qt, filters=None,
+            raw=False, file_format='edf'):
+    """Run one configuration in real time.
+
+    Returns
+    -------
+    dict
+        results (see main)
+    """
+    from OpBoxPhys.rw import DAQmxReader
+
+    tmp_dir = mkdtemp()
+    edf = join(tmp_dir, 'bench.' + EXTENSIONS[file_format])
+    args = _make_args(n_chan, s_freq, buffer_size, edf, filters, raw,
+                      file_format)
+    stages = {name: _Stage() for name in ('acquisition', 'edf', 'display')}
+
+    frames = Queue()
+    reader = DAQmxReader(args, lambda data, t: frames.put((data, t)))
+    reader.MasterATask.EveryNCallback = stages['acquisition'].wrap(
+        reader.EveryNCallback)
+    if args.edf is not None:
+        reader.edf.writer.write = stages['edf'].wrap(reader.edf.writer.write)
+
+    if qt:
+        from PyQt4.QtGui import QApplication
+        from OpBoxPhys.ui import Traces
+        app = QApplication([])
+        traces = Traces(args)
+        traces.obj = Namespace(reader=reader)
+        traces.resize(PLOT_WIDTH, 800)
+        traces.show()
+        display_filter = traces.filter
+
+        def plot_data(data, t):
+            traces.plot_data(data, t)
+
+        def render():
+            traces.render()
+            app.processEvents()
+
+        def update_psd():
+            psd = traces.spectrum.update()
+            if psd is not None:
+                traces.figure.update_psd(traces.spectrum.freq, psd)
+
+    else:
+        from numpy import arange
+        from OpBoxPhys.proc import FilterBank, RingBuffer, Spectrum, minmax
+        ring = RingBuffer(n_chan, int(args.window_size * s_freq))
+        display_filter = None
+        if filters is not None:
+            display_filter = FilterBank(n_chan, s_freq, filters)
+        spectrum = Spectrum(n_chan, s_freq, int(args.fft_length * s_freq))
+        x_axis = arange(0, args.window_size, 1 / s_freq)[:ring.n_smp]
+
+        def plot_data(data, t):
+            frame = data
+            if reader.raw is not None:
+                data = reader.raw.physical(frame)
+            if display_filter is not None:
+                data = display_filter.apply(data)
+            ring.write(data)
+            spectrum.push(data)
+            reader.pool.release(frame)
+
+        def render():
+            minmax(x_axis, ring.unrolled(), PLOT_WIDTH)
+
+        def update_psd():
+            spectrum.update()
+
+    plot_data = stages['display'].wrap(plot_data)
+    render = stages['display'].wrap(render)
+    update_psd = stages['display'].wrap(update_psd)
+
+    max_latency = 0.
+    t_render = t_psd = 0.
+    t0 = perf_counter()
+    reader.StartTask()
+    while perf_counter() - t0 < duration:
+        try:
+            data, t = frames.get(timeout=0.01)
+        except Empty:
+            pass
+        else:
+            plot_data(data, t)
+            max_latency = max(max_latency, time() - t)
+
+        now = perf_counter()
+        if now - t_render > 1 / args.refresh:
+            render()
+            t_render = now
+        if now - t_psd > 1 / args.fft_refresh:
+            update_psd()
+            t_psd = now
+
+    reader.StopTask()
+    elapsed = perf_counter() - t0
+    backlog = frames.qsize()
+    writer = None
+    if reader.edf is not None:
+        writer = reader.edf.stats()
+        reader.edf.close()
+    reader.ClearTask()
+    sleep(0.1)
+    rmtree(tmp_dir)
+
+    metrics = reader.metrics.summary()
+    task = metrics['tasks']['master AI']
+    n_smp = task['read']
+    realtime = (task['errors'] == 0 and
+                task['backlog'] <= 2 * reader.buffer_size and
+                (writer is None or (writer['blocked'] == 0 and
+                                    writer['dropped'] == 0 and
+                                    writer['depth'] <= 2)) and
+                backlog <= 2)
+
+    data_duration = max(n_smp / s_freq, 1e-9)
+    return {'n_chan': n_chan,
+            's_freq': s_freq,
+            'buffer_size': buffer_size,
+            'qt': qt,
+            'raw': raw,
+            'file_format': file_format,
+            'realtime': realtime,
+            'throughput': n_smp * n_chan / elapsed,  # samples per second
+            'cpu': {name: stage.cpu / data_duration
+                    for name, stage in stages.items()},  # s per s of data
+            'callback_max_duration': metrics['max_duration'],
+            'callback_max_jitter': metrics['max_jitter'],
+            'errors': task['errors'],
+            'overflows': task['overflows'],
+            'max_backlog': task['max_backlog'],
+            'edf': writer,
+            'display_filter': (None if display_filter is None else
+                               display_filter.stats()),
+            'edf_filter': (None if reader.edf is None or
+                           reader.edf.filter is None else
+                           reader.edf.filter.stats()),
+            'display_backlog': backlog,
+            'display_max_latency': max_latency,
+            'peak_rss_mb': _peak_rss_mb(),
+            }
+
+
+def _peak_rss_mb():
+    """Peak memory of the process, in MB (None if it cannot be measured)."""
+    if getrusage is not None:
+        return getrusage(RUSAGE_SELF).ru_maxrss / 1024
+    try:
+        from psutil import Process
+    except ImportError:
+        return None
+    memory = Process().memory_info()
+    return getattr(memory, 'peak_wset', memory.rss) / 1024 ** 2
+
+
+def _worker(conn, *args):
+    try:
+        conn.send(run_one(*args))
+    except Exception as err:
+        conn.send({'error': repr(err)})
+
+
+def _versions():
+    import numpy
+    try:
+        commit = check_output(['git', 'describe', '--always', '--dirty'],
+                              cwd=dirname(realpath(__file__))).decode().strip()
+    except (CalledProcessError, OSError):
+        commit = None
+    return {'commit': commit,
+            'python': python_version(),
+            'numpy': numpy.__version__,
+            'platform': platform(),
+            }
+
+
+def main():
+    parser = ArgumentParser(prog='throughput',
+                            description=('Benchmark of acquisition, EDF and '
+                                         'display with the simulated device'))
+    parser.add_argument('--channels', type=int, nargs='+', default=CHANNELS,
+                        help='Number of channels (default: 16 to 256)')
+    parser.add_argument('--s_freq', type=int, nargs='+', default=S_FREQ,
+                        help='Sampling frequencies (default: 1000 to 50000)')
+    parser.add_argument('--buffer_size', type=float, nargs='+',
+                        default=BUFFER_SIZE,
+                        help='Duration of the buffer in s (default: 0.05 to 0.2)')
+    parser.add_argument('--duration', type=float, default=3,
+                        help='Duration (in s) of each configuration (default: 3)')
+    parser.add_argument('--filter',
+                        help=('Filters for display and EDF, such as '
+                              '\'notch:60,highpass:1\' (default: none)'))
+    parser.add_argument('--raw', action='store_true',
+                        help='Read and write the counts of the ADC (int16)')
+    parser.add_argument('--file_format', default='edf',
+                        choices=('edf', 'flat', 'archive'),
+                        help='Format of the file (default: edf)')
+    parser.add_argument('--qt', action='store_true',
+                        help='Draw the traces with Traces (needs a display)')
+    parser.add_argument('--output',
+                        help='JSON file with the results (default: stdout)')
+    args = parser.parse_args()
+
+    out = stdout if args.output is None else open(args.output, 'w')
+    out.write(dumps({'versions': _versions()}) + '\n')
+
+    ctx = get_context('spawn')
+    first_failure = None
+    for buffer_size in args.buffer_size:
+        for n_chan in args.channels:
+            for s_freq in args.s_freq:
+                conn, child_conn = ctx.Pipe()
+                p = ctx.Process(target=_worker,
+                                args=(child_conn, n_chan, s_freq, buffer_size,
+                                      args.duration, args.qt, args.filter,
+                                      args.raw, args.file_format))
+                p.start()
+                p.join()
+                if conn.poll():
+                    result = conn.recv()
+                else:
+                    result = {'error': 'exit code {}'.format(p.exitcode)}
+                result.update({'n_chan': n_chan, 's_freq': s_freq,
+                               'buffer_size': buffer_size})
+
+                if first_failure is None and not result.get('realtime'):
+                    first_failure = {'n_chan': n_chan, 's_freq': s_freq,
+                                     'buffer_size': buffer_size}
+                out.write(dumps(result) + '\n')
+                out.flush()
+
+    out.write(dumps({'first_failure': first_failure}) + '\n')
+    if out is not stdout:
+        out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+"""Processing of the recordings (independent of Qt, so that it can be used
+without the GUI).
+"""
+from .ring import RingBuffer
+from .average import EventAverager
+from .decimate import MinMaxPyramid, minmax
+from .detect import Detector
+from .filters import FilterBank
+from .spectrum import Spectrum
@@ -0,0 +1,214 @@
+from time import perf_counter
+
+from numpy import (arange, argsort, concatenate, empty, int64, multiply,
+                   nonzero, sqrt, subtract, zeros)
+
+from .ring import RingBuffer
+
+
+def find_edges(lines, previous, edge='rising'):
+    """Find the edges in the digital lines, in all the lines at once.
+
+    Parameters
+    ----------
+    lines : ndarray
+        n_lines X n_samples matrix (0 or 1)
+    previous : ndarray
+        boolean vector with the value of each line at the last sample of the
+        previous buffer
+    edge : str
+        'rising', 'falling' or 'both'
+
+    Returns
+    -------
+    ndarray
+        index of the line of each edge
+    ndarray
+        sample (in the buffer) of each edge, sorted
+    ndarray
+        value of each line at the last sample (the next previous)
+    """
+    high = lines != 0
+    before = empty(high.shape, dtype=bool)
+    before[:, 0] = previous
+    before[:, 1:] = high[:, :-1]
+    if edge == 'rising':
+        changed = high & ~before
+    elif edge == 'falling':
+        changed = before & ~high
+    else:
+        changed = high != before
+    line, smp = nonzero(changed)  # sorted by line, then sample
+    order = argsort(smp, kind='stable')
+    return line[order], smp[order], high[:, -1].copy()
+
+
+class EventAverager():
+    """Average the epochs of the analog channels around the edges of some
+    digital lines, with one average (and variance) for each line.
+
+    Parameters
+    ----------
+    n_chan : int
+        number of analog channels
+    n_lines : int
+        number of digital lines (one condition for each line)
+    s_freq : float
+        sampling frequency
+    pre, post : float
+        duration (in s) of the epoch before and after the edge
+    edge : str
+        'rising', 'falling' or 'both' (see find_edges)
+    buffer_size : int
+        maximum number of samples in each call to push (larger buffers are
+        processed in parts)
+
+    Attributes
+    ----------
+    time : ndarray
+        time (in s) of each sample of the epoch, relative to the edge
+    count : ndarray
+        number of epochs of each condition
+
+    Notes
+    -----
+    The samples before the edge come from a history ring of the analog
+    channels, which keeps the duration of one epoch plus one buffer. An
+    epoch is averaged once all its samples have arrived (post after the
+    edge), by adding it (without copying it out of the ring) to the sum and
+    the sum of squares of its condition, so the cost is constant for each
+    epoch and does not depend on the number of epochs. The sums are of the
+    difference from the first epoch of the condition (shifted data), so that
+    the variance remains accurate when the signal has a large offset. The
+    edges whose epoch starts before the beginning of the acquisition are
+    skipped.
+    """
+    def __init__(self, n_chan, n_lines, s_freq, pre, post, edge='rising',
+                 buffer_size=None):
+        self.n_chan = n_chan
+        self.n_lines = n_lines
+        self.edge = edge
+        self.n_pre = int(round(pre * s_freq))
+        self.n_times = self.n_pre + int(round(post * s_freq))
+        self.time = (arange(self.n_times) - self.n_pre) / s_freq
+        if buffer_size is None:
+            buffer_size = int(s_freq)
+        self.buffer_size = buffer_size
+        self.history = RingBuffer(n_chan, self.n_times + buffer_size)
+
+        self.count = zeros(n_lines, dtype=int64)
+        self.shift = zeros((n_lines, n_chan, self.n_times))
+        self.sum = zeros((n_lines, n_chan, self.n_times))
+        self.sum2 = zeros((n_lines, n_chan, self.n_times))
+        self.work = empty((n_chan, self.n_times))
+
+        self.previous = zeros(n_lines, dtype=bool)
+        self.pending_start = empty(0, dtype=int64)  # first sample of epoch
+        self.pending_line = empty(0, dtype=int64)
+        self.n_smp = 0  # samples since the beginning
+        self.n_skipped = 0
+
+        self.cost = 0.
+        self.mean_cost = 0.
+        self.max_cost = 0.
+        self.n_calls = 0
+
+    @property
+    def mean(self):
+        """Average of each condition (n_lines X n_chan X n_times, 0 if
+        there are no epochs)."""
+        n = self.count.clip(1)[:, None, None]
+        return self.shift + self.sum / n
+
+    @property
+    def var(self):
+        """Variance of each condition (n_lines X n_chan X n_times, 0 if
+        there are fewer than two epochs)."""
+        n = self.count.clip(1)[:, None, None]
+        m2 = (self.sum2 - self.sum ** 2 / n).clip(0)
+        return m2 / (n - 1).clip(1)
+
+    @property
+    def sem(self):
+        """Standard error of the mean of each condition."""
+        return sqrt(self.var / self.count.clip(1)[:, None, None])
+
+    def push(self, analog, lines):
+        """Find the edges in the buffer and average the epochs which are
+        complete.
+
+        Parameters
+        ----------
+        analog : ndarray
+            n_chan X n_samples matrix with the analog channels
+        lines : ndarray
+            n_lines X n_samples matrix with the digital lines (0 or 1)
+        """
+        t0 = perf_counter()
+        line, smp, self.previous = find_edges(lines, self.previous,
+                                              self.edge)
+        start = smp + self.n_smp - self.n_pre
+        early = start < 0
+        self.n_skipped += int(early.sum())
+        self.pending_start = concatenate((self.pending_start, start[~early]))
+        self.pending_line = concatenate((self.pending_line, line[~early]))
+
+        n_smp = analog.shape[1]
+        for i in range(0, n_smp, self.buffer_size):
+            part = analog[:, i:i + self.buffer_size]
+            self.history.write(part)
+            self.n_smp += part.shape[1]
+            self._average()
+
+        self.cost = perf_counter() - t0
+        self.n_calls += 1
+        self.mean_cost += (self.cost - self.mean_cost) / self.n_calls
+        self.max_cost = max(self.max_cost, self.cost)
+
+    def _average(self):
+        """Add the epochs which are complete to the averages."""
+        done = self.pending_start + self.n_times <= self.n_smp
+        if not done.any():
+            return
+        start = self.pending_start[done]
+        line = self.pending_line[done]
+        self.pending_start = self.pending_start[~done]
+        self.pending_line = self.pending_line[~done]
+
+        ring = self.history.data
+        work = self.work
+        for s, i in zip((start % self.history.n_smp).tolist(), line.tolist()):
+            end = s + self.n_times
+            if end <= ring.shape[1]:
+                epoch = ring[:, s:end]
+            else:  # it wraps around the end of the ring
+                epoch = work
+                first = ring.shape[1] - s
+                epoch[:, :first] = ring[:, s:]
+                epoch[:, first:] = ring[:, :end - ring.shape[1]]
+            if self.count[i] == 0:
+                self.shift[i] = epoch
+            subtract(epoch, self.shift[i], out=work)
+            self.sum[i] += work
+            multiply(work, work, out=work)
+            self.sum2[i] += work
+            self.count[i] += 1
+
+    def stats(self):
+        """Number of epochs and time spent averaging them.
+
+        Returns
+        -------
+        dict
+            'epochs' (number of epochs of each condition), 'pending' (epochs
+            which are not complete yet), 'skipped' (edges too close to the
+            beginning), 'cost', 'mean_cost' and 'max_cost' (in s, for one
+            buffer).
+        """
+        return {'epochs': self.count.tolist(),
+                'pending': len(self.pending_start),
+                'skipped': self.n_skipped,
+                'cost': self.cost,
+                'mean_cost': self.mean_cost,
+                'max_cost': self.max_cost,
+                }
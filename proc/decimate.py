@@ -0,0 +1,139 @@
+from numpy import arange, ascontiguousarray, concatenate, empty, fmax, fmin
+
+
+def minmax(x_axis, data, n_cols):
+    """Reduce the data to the min and max of each column of pixels, so that
+    the spikes remain visible.
+
+    Parameters
+    ----------
+    x_axis : ndarray
+        vector with the time of each sample
+    data : ndarray
+        n_chan X n_samples matrix
+    n_cols : int
+        number of columns of pixels
+
+    Returns
+    -------
+    ndarray
+        vector with 2 * n_cols values: the time of the first sample of each
+        column, repeated twice
+    ndarray
+        n_chan X (2 * n_cols) matrix, with the min and max of each column
+        alternating. If there are fewer samples than 2 * n_cols, x_axis and
+        data are returned without decimation.
+
+    Notes
+    -----
+    NaN are ignored (unless all the values in a column are NaN), so that a
+    window which is not full yet is displayed correctly.
+    """
+    n_smp = data.shape[1]
+    if n_smp <= 2 * n_cols:
+        return x_axis, data
+
+    start = (arange(n_cols) * n_smp) // n_cols
+    x = empty(2 * n_cols, dtype=x_axis.dtype)
+    x[0::2] = x_axis[start]
+    x[1::2] = x_axis[start]
+
+    y = empty((data.shape[0], 2 * n_cols), dtype=data.dtype)
+    y[:, 0::2] = fmin.reduceat(data, start, axis=1)
+    y[:, 1::2] = fmax.reduceat(data, start, axis=1)
+    return x, y
+
+
+class MinMaxPyramid():
+    """Min and max of consecutive blocks of samples, at several levels, which
+    are computed incrementally as the data arrives.
+
+    Parameters
+    ----------
+    n_chan : int
+        number of channels
+    factors : list of int
+        number of samples in each block, for each level (such as 10, 100,
+        1000). Each factor should be a multiple of the previous one.
+    dtype : str or dtype
+        data type of the data (the min and max have the same data type)
+
+    Raises
+    ------
+    ValueError
+        if the factors are not increasing multiples of each other
+
+    Notes
+    -----
+    Each level is computed from the previous level (the first one from the
+    samples), so the cost is about one comparison for each sample. The data
+    is transposed once (sample-major), so that the min and max of each block
+    are computed over whole rows of channels, which is several times faster
+    than over short blocks of each channel. The samples (or blocks) which do
+    not complete a block are kept until the next call to push.
+    """
+    def __init__(self, n_chan, factors, dtype='float64'):
+        factors = [int(f) for f in factors]
+        previous = 1
+        self.ratios = []
+        for factor in factors:
+            if factor <= previous or factor % previous:
+                raise ValueError('The factors of the pyramid should be '
+                                 'increasing multiples of each other, not ' +
+                                 ', '.join(str(f) for f in factors))
+            self.ratios.append(factor // previous)
+            previous = factor
+        self.factors = factors
+        self.n_chan = n_chan
+        # samples (or blocks) which do not complete a block, sample-major
+        self.lo = [empty((0, n_chan), dtype=dtype) for _ in factors]
+        self.hi = [empty((0, n_chan), dtype=dtype) for _ in factors]
+
+    def push(self, data):
+        """Add the data and compute the blocks which are complete.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_chan X n_samples matrix
+
+        Returns
+        -------
+        list of ndarray
+            for each level, n_blocks X n_chan X 2 matrix with the min and max
+            of each new block (n_blocks can be 0)
+        """
+        x = ascontiguousarray(data.T)
+        return self._cascade(x, x, final=False)
+
+    def flush(self):
+        """Compute the last, incomplete, block of each level (see push)."""
+        no_data = self.lo[0][:0]
+        return self._cascade(no_data, no_data, final=True)
+
+    def _cascade(self, lo, hi, final):
+        out = []
+        for i, ratio in enumerate(self.ratios):
+            if self.lo[i].shape[0]:
+                lo = concatenate((self.lo[i], lo))
+                hi = concatenate((self.hi[i], hi))
+            n = lo.shape[0] // ratio * ratio
+            self.lo[i] = lo[n:].copy()
+            self.hi[i] = hi[n:].copy()
+
+            new_lo = lo[:n].reshape(-1, ratio, self.n_chan).min(axis=1)
+            new_hi = hi[:n].reshape(-1, ratio, self.n_chan).max(axis=1)
+            if final and n < lo.shape[0]:
+                new_lo = concatenate((new_lo, lo[n:].min(axis=0,
+                                                         keepdims=True)))
+                new_hi = concatenate((new_hi, hi[n:].max(axis=0,
+                                                         keepdims=True)))
+                self.lo[i] = self.lo[i][:0]
+                self.hi[i] = self.hi[i][:0]
+
+            blocks = empty(new_lo.shape + (2, ), dtype=lo.dtype)
+            blocks[:, :, 0] = new_lo
+            blocks[:, :, 1] = new_hi
+            out.append(blocks)
+            lo, hi = new_lo, new_hi
+        return out
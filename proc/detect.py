@@ -0,0 +1,190 @@
+from time import perf_counter
+
+from numpy import (empty, full, int64, lexsort, maximum, nonzero, ones, sqrt,
+                   zeros)
+
+from .filters import FilterBank
+
+EVENT_DTYPE = [('chan', '<i2'), ('sample', '<i8'), ('amplitude', '<f4')]
+
+
+class Detector():
+    """Detect events (such as spikes) when the signal crosses a threshold,
+    which is a multiple of the standard deviation of each channel.
+
+    Parameters
+    ----------
+    n_chan : int
+        number of channels
+    s_freq : float
+        sampling frequency
+    threshold : float
+        threshold, in standard deviations from the mean (negative values
+        detect when the signal goes below the threshold, positive values when
+        it goes above)
+    refractory : float
+        minimum time (in s) between two events in the same channel
+    filters : str
+        if not None, filters applied to the data before detection (see
+        FilterBank), such as 'highpass:300'
+    memory : float
+        duration (in s) of the data used to estimate mean and standard
+        deviation (older data is forgotten gradually)
+
+    Notes
+    -----
+    The mean and the variance of each channel are updated with each buffer
+    (combining the Welford's estimates of the previous data and of the
+    buffer). No events are detected during the first second, when the
+    estimates are not reliable.
+
+    The events are detected in all the channels at once. The refractory
+    period only needs a loop if two crossings in the same channel are closer
+    than the refractory period.
+    """
+    def __init__(self, n_chan, s_freq, threshold, refractory=0.001,
+                 filters=None, memory=60):
+        self.n_chan = n_chan
+        self.s_freq = s_freq
+        self.threshold = threshold
+        self.refractory = int(refractory * s_freq)
+        self.max_n = int(memory * s_freq)
+
+        self.filter = None
+        if filters is not None:
+            self.filter = FilterBank(n_chan, s_freq, filters)
+
+        self.n = 0  # number of samples in the estimates
+        self.mean = zeros(n_chan)
+        self.m2 = zeros(n_chan)
+
+        self.n_smp = 0  # samples since the beginning
+        self.crossed = zeros(n_chan, dtype=bool)  # at the last sample
+        self.last_event = full(n_chan, -self.refractory - 1, dtype=int64)
+
+        self.n_events = 0
+        self.cost = 0.
+        self.mean_cost = 0.
+        self.max_cost = 0.
+        self.n_calls = 0
+
+    @property
+    def std(self):
+        """Standard deviation of each channel."""
+        if self.n < 2:
+            return zeros(self.n_chan)
+        return sqrt(self.m2 / (self.n - 1))
+
+    def detect(self, x):
+        """Update the estimates and detect the events in the next samples.
+
+        Parameters
+        ----------
+        x : ndarray
+            n_chan X n_samples matrix
+
+        Returns
+        -------
+        ndarray
+            events, sorted by sample, with fields 'chan', 'sample' (since the
+            beginning of the acquisition) and 'amplitude' (value of the
+            signal, after filtering, when it crossed the threshold)
+        """
+        t0 = perf_counter()
+        if self.filter is not None:
+            x = self.filter.apply(x)
+        n_smp = x.shape[1]
+
+        # combine the estimates of the previous data and of this buffer
+        n_a = min(self.n, self.max_n)
+        if self.n > 0:
+            self.m2 *= n_a / self.n
+        mean = x.mean(axis=1)
+        delta = mean - self.mean
+        n = n_a + n_smp
+        self.mean += delta * n_smp / n
+        self.m2 += (((x - mean[:, None]) ** 2).sum(axis=1) +
+                    delta ** 2 * n_a * n_smp / n)
+        self.n = n
+
+        threshold = self.mean + self.threshold * self.std
+        if self.threshold < 0:
+            crossed = x < threshold[:, None]
+        else:
+            crossed = x > threshold[:, None]
+        onset = crossed.copy()
+        onset[:, 1:] &= ~crossed[:, :-1]
+        onset[:, 0] &= ~self.crossed
+        self.crossed = crossed[:, -1]
+
+        if self.n_smp < self.s_freq:  # warm-up
+            onset[:] = False
+
+        chan, smp = nonzero(onset)  # sorted by channel, then sample
+        sample = smp + self.n_smp
+        keep = self._refractory(chan, sample)
+        chan, smp, sample = chan[keep], smp[keep], sample[keep]
+        maximum.at(self.last_event, chan, sample)
+
+        events = empty(len(chan), dtype=EVENT_DTYPE)
+        events['chan'] = chan
+        events['sample'] = sample
+        events['amplitude'] = x[chan, smp]
+        events = events[lexsort((events['chan'], events['sample']))]
+
+        self.n_smp += n_smp
+        self.n_events += len(events)
+        self.cost = perf_counter() - t0
+        self.n_calls += 1
+        self.mean_cost += (self.cost - self.mean_cost) / self.n_calls
+        self.max_cost = max(self.max_cost, self.cost)
+        return events
+
+    def _refractory(self, chan, sample):
+        """Which crossings are not in the refractory period of the previous
+        event.
+
+        Parameters
+        ----------
+        chan, sample : ndarray
+            channel and sample of the crossings, sorted by channel and sample
+
+        Returns
+        -------
+        ndarray
+            boolean vector, True for the crossings which are events
+        """
+        previous = self.last_event[chan]
+        same = chan[1:] == chan[:-1]
+        previous[1:][same] = sample[:-1][same]
+        keep = sample - previous > self.refractory
+        if keep.all():
+            return keep
+
+        # a crossing which is close to the previous one is an event only if
+        # the previous one was not an event
+        keep = ones(len(chan), dtype=bool)
+        last_event = self.last_event.copy()
+        for i, (c, s) in enumerate(zip(chan, sample)):
+            if s - last_event[c] > self.refractory:
+                last_event[c] = s
+            else:
+                keep[i] = False
+        return keep
+
+    def stats(self):
+        """Number of events and time spent detecting them.
+
+        Returns
+        -------
+        dict
+            'events' (number of events), 'buffers' (number of buffers),
+            'cost', 'mean_cost' and 'max_cost' (in s, for one buffer,
+            including the filters).
+        """
+        return {'events': self.n_events,
+                'buffers': self.n_calls,
+                'cost': self.cost,
+                'mean_cost': self.mean_cost,
+                'max_cost': self.max_cost,
+                }
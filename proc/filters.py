@@ -0,0 +1,235 @@
+from math import cos, pi, sin, sqrt
+from time import perf_counter
+
+from numpy import array, concatenate, empty, zeros
+
+FILTERS = ('notch', 'highpass', 'lowpass', 'bandpass')
+NOTCH_Q = 30  # width of the notch is freq / NOTCH_Q
+BUTTERWORTH_Q = 1 / sqrt(2)
+
+
+def _biquad(b, a):
+    """Normalize the coefficients so that a[0] is 1 (one row of sos)."""
+    return [b[0] / a[0], b[1] / a[0], b[2] / a[0],
+            1., a[1] / a[0], a[2] / a[0]]
+
+
+def notch(freq, s_freq, q=NOTCH_Q):
+    """Second-order sections of a notch filter (such as for line noise)."""
+    w0 = 2 * pi * freq / s_freq
+    alpha = sin(w0) / (2 * q)
+    return [_biquad([1, -2 * cos(w0), 1],
+                    [1 + alpha, -2 * cos(w0), 1 - alpha])]
+
+
+def highpass(freq, s_freq, q=BUTTERWORTH_Q):
+    """Second-order sections of a 2nd-order Butterworth high-pass filter."""
+    w0 = 2 * pi * freq / s_freq
+    alpha = sin(w0) / (2 * q)
+    return [_biquad([(1 + cos(w0)) / 2, -(1 + cos(w0)), (1 + cos(w0)) / 2],
+                    [1 + alpha, -2 * cos(w0), 1 - alpha])]
+
+
+def lowpass(freq, s_freq, q=BUTTERWORTH_Q):
+    """Second-order sections of a 2nd-order Butterworth low-pass filter."""
+    w0 = 2 * pi * freq / s_freq
+    alpha = sin(w0) / (2 * q)
+    return [_biquad([(1 - cos(w0)) / 2, 1 - cos(w0), (1 - cos(w0)) / 2],
+                    [1 + alpha, -2 * cos(w0), 1 - alpha])]
+
+
+def bandpass(low, high, s_freq):
+    """Second-order sections of a band-pass filter (high-pass at low and
+    low-pass at high)."""
+    return highpass(low, s_freq) + lowpass(high, s_freq)
+
+
+def parse_filters(spec, s_freq):
+    """Convert the description of the filters into second-order sections.
+
+    Parameters
+    ----------
+    spec : str
+        filters separated by comma, such as 'notch:60,highpass:0.5' or
+        'bandpass:300:6000' (frequencies in Hz)
+    s_freq : float
+        sampling frequency
+
+    Returns
+    -------
+    ndarray
+        n_sections X 6 matrix (b0, b1, b2, a0, a1, a2 for each section)
+    list of str
+        description of the filters for the EDF header (such as 'N:60Hz')
+    """
+    sos = []
+    labels = []
+    for one in spec.split(','):
+        s = one.strip().split(':')
+        name, freq = s[0], [float(x) for x in s[1:]]
+        if name not in FILTERS:
+            raise ValueError('filter should be one of ' + ', '.join(FILTERS))
+        if len(freq) != (2 if name == 'bandpass' else 1):
+            raise ValueError('wrong number of frequencies in "{}"'.format(one))
+        if not all(0 < f < s_freq / 2 for f in freq):
+            raise ValueError('frequencies in "{}" should be between 0 and '
+                             'half the sampling frequency'.format(one))
+
+        if name == 'notch':
+            sos.extend(notch(freq[0], s_freq))
+            labels.append('N:{:g}Hz'.format(freq[0]))
+        elif name == 'highpass':
+            sos.extend(highpass(freq[0], s_freq))
+            labels.append('HP:{:g}Hz'.format(freq[0]))
+        elif name == 'lowpass':
+            sos.extend(lowpass(freq[0], s_freq))
+            labels.append('LP:{:g}Hz'.format(freq[0]))
+        else:
+            sos.extend(bandpass(freq[0], freq[1], s_freq))
+            labels.extend(['HP:{:g}Hz'.format(freq[0]),
+                           'LP:{:g}Hz'.format(freq[1])])
+    return array(sos), labels
+
+
+def _block_response(section, n_smp):
+    """Response of one section to an impulse and to each value of the state,
+    over n_smp samples.
+
+    Returns
+    -------
+    ndarray
+        n_smp X n_smp matrix which gives the output from the input (with the
+        state at zero)
+    ndarray
+        n_smp X 4 matrix which gives the output from the state (the two
+        previous inputs and the two previous outputs) with the input at zero
+    """
+    b0, b1, b2, _, a1, a2 = section
+
+    def run(x, state):
+        x1, x2, y1, y2 = state
+        y = []
+        for x0 in x:
+            y0 = b0 * x0 + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+            x1, x2, y1, y2 = x0, x1, y0, y1
+            y.append(y0)
+        return y
+
+    impulse = zeros(n_smp)
+    impulse[0] = 1
+    h = run(impulse, (0, 0, 0, 0))
+    H = zeros((n_smp, n_smp))
+    for i in range(n_smp):
+        H[i, :i + 1] = h[i::-1]
+
+    G = empty((n_smp, 4))
+    for i in range(4):
+        state = [0, 0, 0, 0]
+        state[i] = 1
+        G[:, i] = run(zeros(n_smp), state)
+    return H, G
+
+
+class FilterBank():
+    """Cascade of second-order sections applied to all the channels, with
+    the state kept between buffers, so that the data can be filtered one
+    buffer at a time.
+
+    Parameters
+    ----------
+    n_chan : int
+        number of channels
+    s_freq : float
+        sampling frequency
+    spec : str
+        filters separated by comma, such as 'notch:60,highpass:0.5' or
+        'bandpass:300:6000' (see parse_filters)
+    block : int
+        number of samples which are computed together (see Notes)
+
+    Notes
+    -----
+    The samples are filtered in blocks of a few samples: inside each block,
+    the output is a matrix product of the input (with the impulse response)
+    and of the state at the beginning of the block, for all the channels and
+    all the blocks at once. Only the state (two values per channel) is then
+    carried from one block to the next, in a loop. The result is the same
+    as filtering each sample (Direct Form I), but without a loop over
+    the samples.
+    """
+    def __init__(self, n_chan, s_freq, spec, block=64):
+        self.sos, self.labels = parse_filters(spec, s_freq)
+        self.n_chan = n_chan
+        self.block = block
+        self.response = [_block_response(section, block)
+                         for section in self.sos]
+        self.state = zeros((len(self.sos), n_chan, 4))
+
+        self.n_calls = 0
+        self.cost = 0.
+        self.mean_cost = 0.
+        self.max_cost = 0.
+
+    def apply(self, x):
+        """Filter the next samples.
+
+        Parameters
+        ----------
+        x : ndarray
+            n_chan X n_samples matrix
+
+        Returns
+        -------
+        ndarray
+            n_chan X n_samples matrix with the filtered data (new array)
+        """
+        t0 = perf_counter()
+        n_smp = x.shape[1]
+        n_blk = -(-n_smp // self.block)  # ceil
+
+        y = zeros((self.n_chan, n_blk * self.block))
+        y[:, :n_smp] = x
+        for (H, G), state in zip(self.response, self.state):
+            X = y.reshape(self.n_chan, n_blk, self.block)
+            Z = X @ H.T
+
+            # state at the beginning of each block (x1, x2, y1, y2)
+            S = empty((self.n_chan, n_blk, 4))
+            S[:, 0] = state
+            S[:, 1:, 0] = X[:, :-1, -1]
+            S[:, 1:, 1] = X[:, :-1, -2]
+            for i in range(1, n_blk):
+                S[:, i, 2:] = Z[:, i - 1, :-3:-1] + S[:, i - 1] @ G[:-3:-1].T
+
+            Z += S @ G.T
+            out = Z.reshape(self.n_chan, -1)
+
+            # samples after n_smp are padding, the state is at n_smp
+            prev = concatenate((state[:, 1::-1], y[:, :n_smp]), axis=1)
+            state[:, 0] = prev[:, -1]
+            state[:, 1] = prev[:, -2]
+            prev = concatenate((state[:, :1:-1], out[:, :n_smp]), axis=1)
+            state[:, 2] = prev[:, -1]
+            state[:, 3] = prev[:, -2]
+            y = out
+
+        self.cost = perf_counter() - t0
+        self.n_calls += 1
+        self.mean_cost += (self.cost - self.mean_cost) / self.n_calls
+        self.max_cost = max(self.max_cost, self.cost)
+        return y[:, :n_smp]
+
+    def stats(self):
+        """Time spent filtering.
+
+        Returns
+        -------
+        dict
+            'buffers' (number of buffers), 'cost', 'mean_cost' and
+            'max_cost' (in s, for one buffer).
+        """
+        return {'buffers': self.n_calls,
+                'cost': self.cost,
+                'mean_cost': self.mean_cost,
+                'max_cost': self.max_cost,
+                }
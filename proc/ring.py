@@ -0,0 +1,69 @@
+from numpy import empty, nan
+
+
+class RingBuffer():
+    """Circular buffer with the most recent samples of each channel.
+
+    Parameters
+    ----------
+    n_chan : int
+        number of channels
+    n_smp : int
+        number of samples to keep
+    dtype : str
+        data type
+    fill : float
+        value of the samples which have not been written yet
+
+    Notes
+    -----
+    data is written at the position of the cursor (idx), which then moves
+    forward and wraps around at the end. data is then in "sweep" order (like
+    an oscilloscope); unrolled() returns the samples in chronological order.
+    """
+    def __init__(self, n_chan, n_smp, dtype='float64', fill=nan):
+        self.data = empty((n_chan, n_smp), dtype=dtype)
+        self.data.fill(fill)
+        self.out = empty((n_chan, n_smp), dtype=dtype)
+        self.n_smp = n_smp
+        self.idx = 0
+        self.n_written = 0
+
+    def write(self, x):
+        """Copy the new samples into the buffer.
+
+        Parameters
+        ----------
+        x : ndarray
+            n_chan X n_samples matrix (n_samples does not need to be a divisor
+            of the buffer length)
+        """
+        n = x.shape[1]
+        self.n_written += n
+        if n >= self.n_smp:  # only the last samples, where they would be
+            self.idx = (self.idx + n) % self.n_smp
+            x = x[:, -self.n_smp:]
+            n = self.n_smp
+
+        end = self.idx + n
+        if end <= self.n_smp:
+            self.data[:, self.idx:end] = x
+        else:
+            first = self.n_smp - self.idx
+            self.data[:, self.idx:] = x[:, :first]
+            self.data[:, :n - first] = x[:, first:]
+        self.idx = end % self.n_smp
+
+    def unrolled(self):
+        """Samples in chronological order (the oldest first).
+
+        Returns
+        -------
+        ndarray
+            n_chan X n_smp matrix. It's always the same array, so it's only
+            valid until the next call.
+        """
+        first = self.n_smp - self.idx
+        self.out[:, :first] = self.data[:, self.idx:]
+        self.out[:, first:] = self.data[:, :self.idx]
+        return self.out
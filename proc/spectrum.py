@@ -0,0 +1,90 @@
+from threading import Lock
+
+from numpy import absolute, arange, hanning, hstack, newaxis, zeros
+from numpy.fft import rfft, rfftfreq
+
+
+class Spectrum():
+    """Power spectral density of all the channels, with Welch's method
+    (Hann window, 50% overlap), updated as new data arrives.
+
+    Parameters
+    ----------
+    n_chan : int
+        number of channels
+    s_freq : float
+        sampling frequency
+    n_fft : int
+        number of samples in each segment
+    n_avg : int
+        number of segments to average (older segments are forgotten
+        exponentially)
+
+    Notes
+    -----
+    push() only stores the data, so it's cheap to call in the GUI thread. The
+    FFT is computed by update(), for all the channels and all the new
+    segments at once. The first spectrum is available as soon as there are
+    n_fft samples, and it's the average of all the segments until there are
+    n_avg segments.
+    """
+    def __init__(self, n_chan, s_freq, n_fft, n_avg=8):
+        self.n_fft = n_fft
+        self.step = n_fft // 2
+        self.n_avg = n_avg
+        self.freq = rfftfreq(n_fft, 1 / s_freq)
+        self.window = hanning(n_fft)
+        self.scale = 1 / (s_freq * (self.window ** 2).sum())
+
+        self.psd = zeros((n_chan, len(self.freq)))
+        self.n_seg = 0
+        self.tail = zeros((n_chan, 0))
+        self.queue = []
+        self.lock = Lock()
+
+    def push(self, data):
+        """Add new data.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_chan X n_samples matrix (it's copied)
+        """
+        with self.lock:
+            self.queue.append(data.copy())
+
+    def update(self):
+        """Compute the spectrum of the segments which are complete.
+
+        Returns
+        -------
+        ndarray
+            n_chan X n_freq matrix with the PSD (unit ** 2 / Hz), or None if
+            there are no new segments.
+        """
+        with self.lock:
+            chunks, self.queue = self.queue, []
+        if not chunks:
+            return None
+
+        x = hstack([self.tail] + chunks)
+        n_seg = (x.shape[1] - self.n_fft) // self.step + 1
+        if n_seg <= 0:
+            self.tail = x
+            return None
+        self.tail = x[:, n_seg * self.step:]
+
+        idx = (arange(self.n_fft)[newaxis, :] +
+               self.step * arange(n_seg)[:, newaxis])
+        seg = x[:, idx]  # n_chan X n_seg X n_fft
+        seg -= seg.mean(axis=-1, keepdims=True)
+        seg *= self.window
+        p = absolute(rfft(seg, axis=-1)) ** 2 * self.scale
+        p[..., 1:-1] *= 2  # one-sided
+
+        for i in range(n_seg):
+            self.n_seg += 1
+            w = max(1 / self.n_seg, 1 / self.n_avg)
+            self.psd += w * (p[:, i, :] - self.psd)
+
+        return self.psd
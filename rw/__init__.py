@@ -1,5 +1,15 @@
 """rename rw (read/write) from io because of a conflict in python2 with numpy
 libraries.
 """
+from .annotations import ExportAnnotations
+from .archive import ArchiveReader, ExportArchive
 from .daqmx import DAQmxReader
-from .edf import ExportEdf
\ No newline at end of file
+from .edf import EdfReader, ExportEdf
+from .flat import ExportFlat, FlatReader
+from .metrics import Metrics
+from .playback import EdfPlayer
+from .pool import FramePool
+from .process import AcquisitionProcess
+from .shared import SharedRing
+from .stream import StreamServer, subscribe
+from .writer import AsyncWriter
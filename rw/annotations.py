@@ -0,0 +1,132 @@
+from os.path import splitext
+
+from numpy import concatenate
+
+ANNOTATIONS_LABEL = 'EDF Annotations'
+EVENT_BYTES = 40  # bytes for each annotation (such as '+12.345678\x14...')
+
+
+def annotations_name(filename):
+    """Name of the file with the annotations ('rec.edf' -> 'rec_events.edf').
+    """
+    root, ext = splitext(filename)
+    return root + '_events' + ext
+
+
+class ExportAnnotations():
+    """Export the events as EDF+ annotations, in a file with only the
+    annotations, with the same data records (of 1 s) as the EDF file with the
+    data.
+
+    Parameters
+    ----------
+    filename : str
+        path to the EDF+ file
+    start_time : datetime
+        start time of the EDF file with the data
+    subj_info : str
+        subject identification
+    s_freq : int
+        sampling frequency of the data
+    max_events : int
+        maximum number of events in each data record (the others are dropped)
+
+    Notes
+    -----
+    Each event is stored as one annotation, with the onset (in s, from the
+    start of the file) and the channel and amplitude as description (such as
+    '3 -0.000123'). Each data record starts with the onset of the record
+    (time-keeping annotation), as required by EDF+.
+    """
+    def __init__(self, filename, start_time, subj_info, s_freq,
+                 max_events=100):
+        self.s_freq = s_freq
+        self.n_bytes = EVENT_BYTES * (max_events + 1)
+        self.n_records = 0
+        self.n_dropped = 0
+
+        recording_info = ('Startdate ' + start_time.strftime('%d-%b-%Y') +
+                          ' X X test')
+        f = open(filename, 'wb')
+        self.f = f
+        f.write('{:<8}'.format(0).encode('ascii'))
+        f.write('{:<80}'.format(subj_info).encode('ascii'))
+        f.write('{:<80}'.format(recording_info).encode('ascii'))
+        f.write(start_time.strftime('%d.%m.%y').encode('ascii'))
+        f.write(start_time.strftime('%H.%M.%S').encode('ascii'))
+        f.write('{:<8d}'.format(256 * 2).encode('ascii'))
+        f.write('{:<44}'.format('EDF+C').encode('ascii'))
+        f.write('{:<8}'.format(-1).encode('ascii'))  # n_records, updated later
+        f.write('{:<8d}'.format(1).encode('ascii'))  # record_length
+        f.write('{:<4}'.format(1).encode('ascii'))
+
+        f.write('{:<16}'.format(ANNOTATIONS_LABEL).encode('ascii'))
+        f.write('{:<80}'.format('').encode('ascii'))  # transducer
+        f.write('{:<8}'.format('').encode('ascii'))  # physical dimension
+        f.write('{:<8}'.format(-1).encode('ascii'))
+        f.write('{:<8}'.format(1).encode('ascii'))
+        f.write('{:<8}'.format(-32768).encode('ascii'))
+        f.write('{:<8}'.format(32767).encode('ascii'))
+        f.write('{:<80}'.format('').encode('ascii'))  # prefiltering
+        f.write('{:<8d}'.format(self.n_bytes // 2).encode('ascii'))
+        f.write((' ' * 32).encode('ascii'))
+        self.data_end = f.tell()
+
+    def write_record(self, events, first_sample):
+        """Write one data record with the annotations.
+
+        Parameters
+        ----------
+        events : ndarray
+            events in this record (see Detector), with the sample since the
+            beginning of the acquisition
+        first_sample : int
+            first sample of the file (since the beginning of the acquisition)
+        """
+        record = '+{}\x14\x14\x00'.format(self.n_records).encode('ascii')
+        for event in events:
+            tal = '+{:.6f}\x14{} {:.6g}\x14\x00'.format(
+                (event['sample'] - first_sample) / self.s_freq,
+                event['chan'], event['amplitude']).encode('ascii')
+            if len(record) + len(tal) > self.n_bytes:
+                self.n_dropped += 1
+                continue
+            record += tal
+        self.f.write(record.ljust(self.n_bytes, b'\x00'))
+        self.data_end += self.n_bytes
+        self.n_records += 1
+
+    def update_header(self):
+        """Write the number of records in the header."""
+        self.f.seek(236)  # where n_records is
+        self.f.write('{:<8}'.format(self.n_records).encode('ascii'))
+        self.f.seek(self.data_end)
+        self.f.flush()
+
+    def close(self):
+        self.update_header()
+        self.f.close()
+
+
+def split_events(pending, end):
+    """Split the events before and after a sample.
+
+    Parameters
+    ----------
+    pending : list of ndarray
+        events (see Detector), in chronological order
+    end : int
+        first sample which is not in the record
+
+    Returns
+    -------
+    ndarray
+        events before end
+    list of ndarray
+        events from end onwards
+    """
+    if not pending:
+        return [], []
+    events = concatenate(pending)
+    n = (events['sample'] < end).sum()
+    return events[:n], [events[n:]]
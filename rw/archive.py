@@ -0,0 +1,436 @@
+"""Compressed archive of the recordings, with random access by channel and
+time.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from json import dump, load
+from lzma import compress as lzma_compress, decompress as lzma_decompress
+from multiprocessing import get_context
+from os import replace
+from os.path import basename, dirname, join, splitext
+from time import perf_counter
+from zlib import compress as zlib_compress, decompress as zlib_decompress
+
+from numpy import (array, asarray, cumsum, empty, fromfile, frombuffer, isin,
+                   newaxis, subtract, uint8, zeros)
+
+from .annotations import annotations_name
+from .edf import EDF_FORMAT, ExportEdf
+from .flat import sidecar_name
+
+FORMAT = 'OpBoxPhys archive'
+VERSION = 1
+CODECS = {'zlib': (lambda data, level: zlib_compress(data, level),
+                   zlib_decompress),
+          'lzma': (lambda data, level: lzma_compress(data, preset=level),
+                   lzma_decompress),
+          }
+INDEX_DTYPE = [('chan', '<u2'),
+               ('first_sample', '<i8'),
+               ('n_smp', '<u4'),
+               ('position', '<u8'),  # in the archive
+               ('size', '<u4'),  # compressed, in bytes
+               ('cost', '<f4'),  # time to compress, in s
+               ]
+MAX_PENDING = 2  # chunks waiting to be compressed, for each worker
+
+
+def index_name(filename):
+    """Name of the index ('rec.arc' -> 'rec_index.bin')."""
+    return splitext(filename)[0] + '_index.bin'
+
+
+def encode(x, codec='zlib', level=6):
+    """Compress one channel.
+
+    Parameters
+    ----------
+    x : ndarray
+        vector with the samples (int16)
+    codec : str
+        'zlib' or 'lzma'
+    level : int
+        compression level (0 to 9)
+
+    Returns
+    -------
+    bytes
+        compressed samples
+
+    Notes
+    -----
+    The samples are delta-encoded (the first sample, then the difference
+    between consecutive samples, which wraps around in int16, so it's
+    lossless) and the bytes are shuffled (all the low bytes, then all the
+    high bytes), because the high bytes of the differences are mostly 0 or
+    255.
+    """
+    d = empty(len(x), dtype=EDF_FORMAT)
+    d[:1] = x[:1]
+    subtract(x[1:], x[:-1], out=d[1:])
+    shuffled = d.view(uint8).reshape(-1, 2).T.tobytes()
+    return CODECS[codec][0](shuffled, level)
+
+
+def decode(blob, codec, n_smp):
+    """Decompress one channel (see encode).
+
+    Parameters
+    ----------
+    blob : bytes
+        compressed samples
+    codec : str
+        'zlib' or 'lzma'
+    n_smp : int
+        number of samples
+
+    Returns
+    -------
+    ndarray
+        vector with the samples (int16)
+    """
+    shuffled = frombuffer(CODECS[codec][1](blob), dtype=uint8)
+    d = empty(n_smp, dtype=EDF_FORMAT)
+    d.view(uint8).reshape(-1, 2)[:] = shuffled.reshape(2, n_smp).T
+    return cumsum(d, dtype=EDF_FORMAT)
+
+
+def _compress_chunk(x, codec, level):
+    """Compress each channel of a chunk (in a worker of the pool).
+
+    Returns
+    -------
+    list of bytes
+        compressed samples of each channel
+    list of float
+        time (in s) to compress each channel
+    """
+    blobs, costs = [], []
+    for row in x:
+        t0 = perf_counter()
+        blobs.append(encode(row, codec, level))
+        costs.append(perf_counter() - t0)
+    return blobs, costs
+
+
+class ExportArchive(ExportEdf):
+    """Export data to a compressed archive, with the same interface as
+    ExportEdf.
+
+    Notes
+    -----
+    The data is converted as in ExportEdf (so the archive has exactly the
+    values which would be written to EDF). Every args.archive_chunk seconds,
+    each channel is compressed on its own (see encode), with
+    args.archive_codec, on a pool of args.archive_workers processes, so that
+    the compression keeps up with the acquisition. The chunks are written in
+    order as soon as they are compressed. If the pool falls behind, write
+    waits for the oldest chunk (in the thread of AsyncWriter).
+
+    Next to the archive ('rec.arc'), 'rec_index.bin' has the position of
+    each chunk of each channel (see INDEX_DTYPE), which is appended after the
+    chunk is written, and 'rec.json' describes the channels, the codec and
+    the index (see ArchiveReader). The events are written to
+    'rec_events.edf', as in ExportEdf. The samples of the last (incomplete)
+    second are also compressed when the file is closed.
+
+    args.edf_segment, args.edf_segment_size, args.edf_prealloc and
+    args.edf_header are not used. The pyramid (args.pyramid) is written as in
+    ExportEdf.
+    """
+    def __init__(self):
+        super().__init__()
+        self.futures = deque()
+        self.executor = None
+        self.n_chunks = 0
+        self.n_bytes = 0  # before compression
+        self.n_compressed = 0
+        self.cost = 0.
+        self.mean_cost = 0.
+        self.max_cost = 0.
+
+    def open(self, args, raw=None, calibration=None):
+        """Create the archive, the index and the sidecar (see
+        ExportEdf.open)."""
+        self.codec = args.archive_codec
+        self.level = args.archive_level
+        self.chunk_records = max(int(args.archive_chunk), 1)
+        self.n_workers = args.archive_workers
+        super().open(args, raw, calibration)
+
+    @property
+    def compression(self):
+        """Compression ratio and time spent compressing.
+
+        Returns
+        -------
+        dict
+            'ratio' (size before / after compression), 'chunks' (number of
+            chunks written), 'pending' (chunks being compressed), 'cost',
+            'mean_cost' and 'max_cost' (in s, to compress one chunk of all
+            the channels).
+        """
+        return {'ratio': self.n_bytes / max(self.n_compressed, 1),
+                'chunks': self.n_chunks,
+                'pending': len(self.futures),
+                'cost': self.cost,
+                'mean_cost': self.mean_cost,
+                'max_cost': self.max_cost,
+                }
+
+    def close(self):
+        """Compress the remaining samples, wait for the pool and close the
+        files."""
+        if self.f is None:
+            return
+        if self.n_in_chunk or self.idx:
+            self.chunk[:, self.n_in_chunk * self.s_freq:][:, :self.idx] = (
+                self.record[:, :self.idx])
+            self._submit(self.n_in_chunk * self.s_freq + self.idx)
+        self._collect(wait=True)
+        self.executor.shutdown()
+        self.f.close()
+        self.f = None
+        self.f_index.close()
+        self._close_annotations()
+        if self.pyramid is not None:
+            self.pyramid.close()
+        self._write_sidecar(closed=True)
+
+    def _open_segment(self):
+        """Open the archive (there is only one file)."""
+        self.f = open(self.filename, 'wb')
+        self.f_index = open(index_name(self.filename), 'wb')
+        self.n_in_chunk = 0  # records in the current chunk
+        self.chunk = self._new_chunk()
+        self.n_samples = 0
+        self.executor = ProcessPoolExecutor(self.n_workers,
+                                            mp_context=get_context('spawn'))
+        self._write_sidecar(closed=False)
+        self._open_annotations(
+            annotations_name(splitext(self.filename)[0] + '.edf'),
+            self.start_time)
+
+    def _new_chunk(self):
+        return empty((len(self.chan_labels),
+                      self.chunk_records * self.s_freq), dtype=EDF_FORMAT)
+
+    def _write_record(self):
+        """Copy the record into the chunk and compress the chunk when it's
+        full."""
+        i = self.n_in_chunk * self.s_freq
+        self.chunk[:, i:i + self.s_freq] = self.record
+        self._write_annotations()
+        if self.pyramid is not None:
+            self.pyramid.write(self.record)
+        self.n_in_chunk += 1
+        self.n_records_total += 1
+        self.idx = 0
+
+        if self.n_in_chunk == self.chunk_records:
+            self._submit(self.chunk.shape[1])
+        self._collect(wait=False)
+
+    def _submit(self, n_smp):
+        """Send the chunk to the pool (the pool copies it later, so the next
+        chunk is a new matrix)."""
+        future = self.executor.submit(_compress_chunk, self.chunk[:, :n_smp],
+                                      self.codec, self.level)
+        self.futures.append((future, self.n_samples, n_smp))
+        self.n_samples += n_smp
+        self.n_in_chunk = 0
+        self.chunk = self._new_chunk()
+        while len(self.futures) > MAX_PENDING * self.n_workers:
+            self._collect_one()
+
+    def _collect(self, wait):
+        """Write the chunks which are compressed, in order."""
+        while self.futures and (wait or self.futures[0][0].done()):
+            self._collect_one()
+
+    def _collect_one(self):
+        future, first_sample, n_smp = self.futures.popleft()
+        blobs, costs = future.result()
+
+        index = zeros(len(blobs), dtype=INDEX_DTYPE)
+        index['chan'] = range(len(blobs))
+        index['first_sample'] = first_sample
+        index['n_smp'] = n_smp
+        index['size'] = [len(b) for b in blobs]
+        index['position'] = self.f.tell() + cumsum(index['size']) - \
+            index['size']
+        index['cost'] = costs
+        self.f.write(b''.join(blobs))
+        self.f.flush()
+        self.f_index.write(index.tobytes())
+        self.f_index.flush()
+
+        self.n_chunks += 1
+        self.n_bytes += n_smp * len(blobs) * 2
+        self.n_compressed += int(index['size'].sum())
+        self.cost = sum(costs)
+        self.mean_cost += (self.cost - self.mean_cost) / self.n_chunks
+        self.max_cost = max(self.max_cost, self.cost)
+
+    def _write_sidecar(self, closed):
+        """Replace the sidecar (the number of samples is None until the
+        archive is closed)."""
+        sidecar = {'format': FORMAT,
+                   'version': VERSION,
+                   'start_time': self.start_time.isoformat(),
+                   's_freq': self.s_freq,
+                   'dtype': EDF_FORMAT,
+                   'codec': self.codec,
+                   'level': self.level,
+                   'encoding': 'delta, shuffle',
+                   'chunk': self.chunk_records * self.s_freq,
+                   'n_chan': len(self.chan_labels),
+                   'n_samples': self.n_samples if closed else None,
+                   'channels': self.describe_channels(),
+                   'filter': (None if self.filter is None else
+                              ' '.join(self.filter.labels)),
+                   'index': {'file': basename(index_name(self.filename)),
+                             'dtype': INDEX_DTYPE},
+                   }
+        name = sidecar_name(self.filename)
+        with open(name + '.tmp', 'w') as f:
+            dump(sidecar, f, indent=1)
+        replace(name + '.tmp', name)
+
+
+class ArchiveReader():
+    """Read the archives written by ExportArchive, decompressing only the
+    chunks which are needed.
+
+    Parameters
+    ----------
+    filename : str
+        path to the archive ('rec.arc')
+
+    Attributes
+    ----------
+    header : dict
+        content of the sidecar
+    index : ndarray
+        position of each chunk of each channel (see INDEX_DTYPE)
+    labels : list of str
+        name of each channel
+    units : list of str
+        physical unit of each channel
+    s_freq : float
+        sampling frequency
+    n_samples : int
+        number of samples of each channel
+
+    Notes
+    -----
+    If the archive was not closed, only the chunks in the index are read.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        with open(sidecar_name(filename)) as f:
+            self.header = load(f)
+        if self.header.get('format') != FORMAT:
+            raise ValueError(filename + ' was not written by ExportArchive')
+
+        info = self.header['index']
+        self.index = fromfile(join(dirname(filename), info['file']),
+                              dtype=[tuple(x) for x in info['dtype']])
+        chans = self.header['channels']
+        self.labels = [c['label'] for c in chans]
+        self.units = [c['unit'] for c in chans]
+        self.gain = asarray([c['gain'] for c in chans])
+        self.offset = asarray([c['offset'] for c in chans])
+        self.s_freq = self.header['s_freq']
+        self.codec = self.header['codec']
+        self.n_samples = 0
+        if len(self.index) > 0:
+            self.n_samples = int((self.index['first_sample'] +
+                                  self.index['n_smp']).max())
+
+    def read(self, chans=None, start=0, end=None, physical=True,
+             n_workers=None):
+        """Samples of some channels in a time range.
+
+        Parameters
+        ----------
+        chans : list of int
+            index of the channels (all the channels, if None)
+        start : float
+            start time, in s from the beginning of the recording
+        end : float
+            end time, in s (the end of the recording, if None)
+        physical : bool
+            convert the samples to physical units
+        n_workers : int
+            number of threads which decompress the chunks (zlib and lzma
+            release the GIL, so the threads run in parallel)
+
+        Returns
+        -------
+        ndarray
+            n_chans X n_samples matrix
+        """
+        if chans is None:
+            chans = range(len(self.labels))
+        chans = list(chans)
+        i_start = max(int(round(start * self.s_freq)), 0)
+        i_end = self.n_samples
+        if end is not None:
+            i_end = min(int(round(end * self.s_freq)), self.n_samples)
+        i_end = max(i_end, i_start)
+
+        idx = self.index
+        idx = idx[isin(idx['chan'], chans) &
+                  (idx['first_sample'] < i_end) &
+                  (idx['first_sample'] + idx['n_smp'] > i_start)]
+        idx = idx[idx['position'].argsort()]  # read the file in order
+        blobs = []
+        with open(self.filename, 'rb') as f:
+            for entry in idx:
+                f.seek(int(entry['position']))
+                blobs.append(f.read(int(entry['size'])))
+
+        out = empty((len(chans), i_end - i_start), dtype=EDF_FORMAT)
+        row = {c: i for i, c in enumerate(chans)}
+        with ThreadPoolExecutor(n_workers) as pool:
+            decoded = pool.map(decode, blobs, [self.codec] * len(blobs),
+                               idx['n_smp'].tolist())
+            for entry, x in zip(idx, decoded):
+                first = int(entry['first_sample'])
+                a = max(i_start - first, 0)
+                b = min(i_end - first, len(x))
+                out[row[int(entry['chan'])],
+                    first + a - i_start:first + b - i_start] = x[a:b]
+
+        if physical:
+            out = out * self.gain[chans, newaxis] + self.offset[chans,
+                                                                newaxis]
+        return out
+
+    def stats(self):
+        """Compression ratio and time spent compressing, from the index.
+
+        Returns
+        -------
+        dict
+            'ratio' (size before / after compression), 'chan_ratio' (ratio of
+            each channel), 'chunks' (number of chunks of each channel),
+            'mean_cost' and 'max_cost' (in s, to compress one chunk of one
+            channel).
+        """
+        idx = self.index
+        n_chan = len(self.labels)
+        raw = zeros(n_chan)
+        compressed = zeros(n_chan)
+        for chan in range(n_chan):
+            mine = idx[idx['chan'] == chan]
+            raw[chan] = mine['n_smp'].sum() * 2
+            compressed[chan] = mine['size'].sum()
+        return {'ratio': float(raw.sum() / max(compressed.sum(), 1)),
+                'chan_ratio': (raw / array([max(x, 1) for x in compressed])
+                               ).tolist(),
+                'chunks': len(idx) // max(n_chan, 1),
+                'mean_cost': float(idx['cost'].mean()) if len(idx) else 0.,
+                'max_cost': float(idx['cost'].max()) if len(idx) else 0.,
+                }
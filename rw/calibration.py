@@ -0,0 +1,109 @@
+"""Label, unit, input range and calibration of each analog channel."""
+from csv import DictReader
+
+from numpy import asarray
+
+from .digital import digital_rows
+
+COLUMNS = ('label', 'unit', 'minval', 'maxval', 'gain', 'offset')
+
+
+class Calibration():
+    """Description of the analog channels.
+
+    Parameters
+    ----------
+    labels : list of str
+        name of each channel
+    units : list of str
+        physical unit of each channel (after calibration)
+    minval, maxval : ndarray
+        input range of each channel, in V
+    gain, offset : ndarray
+        calibration of each channel (physical value = gain * V + offset)
+    """
+    def __init__(self, labels, units, minval, maxval, gain, offset):
+        self.labels = labels
+        self.units = units
+        self.minval = asarray(minval, dtype=float)
+        self.maxval = asarray(maxval, dtype=float)
+        self.gain = asarray(gain, dtype=float)
+        self.offset = asarray(offset, dtype=float)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def physical(self, volt_min, volt_max):
+        """Convert a range in V into the physical range of each channel.
+
+        Parameters
+        ----------
+        volt_min, volt_max : ndarray
+            minimum and maximum in V (scalar or one value for each channel)
+
+        Returns
+        -------
+        ndarray
+            physical value of volt_min for each channel
+        ndarray
+            physical value of volt_max for each channel (smaller than the
+            first one if the gain is negative, which EDF allows, to invert the
+            signal)
+        """
+        return (self.gain * volt_min + self.offset,
+                self.gain * volt_max + self.offset)
+
+
+def load_calibration(args):
+    """Describe the analog channels, from args.calibration if it's given.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments specified by the user
+
+    Returns
+    -------
+    instance of Calibration
+        one entry for each analog channel (master first, then slave)
+
+    Raises
+    ------
+    ValueError
+        if the file does not have one row for each analog channel, or if it
+        has unknown columns
+
+    Notes
+    -----
+    args.calibration is a CSV file with a header and one row for each analog
+    channel. All the columns are optional (see COLUMNS): the default label is
+    the index of the channel, the default unit is 'V', the default range is
+    args.minval to args.maxval, and the default calibration is gain 1 and
+    offset 0. Empty cells also take the default value.
+    """
+    n_analog = args.n_chan - digital_rows(args)
+    rows = [{}] * n_analog
+    if args.calibration is not None:
+        with open(args.calibration, newline='') as f:
+            reader = DictReader(f, skipinitialspace=True)
+            unknown = set(reader.fieldnames or []) - set(COLUMNS)
+            if unknown:
+                raise ValueError('Unknown columns in {}: {}'.format(
+                    args.calibration, ', '.join(sorted(unknown))))
+            rows = list(reader)
+        if len(rows) != n_analog:
+            raise ValueError('{} should have one row for each of the {} analog '
+                             'channels, not {}'.format(args.calibration,
+                                                       n_analog, len(rows)))
+
+    def _column(name, default, convert=str):
+        return [convert(row[name]) if row.get(name) else default
+                for row in rows]
+
+    labels = [row.get('label') or str(i) for i, row in enumerate(rows)]
+    return Calibration(labels,
+                       _column('unit', 'V'),
+                       _column('minval', args.minval, float),
+                       _column('maxval', args.maxval, float),
+                       _column('gain', 1., float),
+                       _column('offset', 0., float))
@@ -1,175 +1,411 @@
 # On Dell Optiplex Physiology computer as of 1/29/2015:
 # Dev1=PCIe-6323: AI: 0-7, 16-23. DI: Port0/0:31
 # Dev2=PCI-6225: AI: 0-7, 16-23, 32-39, 48-55, 64-71. DI: Port0/0:7
+# which corresponds to:
+# --dev Dev1 --analoginput 0:7,16:23 --digitalinput 0:31
+# --slave Dev2 --slave_analoginput 0:7,16:23,32:39,48:55,64:71
+# --slave_digitalinput 0:7
 
-from numpy import zeros
+from ctypes import byref
+from importlib import import_module
+from time import time
 
-# package to control NI
-from ctypes import byref, create_string_buffer
-from PyDAQmx.DAQmxConstants import (DAQmx_Val_Diff,
-                                    DAQmx_Val_Volts,
-                                    DAQmx_Val_Rising,
-                                    DAQmx_Val_ContSamps,
-                                    DAQmx_Val_Acquired_Into_Buffer,
-                                    DAQmx_Val_GroupByChannel,
-                                    DAQmx_Val_Auto,
-                                    DAQmx_Val_ChanPerLine,
-                                    )
-from PyDAQmx.DAQmxTypes import *
-from PyDAQmx.Task import Task
+from numpy import empty
 
-# from edf import ExportEdf
+from .archive import ExportArchive
+from .calibration import load_calibration
+from .digital import digital_ports, digital_rows, expand_lines, n_edf_words
+from .edf import ExportEdf
+from .flat import ExportFlat
+from .metrics import Metrics, reader_status
+from .pool import FramePool
+from .raw import RawScale, adc_scaling
+from .writer import AsyncWriter
+from ..proc import Detector
 
-# quick workaround for args to pass to EDF
-class Args():
-    edf = r'C:\Users\cashlab\Documents\data'
-    nchan = 96
-    minval = -1
-    maxval = 1
-    s_freq = 1000
+BACKENDS = {'daqmx': 'PyDAQmx',
+            'sim': '.simulated',
+            }
+WRITERS = {'edf': ExportEdf,
+           'flat': ExportFlat,
+           'archive': ExportArchive,
+           }
 
-args = Args()
 
+def load_backend(name):
+    """Import the module with the Task class and the DAQmx constants.
 
-class DAQmxReader(Task):
+    Parameters
+    ----------
+    name : str
+        'daqmx' for NI devices or 'sim' for the simulated device
+
+    Returns
+    -------
+    module
+        PyDAQmx or a module with the same interface
+    """
+    return import_module(BACKENDS[name], __package__)
+
+
+def _physical_channels(dev, prefix, channels):
+    """Convert '0:7,16:23' into b'Dev1/ai0:7, Dev1/ai16:23'."""
+    return ', '.join(dev + '/' + prefix + x.strip()
+                     for x in channels.split(',')).encode('utf-8')
+
+
+def _range_groups(dev, channels, minval, maxval):
+    """Group the consecutive channels with the same input range, so that
+    each group can be created with one call.
+
+    Parameters
+    ----------
+    dev : str
+        name of the device
+    channels : str
+        channels such as '0:7,16:23'
+    minval, maxval : ndarray
+        input range of each channel
+
+    Returns
+    -------
+    list of tuple
+        physical channels of each group (such as b'Dev1/ai0:7'), minimum and
+        maximum
+    """
+    groups = []
+    for chan, low, high in zip(expand_lines(channels), minval, maxval):
+        if groups and groups[-1][1:] == [chan - 1, low, high]:
+            groups[-1][1] = chan
+        else:
+            groups.append([chan, chan, low, high])
+    return [(_physical_channels(dev, 'ai', '{}:{}'.format(first, last)),
+             float(low), float(high))
+            for first, last, low, high in groups]
+
+
+def _count(channels):
+    """Number of channels in a string such as '0:7,16:23'."""
+    n_chan = 0
+    for one in channels.split(','):
+        s = one.split(':')
+        n_chan += int(s[-1]) - int(s[0]) + 1
+    return n_chan
+
+
+class DAQmxReader():
     """Class to interact with NI devices.
-	"""
-    def __init__(self):
-        super().__init__()
-
-        nameToAssignToChannel  = ''.encode('utf-8')  # use default names
-        s_freq = 1000.
-        self.buffer_size = int(s_freq * 0.1)
-        self.timeout = 10.
-        minval = -1.
-        maxval = 1.
-
-        ''' Define Tasks: 
-        Master Analog task is already defined as the parent task (self)
-        Digital/Slave tasks are children (self.___)
-        '''
-        self.MasterDTask = Task()
-        self.SlaveATask = Task()
-        self.SlaveDTask = Task()
 
-        ''' Define inputs channels for Master & Slave devices: Analog & Digital channel types
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments specified by the user
+    funct : function
+        function called with the data of each buffer (matrix of n_chan X
+        n_samples, with the analog channels of the master and of the slave
+        first, and then the digital channels of the master and of the slave)
+        and the time when the buffer was read. If args.digital_mode is 'port',
+        each digital task has only one channel, with all the lines packed in
+        one word (see rw.digital.unpack). funct should call
+        pool.release(data) when it does not need the data anymore, so that
+        the frame can be reused. If args.raw, the data is in counts of the
+        ADC (int16, see RawScale), which can be converted with raw.physical.
+    events_funct : function
+        if args.detect is not None, function called with the events detected
+        in each buffer (see proc.Detector), before funct
+
+    Notes
+    -----
+    The master analog task is the only one that has a callback. The other
+    tasks (digital and slave) are synchronized to its sample clock.
+
+    The events are detected in the callback, so that the GUI does not need to
+    keep up with the data. They are also written as EDF+ annotations, if the
+    data is written to EDF.
+
+    If args.raw, the analog tasks read the counts of the ADC (ReadBinaryI16)
+    directly into the frame, which is written to EDF without any conversion.
+    The offset and gain of each channel are read from the device.
+    """
+    def __init__(self, args, funct, events_funct=None):
+        daqmx = load_backend(args.backend)
+        self.daqmx = daqmx
+        self.Error = daqmx.DAQError
+        self.funct = funct
+
+        nameToAssignToChannel = ''.encode('utf-8')  # use default names
+        s_freq = float(args.s_freq)
+        self.buffer_size = int(args.s_freq * args.buffer_size)
+        self.timeout = args.timeout
+        self.calibration = load_calibration(args)
+        minval = self.calibration.minval
+        maxval = self.calibration.maxval
+
+        ''' Define Tasks:
+        Master Analog task is the task with the callback. Digital/Slave tasks
+        are optional.
         '''
-        # Master Analog Inputs
-        self.CreateAIVoltageChan(b'Dev1/ai0:7, Dev1/ai16:23', 
-                                 nameToAssignToChannel, DAQmx_Val_Diff, minval, maxval, DAQmx_Val_Volts, None)
-        self.nchan = 16
-		
+        self.MasterATask = daqmx.Task()
+        self.MasterDTask = None
+        self.SlaveATask = None
+        self.SlaveDTask = None
+
+        # Master Analog Inputs (channels with different input ranges are
+        # created separately)
+        n_master = _count(args.analoginput)
+        for physical, low, high in _range_groups(args.dev, args.analoginput,
+                                                 minval[:n_master],
+                                                 maxval[:n_master]):
+            self.MasterATask.CreateAIVoltageChan(
+                physical, nameToAssignToChannel, daqmx.DAQmx_Val_Diff, low,
+                high, daqmx.DAQmx_Val_Volts, None)
+        self.MasterATask.name = 'master AI'
+        self.MasterATask.nchan = n_master
+        self.MasterATask.nrows = self.MasterATask.nchan
+
+        # Digital Inputs are read as one channel per line or, if packed, as
+        # one word with all the lines of the port
+        self.packed = args.digital_mode == 'port'
+        if self.packed:
+            line_grouping = daqmx.DAQmx_Val_ChanForAllLines
+            n_digital = lambda lines: 1
+        else:
+            line_grouping = daqmx.DAQmx_Val_ChanPerLine
+            n_digital = _count
+
         # Master Digital Inputs
-        self.MasterDTask.CreateDIChan(b'Dev1/port0/line0:31', 
-                                      nameToAssignToChannel, DAQmx_Val_ChanPerLine)
-        self.MasterDTask.nchan = 32
-
-        # Slave Analog Inputs
-        self.SlaveATask.CreateAIVoltageChan(b'Dev2/ai0:7, Dev2/ai16:23, Dev2/ai32:39, Dev2/ai48:55, Dev2/ai64:71', 
-                                            nameToAssignToChannel, DAQmx_Val_Diff, minval, maxval, DAQmx_Val_Volts, None)
-        self.SlaveATask.nchan = 40
-        
-        # Slave Digital Inputs
-        self.SlaveDTask.CreateDIChan(b'Dev2/port0/line0:7', 
-                                     nameToAssignToChannel, DAQmx_Val_ChanPerLine)
-        self.SlaveDTask.nchan = 8
-		
-        
-        
+        if args.digitalinput is not None:
+            self.MasterDTask = daqmx.Task()
+            self.MasterDTask.CreateDIChan(
+                _physical_channels(args.dev, 'port0/line', args.digitalinput),
+                nameToAssignToChannel, line_grouping)
+            self.MasterDTask.name = 'master DI'
+            self.MasterDTask.nchan = n_digital(args.digitalinput)
+            self.MasterDTask.nrows = self.MasterDTask.nchan
+
+        if args.slave is not None:
+            # Slave Analog Inputs
+            if args.slave_analoginput is not None:
+                self.SlaveATask = daqmx.Task()
+                for physical, low, high in _range_groups(
+                        args.slave, args.slave_analoginput, minval[n_master:],
+                        maxval[n_master:]):
+                    self.SlaveATask.CreateAIVoltageChan(
+                        physical, nameToAssignToChannel,
+                        daqmx.DAQmx_Val_Diff, low, high,
+                        daqmx.DAQmx_Val_Volts, None)
+                self.SlaveATask.name = 'slave AI'
+                self.SlaveATask.nchan = _count(args.slave_analoginput)
+                self.SlaveATask.nrows = self.SlaveATask.nchan
+
+            # Slave Digital Inputs
+            if args.slave_digitalinput is not None:
+                self.SlaveDTask = daqmx.Task()
+                self.SlaveDTask.CreateDIChan(
+                    _physical_channels(args.slave, 'port0/line',
+                                       args.slave_digitalinput),
+                    nameToAssignToChannel, line_grouping)
+                self.SlaveDTask.name = 'slave DI'
+                self.SlaveDTask.nchan = n_digital(args.slave_digitalinput)
+                self.SlaveDTask.nrows = self.SlaveDTask.nchan
+
         ''' Set Clocks for each task: Master/Slave & Analog/Digital
         '''
         # Set Master analog sample clock
-        self.CfgSampClkTiming(b'', s_freq, DAQmx_Val_Rising, DAQmx_Val_ContSamps, self.buffer_size)
-        master_analog_sample_clock = b'/Dev1/ai/SampleClock' # By definition (revealed in ANSI C example: ContAI-ReadDigChan.c
-		# Set Master Digital sample clock to be Master Analog sample clock
-        self.MasterDTask.CfgSampClkTiming(master_analog_sample_clock, s_freq, DAQmx_Val_Rising, DAQmx_Val_ContSamps, self.buffer_size)
-
-        # Synchronize Slave device by setting clocks to master_analog_sample_clock
-        self.SlaveATask.CfgSampClkTiming(master_analog_sample_clock, s_freq, DAQmx_Val_Rising, DAQmx_Val_ContSamps, self.buffer_size)
-        self.SlaveDTask.CfgSampClkTiming(master_analog_sample_clock, s_freq, DAQmx_Val_Rising, DAQmx_Val_ContSamps, self.buffer_size)
-        
-		# Register an event to automatically occur every N samples
-        self.AutoRegisterEveryNSamplesEvent(DAQmx_Val_Acquired_Into_Buffer, self.buffer_size, 0)
-        self.AutoRegisterDoneEvent(0) # Registers a callback function to receive an event when a task stops due to an error or when a finite acquisition task or finite generation task completes execution. A Done event does not occur when a task is stopped explicitly, such as by calling DAQmxStopTask.
-
-		# Start non-master devices first: Digital devices need to be started first, and slave before master
-        self.SlaveDTask.StartTask()
-        self.SlaveATask.StartTask()
-        self.MasterDTask.StartTask()
-
-        
-        # self.edf = None
-        # if args.edf is not None:
-            # self.edf = ExportEdf()
-            # self.edf.open(args)
-
-            
-            
+        self.MasterATask.CfgSampClkTiming(b'', s_freq, daqmx.DAQmx_Val_Rising,
+                                          daqmx.DAQmx_Val_ContSamps,
+                                          self.buffer_size)
+        # By definition (revealed in ANSI C example: ContAI-ReadDigChan.c
+        master_analog_sample_clock = ('/' + args.dev +
+                                      '/ai/SampleClock').encode('utf-8')
+
+        # Set Master Digital sample clock and synchronize Slave device by
+        # setting clocks to master_analog_sample_clock
+        for task in self.tasks[1:]:
+            task.CfgSampClkTiming(master_analog_sample_clock, s_freq,
+                                  daqmx.DAQmx_Val_Rising,
+                                  daqmx.DAQmx_Val_ContSamps, self.buffer_size)
+
+        # Register an event to automatically occur every N samples. The task
+        # looks up the callback by name, so it can be a method of the reader.
+        self.MasterATask.EveryNCallback = self.EveryNCallback
+        self.MasterATask.DoneCallback = self.DoneCallback
+        self.MasterATask.AutoRegisterEveryNSamplesEvent(
+            daqmx.DAQmx_Val_Acquired_Into_Buffer, self.buffer_size, 0)
+        self.MasterATask.AutoRegisterDoneEvent(0)
+
+        # Counts of the ADC are stored as they are, with the packed ports
+        # split into 16-bit rows (as in EDF)
+        self.raw = None
+        dtype = 'float64'
+        if args.raw:
+            offset, gain = adc_scaling(self.MasterATask, args.dev,
+                                       args.analoginput)
+            if self.SlaveATask is not None:
+                slave_offset, slave_gain = adc_scaling(
+                    self.SlaveATask, args.slave, args.slave_analoginput)
+                offset += slave_offset
+                gain += slave_gain
+            self.raw = RawScale(args, offset, gain)
+            if args.digital_mode == 'port':
+                # only the devices with digital inputs have a port
+                d_tasks = [task for task in (self.MasterDTask,
+                                             self.SlaveDTask)
+                           if task is not None]
+                for task, lines in zip(d_tasks, digital_ports(args)):
+                    task.nrows = n_edf_words(lines)
+            dtype = 'int16'
+
+        # Frames are reused once they are released by funct (and by EDF)
+        n_chan = sum(task.nrows for task in self.tasks)
+        self.pool = FramePool(n_chan, self.buffer_size, dtype=dtype)
+        self.n_users = 1
+        n_digital = max([task.nchan for task in self.tasks
+                         if task in (self.MasterDTask, self.SlaveDTask)] + [0])
+        self.digital = empty(n_digital * self.buffer_size,
+                             dtype=daqmx.uInt32)
+
+        self.metrics = Metrics([task.name for task in self.tasks],
+                               args.buffer_size, args.metrics_csv)
+
+        # EDF (or the flat binary file, or the archive) is written in a
+        # separate thread, so that the disk cannot delay the next read
+        self.edf = None
+        if args.edf is not None:
+            edf = WRITERS[args.file_format]()
+            edf.open(args, self.raw, self.calibration)
+            self.edf = AsyncWriter(edf, args.edf_queue, args.edf_policy,
+                                   release=self.pool.release)
+            self.n_users += 1
+
+        # other programs receive the data through a socket
+        self.stream = None
+        if args.stream is not None:
+            from .stream import StreamServer
+            self.stream = StreamServer(args.stream, n_chan, args.stream_queue,
+                                       release=self.pool.release)
+            self.n_users += 1
+
+        self.detector = None
+        self.events_funct = events_funct
+        if args.detect is not None:
+            self.n_detect = args.n_chan - digital_rows(args)  # analog
+            self.detector = Detector(self.n_detect, args.s_freq, args.detect,
+                                     args.refractory / 1000,
+                                     args.detect_filter)
+
+    @property
+    def tasks(self):
+        """Tasks in use, master analog first."""
+        return [task for task in (self.MasterATask, self.SlaveATask,
+                                  self.MasterDTask, self.SlaveDTask)
+                if task is not None]
+
+    def StartTask(self):
+        """Start non-master tasks first: Digital devices need to be started
+        first, and slave before master."""
+        for task in (self.SlaveDTask, self.SlaveATask, self.MasterDTask):
+            if task is not None:
+                task.StartTask()
+        self.MasterATask.StartTask()
+
+    def StopTask(self):
+        """Stop the master first, so that no callback is called on the other
+        tasks after they are stopped."""
+        for task in self.tasks:
+            task.StopTask()
+
+    def ClearTask(self):
+        for task in self.tasks:
+            task.ClearTask()
+        self.metrics.close()
+        if self.stream is not None:
+            self.stream.close()
+
+    def status(self):
+        """State of the acquisition (see metrics.reader_status)."""
+        return reader_status(self)
+
     def EveryNCallback(self):
         # Read the recording once buffer on the device is ready.
-        read = int32()
-        # master_a_nchan = 16
-        # slave_a_nchan = 40
-        # master_d_nchan = 32
-        # slave_d_nchan = 8
-
-        # Data arrays for analog data must be Float 64, which is apparently the python default
-        master_adata = zeros(self.buffer_size * self.nchan)
-        self.ReadAnalogF64(DAQmx_Val_Auto, self.timeout,
-                           DAQmx_Val_GroupByChannel, master_adata,
-                           self.buffer_size * self.nchan, byref(read), None)
-
-        slave_adata = zeros(self.buffer_size * self.SlaveATask.nchan)
-        self.SlaveATask.ReadAnalogF64(DAQmx_Val_Auto, self.timeout,
-                                      DAQmx_Val_GroupByChannel, slave_adata,
-                                      self.buffer_size * self.SlaveATask.nchan, byref(read), None)
-
-        # Data arrays for Digital data must be unisigned int32
-        master_ddata = zeros(self.buffer_size * self.MasterDTask.nchan, dtype=uInt32)
-        slave_ddata = zeros(self.buffer_size * self.SlaveDTask.nchan, dtype=uInt32)
-
-        self.MasterDTask.ReadDigitalU32(DAQmx_Val_Auto, self.timeout,
-                            DAQmx_Val_GroupByChannel, master_ddata,
-                            self.buffer_size * self.MasterDTask.nchan, byref(read), None)
-        self.SlaveDTask.ReadDigitalU32(DAQmx_Val_Auto, self.timeout,
-                            DAQmx_Val_GroupByChannel, slave_ddata,
-                            self.buffer_size * self.SlaveDTask.nchan, byref(read), None)
-        
-        # Reshape data into 2D matrix (not necessarily necessary, but simplifies indexing)
-        master_adata = master_adata.reshape(self.nchan, self.buffer_size)
-        slave_adata = slave_adata.reshape(self.SlaveATask.nchan, self.buffer_size)
-        master_ddata = master_ddata.reshape(self.MasterDTask.nchan, self.buffer_size)
-        slave_ddata = slave_ddata.reshape(self.SlaveDTask.nchan, self.buffer_size)
-
-        # print('MA: ' + str(master_adata[0, 0]) + ' SA: ' + str(slave_adata[0, 0]))
-        # print('MD: ' + str(master_ddata[0, 0]) + ' SD: ' + str(slave_ddata[0, 0]))
-        for i in range(0,50):
-            print('MA: %.3f' %master_adata[0, i] + ' SA: %.3f' %slave_adata[0, i] + ' MD: ' + str(master_ddata[0, i]) + ' SD: ' + str(slave_ddata[0, i]))
-
-        # if self.edf is not None:
-            # self.edf.write(vstack((master_adata, master_ddata,
-                                   # slave_adata, slave_ddata)))
-
-        return 0 # The function should return an integer
+        self.metrics.start()
+        read = self.daqmx.int32()
+        avail = self.daqmx.uInt32()
+
+        # Each task reads directly into its rows of the frame
+        data = self.pool.get(self.n_users)
+        i = 0
+        for task in self.tasks:
+            x = data[i:i + task.nrows].reshape(-1)
+            try:
+                if task in (self.MasterATask, self.SlaveATask):
+                    # Data arrays for analog data must be Float 64 (or int16
+                    # for the counts of the ADC)
+                    if self.raw is not None:
+                        read_analog = task.ReadBinaryI16
+                    else:
+                        read_analog = task.ReadAnalogF64
+                    read_analog(self.daqmx.DAQmx_Val_Auto, self.timeout,
+                                self.daqmx.DAQmx_Val_GroupByChannel, x,
+                                x.size, byref(read), None)
+                else:
+                    # Data arrays for Digital data must be unisigned int32, so
+                    # they are read in a separate array and then copied
+                    d = self.digital[:task.nchan * self.buffer_size]
+                    task.ReadDigitalU32(self.daqmx.DAQmx_Val_Auto,
+                                        self.timeout,
+                                        self.daqmx.DAQmx_Val_GroupByChannel, d,
+                                        d.size, byref(read), None)
+                    if self.raw is not None and self.packed:
+                        # packed port, in 16-bit words with the EDF offset
+                        self.raw.pack(d, data[i:i + task.nrows])
+                    elif self.packed:
+                        x[:] = d
+                    else:  # each line as 0 or 1
+                        x[:] = d != 0
+                task.GetReadAvailSampPerChan(byref(avail))
+
+            except self.daqmx.DAQError as err:
+                # the buffer is incomplete, so it's not passed on
+                self.metrics.error(task.name, err)
+                self.metrics.stop()
+                for _ in range(self.n_users):
+                    self.pool.release(data)
+                return 0
+
+            self.metrics.read(task.name, read.value, self.buffer_size,
+                              avail.value)
+            i += task.nrows
+
+        if self.detector is not None:
+            if self.raw is not None:
+                events = self.detector.detect(self.raw.analog(data))
+            else:
+                events = self.detector.detect(data[:self.n_detect])
+            if self.edf is not None:
+                self.edf.add_events(events)
+            if self.events_funct is not None:
+                self.events_funct(events)
+
+        if self.edf is not None:
+            self.edf.write(data)
+
+        timestamp = time()
+        if self.stream is not None:
+            self.stream.write(data, timestamp)
+        self.funct(data, timestamp)
+        self.metrics.stop()
+
+        return 0  # The function should return an integer
 
     def DoneCallback(self, status):
         """Close the recordings, although I'm not sure when this is called.
         Probably raise error if recordings are interrupted
         """
-        self.SlaveDTask.StopTask()
-        self.SlaveDTask.ClearTask()
-        self.SlaveATask.StopTask()
-        self.SlaveATask.ClearTask()
-        self.MasterDTask.StopTask()
-        self.MasterDTask.ClearTask()
-
-        # if self.edf is not None:
-            # self.edf.close()
-        # return 0
-
-
-reader = DAQmxReader()
-reader.StartTask()
-input('Acquiring samples continuously. Press Enter to interrupt\n')
-reader.StopTask()
-reader.ClearTask()
+        for task in self.tasks[1:]:
+            task.StopTask()
+            task.ClearTask()
+
+        if self.edf is not None:
+            self.edf.close()
+        return 0
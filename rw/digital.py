@@ -0,0 +1,77 @@
+"""Functions to work with digital ports acquired as one word per sample
+(packed), instead of one value per line.
+"""
+from numpy import asarray, isnan, nan, nan_to_num, newaxis, uint32
+
+EDF_WORD = 16  # bits of the word stored in each EDF channel
+
+
+def expand_lines(lines):
+    """Convert '0:7' into [0, 1, ..., 7] (and '0:3,6' into [0, 1, 2, 3, 6]).
+    """
+    out = []
+    for one in lines.split(','):
+        s = one.split(':')
+        out.extend(range(int(s[0]), int(s[-1]) + 1))
+    return out
+
+
+def digital_ports(args):
+    """Lines which are acquired in each digital port (master first).
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments specified by the user
+
+    Returns
+    -------
+    list of list of int
+        for each port, the index of the lines
+    """
+    ports = []
+    if args.digitalinput is not None:
+        ports.append(expand_lines(args.digitalinput))
+    if args.slave is not None and args.slave_digitalinput is not None:
+        ports.append(expand_lines(args.slave_digitalinput))
+    return ports
+
+
+def digital_rows(args):
+    """Number of rows of the data with the digital inputs (one for each
+    line, or one for each port if they are packed), which come after the
+    analog channels.
+    """
+    ports = digital_ports(args)
+    if args.digital_mode == 'port':
+        return len(ports)
+    return sum(len(lines) for lines in ports)
+
+
+def unpack(words, lines):
+    """Unpack the lines from the digital words.
+
+    Parameters
+    ----------
+    words : ndarray
+        vector with the value of the port for each sample (it can be float,
+        and NaN for missing samples)
+    lines : list of int
+        index of the lines to unpack
+
+    Returns
+    -------
+    ndarray
+        n_lines X n_samples matrix with 0 and 1 (float, so that missing
+        samples are NaN)
+    """
+    w = nan_to_num(words).astype(uint32)
+    out = ((w[newaxis, :] >> asarray(lines, dtype=uint32)[:, newaxis]) &
+           1).astype(float)
+    out[:, isnan(words)] = nan
+    return out
+
+
+def n_edf_words(lines):
+    """Number of 16-bit channels needed to store one port in EDF."""
+    return max(lines) // EDF_WORD + 1
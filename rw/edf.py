@@ -1,109 +1,631 @@
-from datetime import datetime
-from struct import pack
+from datetime import datetime, timedelta
+from os import fsync
+try:
+    from os import posix_fallocate
+except ImportError:  # Windows
+    pass
+from os.path import getsize, splitext
+from threading import Lock
 
-from numpy import append, delete, empty, iinfo
+from numpy import (array, asarray, clip, concatenate, copyto, cumsum, empty,
+                   iinfo, int64, memmap, multiply, newaxis, ones, rint, uint32,
+                   vstack, zeros)
 
-EDF_FORMAT = 'int16'  # by definition
+from .annotations import ExportAnnotations, annotations_name, split_events
+from .calibration import load_calibration
+from .digital import digital_ports, digital_rows, n_edf_words, EDF_WORD
+from .pyramid import ExportPyramid, pyramid_factors
+from ..proc import FilterBank
+
+EDF_FORMAT = '<i2'  # by definition, little-endian 2 Byte int
 edf_iinfo = iinfo(EDF_FORMAT)
 DIGITAL_MAX = edf_iinfo.max
 DIGITAL_MIN = edf_iinfo.min
 
 
+def to_digital(x, gain, offset, out, work):
+    """Convert physical values into the digital values of EDF, without
+    allocating any array.
+
+    Parameters
+    ----------
+    x : ndarray
+        n_chan X n_samples matrix with the physical values
+    gain, offset : ndarray
+        n_chan X 1 matrices (digital value = x * gain + offset)
+    out : ndarray
+        n_chan X n_samples matrix (int16) where the digital values are
+        written, such as a part of the record
+    work : ndarray
+        n_chan X (at least) n_samples matrix (float), used as scratch space
+
+    Notes
+    -----
+    The values are rounded and clipped to the digital range before they are
+    converted to int16, so values out of range saturate (instead of wrapping
+    around).
+    """
+    w = work[:x.shape[0], :x.shape[1]]
+    multiply(x, gain, out=w)
+    w += offset
+    rint(w, out=w)
+    clip(w, DIGITAL_MIN, DIGITAL_MAX, out=w)
+    copyto(out, w, casting='unsafe')
+
+
+def _edf_number(x):
+    """Format a number so that it fits in a field of 8 characters."""
+    s = str(x)
+    precision = 8
+    while len(s) > 8 and precision > 0:
+        s = '{:.{}g}'.format(x, precision)
+        precision -= 1
+    return s
+
+
 class ExportEdf():
     """Export data to EDF.
 
     Notes
     -----
     Data is always recorded as 2 Byte int (which is 'int16').
+
+    If the digital ports are packed (args.digital_mode is 'port'), each port
+    is stored in one or two channels with 16 bits of the word each (such as
+    'D0[0:15]' and 'D0[16:31]'), with the physical values between 0 and 65535.
+
+    The file is kept open during the recordings. The samples are copied into
+    a preallocated record (n_chan X s_freq), which is written to disk with
+    one write as soon as it's full. Samples in a record which is not complete
+    when the file is closed are not written.
+
+    The number of records in the header is -1 (unknown) until it's updated
+    every args.edf_header records, before each preallocation and when the
+    file is closed, so that a file which was not closed (because of a crash)
+    has a header that is at most a few records behind, or -1 (EdfReader
+    then reads the records which were written after those in the header). The file can be preallocated
+    in extents of args.edf_prealloc MB (and it's truncated when closed).
+
+    If args.edf_segment (in s) or args.edf_segment_size (in MB) is not 0, the
+    recordings are split into numbered files ('rec_000.edf', 'rec_001.edf',
+    ...). A new segment starts at the beginning of a record, and its start
+    time in the header is the start time of the first segment plus the
+    duration of the previous segments, so there is no gap between segments.
+
+    If args.edf_filter is not None, the analog channels are filtered before
+    being written (see FilterBank) and the filters are described in the
+    'prefiltering' field of the header.
+
+    If args.detect is not None, the events passed to add_events are written
+    as EDF+ annotations in a file next to each EDF file ('rec_events.edf',
+    see ExportAnnotations), one data record for each data record of the EDF
+    file.
+
+    Each analog channel has its own label, unit and physical range (see
+    Calibration): the range is the input range, converted into the unit of
+    the channel. The digital lines (if they are not packed) have the range 0
+    to 1. The data is converted with the gain and offset of each channel
+    directly into the record (see to_digital).
+
+    If the data is in counts of the ADC (args.raw, see RawScale), it's
+    written as it is, and the offset and gain of each analog channel are only
+    stored in the header (as physical minimum and maximum).
+
+    If args.pyramid is not None, the min and max of the records are also
+    written at several levels (see ExportPyramid), for the overview.
     """
     def __init__(self):
         self.filename = None
         self.s_freq = None
         self.n_records = 0
-        self.buffer = None
+        self.record = None
+        self.idx = 0
+        self.flush = 1
+        self.fsync = 0
+        self.f = None
+        self.segment = 0
+        self.n_records_total = 0
+        self.filter = None
+        self.annotations = None
+        self.pending = None
+        self.n_events_dropped = 0  # in the previous segments
+        self.raw = None
+        self.pyramid = None
+
+    def open(self, args, raw=None, calibration=None):
+        """Create a header, with predefined values.
 
-    def open(self, args):
-        """Create a header, with predefined values."""
-        start_time = datetime.now()
-        chan_labels = [str(x) for x in range(args.n_chan)]  # maybe more creative?
+        Parameters
+        ----------
+        args : argparse.Namespace
+            arguments specified by the user
+        raw : instance of RawScale
+            if the data is in counts of the ADC, the layout of the buffers and
+            the scaling of each channel
+        calibration : instance of Calibration
+            description of the analog channels (if None, it's loaded from
+            args.calibration)
+        """
+        self.start_time = datetime.now()
         s_freq = args.s_freq
-        subj_info = 'X X X X'
+        self.subj_info = 'X X X X'
+        if calibration is None:
+            calibration = load_calibration(args)
+
+        # the analog channels, then the digital lines, then the packed ports
+        ports = []
+        if args.digital_mode == 'port':
+            ports = digital_ports(args)
+        self.n_analog = args.n_chan - len(ports)
+        n_cal = len(calibration)
+        n_lines = self.n_analog - n_cal
+        chan_labels = (list(calibration.labels) +
+                       [str(x) for x in range(n_cal, self.n_analog)])
+        physical_dim = list(calibration.units) + [''] * n_lines
+        if raw is not None:
+            # counts of the ADC, and the digital lines as they are
+            analog_min, analog_max = calibration.physical(
+                *raw.physical_range())
+            line_min, line_max = DIGITAL_MIN, DIGITAL_MAX
+        else:
+            analog_min, analog_max = calibration.physical(calibration.minval,
+                                                          calibration.maxval)
+            line_min, line_max = 0, 1
+        # the values as they are written in the header
+        physical_min = ([float(_edf_number(x)) for x in analog_min] +
+                        [line_min] * n_lines)
+        physical_max = ([float(_edf_number(x)) for x in analog_max] +
+                        [line_max] * n_lines)
+        self.raw = raw
+
+        # digital value = value in V * gain + offset, for each analog row
+        scale = ((DIGITAL_MAX - DIGITAL_MIN) /
+                 (asarray(physical_max) - asarray(physical_min)))
+        cal_gain = concatenate((calibration.gain, ones(n_lines)))
+        cal_offset = concatenate((calibration.offset, zeros(n_lines)))
+        self.gain = (cal_gain * scale)[:, newaxis]
+        self.offset = ((cal_offset - asarray(physical_min)) * scale +
+                       DIGITAL_MIN)[:, newaxis]
+
+        # for each 16-bit channel, the row of its word and the shift
+        words = []
+        for i, lines in enumerate(ports):
+            for j in range(n_edf_words(lines)):
+                words.append((self.n_analog + i, j * EDF_WORD))
+                chan_labels.append('D{}[{}:{}]'.format(
+                    i, j * EDF_WORD, (j + 1) * EDF_WORD - 1))
+                physical_dim.append('')
+                physical_min.append(0)
+                physical_max.append(2 ** EDF_WORD - 1)
+        self.word_rows = array([w[0] for w in words], dtype=int)
+        self.word_shifts = array([w[1] for w in words], dtype=uint32)
+        self.chan_labels = chan_labels
+        self.physical_dim = physical_dim
+        self.physical_min = physical_min
+        self.physical_max = physical_max
+        n_chan = len(chan_labels)
+
+        # only the analog channels are filtered
+        self.n_filtered = args.n_chan - digital_rows(args)
+        prefiltering = [''] * n_chan
+        if args.edf_filter is not None:
+            self.filter = FilterBank(self.n_filtered, s_freq, args.edf_filter)
+            prefiltering[:self.n_filtered] = ([' '.join(self.filter.labels)] *
+                                              self.n_filtered)
+        self.prefiltering = prefiltering
+
+        self.s_freq = int(s_freq)
+        self.filename = args.edf
+        self.record = empty((n_chan, self.s_freq), dtype=EDF_FORMAT)
+        self.work = empty((self.n_analog, self.s_freq))
+        self.words = empty((len(words), self.s_freq), dtype=int64)
+        self.idx = 0
+        self.flush = args.edf_flush
+        self.fsync = args.edf_fsync
+        self.header_every = args.edf_header
+        self.prealloc = int(args.edf_prealloc * 1024 ** 2)
+        self.header_n_bytes = 256 + 256 * n_chan
+
+        # maximum number of records in each segment (0 means no limit)
+        self.max_records = int(args.edf_segment)
+        if args.edf_segment_size:
+            by_size = int((args.edf_segment_size * 1024 ** 2 -
+                           self.header_n_bytes) // self.record.nbytes)
+            if not self.max_records or by_size < self.max_records:
+                self.max_records = max(by_size, 1)
+
+        if args.detect is not None:
+            self.max_events = args.events_max
+            self.pending = []
+            self.lock = Lock()
+
+        if args.pyramid is not None:
+            self.pyramid = ExportPyramid(args.edf, pyramid_factors(args),
+                                         self.s_freq, self.describe_channels(),
+                                         EDF_FORMAT)
+
+        self.segment = 0
+        self.n_records_total = 0
+        self._open_segment()
+
+    def describe_channels(self):
+        """Label, unit, gain and offset (physical value = gain * digital
+        value + offset) of each channel, as in the header."""
+        physical_min = asarray(self.physical_min, dtype=float)
+        physical_max = asarray(self.physical_max, dtype=float)
+        gain = (physical_max - physical_min) / (DIGITAL_MAX - DIGITAL_MIN)
+        offset = physical_min - gain * DIGITAL_MIN
+        return [{'label': label, 'unit': unit, 'gain': float(g),
+                 'offset': float(o)}
+                for label, unit, g, o in zip(self.chan_labels,
+                                             self.physical_dim, gain, offset)]
+
+    def segment_name(self, segment):
+        """Name of the file of one segment ('rec.edf' if there are no
+        segments, otherwise 'rec_000.edf', 'rec_001.edf', ...)."""
+        if not self.max_records:
+            return self.filename
+        root, ext = splitext(self.filename)
+        return '{}_{:03d}{}'.format(root, segment, ext)
+
+    def _open_segment(self):
+        """Open a new file and write the header."""
+        start_time = self.start_time + timedelta(seconds=self.n_records_total)
         recording_info = ('Startdate ' +
                            start_time.strftime('%d-%b-%Y') +
                            ' X X test')
+        n_chan = len(self.chan_labels)
+        s_freq = self.s_freq
 
-        self.s_freq = s_freq
-        self.filename = args.edf
-        self.convert = lambda x: ((x - args.minval) /
-                                  (args.maxval - args.minval) *
-                                  (DIGITAL_MAX - DIGITAL_MIN) + DIGITAL_MIN)
-        self.buffer = empty((args.n_chan, 0), dtype=EDF_FORMAT)
-
-        with open(self.filename, 'wb') as f:
-            f.write('{:<8}'.format(0).encode('ascii'))
-            f.write('{:<80}'.format(subj_info).encode('ascii'))  # subject_id
-            f.write('{:<80}'.format(recording_info).encode('ascii'))
-            f.write(start_time.strftime('%d.%m.%y').encode('ascii'))
-            f.write(start_time.strftime('%H.%M.%S').encode('ascii'))
-
-            n_records = -1   # while writing
-            record_length = 1
-
-            header_n_bytes = 256 + 256 * args.n_chan
-            f.write('{:<8d}'.format(header_n_bytes).encode('ascii'))
-            f.write((' ' * 44).encode('ascii'))  # reserved for EDF+
-
-            f.write('{:<8}'.format(n_records).encode('ascii'))
-            f.write('{:<8d}'.format(record_length).encode('ascii'))
-            f.write('{:<4}'.format(args.n_chan).encode('ascii'))
-
-            for one_label in chan_labels:
-                f.write('{:<16}'.format(one_label).encode('ascii'))  # label
-            for _ in range(args.n_chan):
-                f.write(('{:<80}').format('').encode('ascii'))  # tranducer
-            for _ in range(args.n_chan):
-                f.write('{:<8}'.format('V').encode('ascii'))  # physical_dim
-            for _ in range(args.n_chan):
-                f.write('{:<8}'.format(args.minval).encode('ascii'))
-            for _ in range(args.n_chan):
-                f.write('{:<8}'.format(args.maxval).encode('ascii'))
-            for _ in range(args.n_chan):
-                f.write('{:<8}'.format(DIGITAL_MIN).encode('ascii'))
-            for _ in range(args.n_chan):
-                f.write('{:<8}'.format(DIGITAL_MAX).encode('ascii'))
-            for _ in range(args.n_chan):
-                f.write('{:<80}'.format('').encode('ascii'))  # prefiltering
-            for _ in range(args.n_chan):
-                f.write('{:<8d}'.format(s_freq).encode('ascii'))  # n_smp in record
-            for _ in range(args.n_chan):
-                f.write((' ' * 32).encode('ascii'))
+        self.n_records = 0
+        f = open(self.segment_name(self.segment), 'wb')
+        self.f = f
+        f.write('{:<8}'.format(0).encode('ascii'))
+        f.write('{:<80}'.format(self.subj_info).encode('ascii'))  # subject_id
+        f.write('{:<80}'.format(recording_info).encode('ascii'))
+        f.write(start_time.strftime('%d.%m.%y').encode('ascii'))
+        f.write(start_time.strftime('%H.%M.%S').encode('ascii'))
+
+        n_records = -1   # unknown, updated while writing
+        record_length = 1
+
+        f.write('{:<8d}'.format(self.header_n_bytes).encode('ascii'))
+        f.write((' ' * 44).encode('ascii'))  # reserved for EDF+
+
+        f.write('{:<8}'.format(n_records).encode('ascii'))
+        f.write('{:<8d}'.format(record_length).encode('ascii'))
+        f.write('{:<4}'.format(n_chan).encode('ascii'))
+
+        for one_label in self.chan_labels:
+            f.write('{:<16}'.format(one_label).encode('ascii'))  # label
+        for _ in range(n_chan):
+            f.write(('{:<80}').format('').encode('ascii'))  # tranducer
+        for one_dim in self.physical_dim:
+            f.write('{:<8}'.format(one_dim).encode('ascii'))
+        for one_min in self.physical_min:
+            f.write('{:<8}'.format(_edf_number(one_min)).encode('ascii'))
+        for one_max in self.physical_max:
+            f.write('{:<8}'.format(_edf_number(one_max)).encode('ascii'))
+        for _ in range(n_chan):
+            f.write('{:<8}'.format(DIGITAL_MIN).encode('ascii'))
+        for _ in range(n_chan):
+            f.write('{:<8}'.format(DIGITAL_MAX).encode('ascii'))
+        for one_filter in self.prefiltering:
+            f.write('{:<80}'.format(one_filter[:80]).encode('ascii'))
+        for _ in range(n_chan):
+            f.write('{:<8d}'.format(s_freq).encode('ascii'))  # n_smp in record
+        for _ in range(n_chan):
+            f.write((' ' * 32).encode('ascii'))
+
+        self.data_end = self.header_n_bytes
+        self.allocated = 0
+        self._open_annotations(
+            annotations_name(self.segment_name(self.segment)), start_time)
+
+    def _open_annotations(self, filename, start_time):
+        """Open the file with the annotations of the current segment, if
+        the events are detected."""
+        if self.pending is None:
+            return
+        self.first_sample = self.n_records_total * self.s_freq
+        self.annotations = ExportAnnotations(filename, start_time,
+                                             self.subj_info, self.s_freq,
+                                             self.max_events)
+
+    def _write_annotations(self):
+        """Write the events of the current record as annotations."""
+        if self.annotations is None:
+            return
+        end = (self.n_records_total + 1) * self.s_freq
+        with self.lock:
+            events, self.pending = split_events(self.pending, end)
+        self.annotations.write_record(events, self.first_sample)
+
+    def _close_annotations(self):
+        if self.annotations is None:
+            return
+        self.n_events_dropped += self.annotations.n_dropped
+        self.annotations.close()
+        self.annotations = None
+
+    def add_events(self, events):
+        """Add the events to write as annotations.
+
+        Parameters
+        ----------
+        events : ndarray
+            events (see Detector), after the events which were already added
+        """
+        with self.lock:
+            self.pending.append(events)
 
     def write(self, data):
         """Write data to the EDF file. We write every second (the duration
         of one records in the EDF is one second, and the number of samples in
         one record is the sampling frequency.)
+
+        Parameters
+        ----------
+        data : ndarray
+            n_chan X n_samples matrix (or, if the data is in counts, n_rows X
+            n_samples, see RawScale). n_samples does not need to be a divisor
+            of the sampling frequency: the samples which do not fill a record
+            are kept until the next call.
         """
-        dat = self.convert(data)
-        dat = dat.astype(EDF_FORMAT)
+        if self.filter is not None:
+            analog = self.filter.apply(data[:self.n_filtered])
+            if self.raw is not None:
+                analog = clip(rint(analog), DIGITAL_MIN, DIGITAL_MAX)
+            data = vstack((analog, data[self.n_filtered:]))
+
+        i = 0
+        n_smp = data.shape[1]
+        while i < n_smp:
+            n = min(n_smp - i, self.s_freq - self.idx)
+            if self.raw is not None:
+                self.record[:, self.idx:self.idx + n] = data[:, i:i + n]
+            else:
+                self._convert(data[:, i:i + n],
+                              self.record[:, self.idx:self.idx + n])
+            self.idx += n
+            i += n
+
+            if self.idx == self.s_freq:
+                self._write_record()
 
-        dat[dat > DIGITAL_MAX] = DIGITAL_MAX
-        dat[dat < DIGITAL_MIN] = DIGITAL_MIN
+    def _convert(self, data, out):
+        """Convert the data in V (and the packed ports) into the digital
+        values of EDF, directly into out (part of the record)."""
+        to_digital(data[:self.n_analog], self.gain, self.offset,
+                   out[:self.n_analog], self.work)
+        for k, (row, shift) in enumerate(zip(self.word_rows,
+                                             self.word_shifts)):
+            w = self.words[k, :data.shape[1]]
+            w[:] = data[row]
+            w >>= shift
+            w &= 2 ** EDF_WORD - 1
+            w += DIGITAL_MIN
+            copyto(out[self.n_analog + k], w, casting='unsafe')
 
-        self.buffer = append(self.buffer, dat, axis=1)
+    @property
+    def events_dropped(self):
+        """Number of events which were not written, because there were more
+        than args.events_max in one record."""
+        n_dropped = self.n_events_dropped
+        if self.annotations is not None:
+            n_dropped += self.annotations.n_dropped
+        return n_dropped
 
-        if self.buffer.shape[1] >= self.s_freq:  # what if not integer
-            x = self.buffer.flatten(order='C')
+    def _write_record(self):
+        """Write the full record with one write and flush / fsync the file
+        every self.flush / self.fsync records (never, if 0)."""
+        if self.max_records and self.n_records == self.max_records:
+            self._close_segment()
+            self.segment += 1
+            self._open_segment()
 
-            with open(self.filename, 'ab') as f:
-                f.write(pack('<' + 'h' * len(x), *x))
+        if self.prealloc and self.data_end + self.record.nbytes > self.allocated:
+            self._preallocate()
 
-            self.n_records += 1
-            self.buffer = delete(self.buffer, range(self.buffer.shape[1]),
-                                 axis=1)
+        self.f.write(memoryview(self.record).cast('B'))
+        self.data_end += self.record.nbytes
+        self._write_annotations()
+        if self.pyramid is not None:
+            self.pyramid.write(self.record)
+        self.n_records += 1
+        self.n_records_total += 1
+        self.idx = 0
+
+        if self.header_every and self.n_records % self.header_every == 0:
+            self._update_header()
+        if self.flush and self.n_records % self.flush == 0:
+            self.f.flush()
+        if self.fsync and self.n_records % self.fsync == 0:
+            self.f.flush()
+            fsync(self.f.fileno())
+
+    def _preallocate(self):
+        """Allocate the next extent of the file on disk (the header has the
+        number of records first, so that the zeros of the extent are not
+        taken for records if the file is not closed)."""
+        size = max(self.allocated, self.data_end) + self.prealloc
+        self._update_header()
+        self.f.flush()
+        try:
+            posix_fallocate(self.f.fileno(), 0, size)
+        except NameError:  # Windows has no posix_fallocate, truncate instead
+            self.f.truncate(size)
+        self.allocated = size
+
+    def _update_header(self):
+        """Write the number of records in the header."""
+        self.f.seek(236)  # where n_records is
+        self.f.write('{:<8}'.format(self.n_records).encode('ascii'))
+        self.f.seek(self.data_end)
+        if self.annotations is not None:
+            self.annotations.update_header()
+
+    def _close_segment(self):
+        self._update_header()
+        if self.allocated:
+            self.f.truncate(self.data_end)
+        self.f.close()
+        self.f = None
+        self._close_annotations()
 
     def close(self):
-        """Update header with the number of records.
+        """Update header with the number of records and close the file.
+        """
+        if self.f is None:
+            return
+        self._close_segment()
+        if self.pyramid is not None:
+            self.pyramid.close()
+
+
+def _count_records(filename, offset, record_n_smp, n_header, n_on_disk):
+    """Number of records of a file which was not closed, without the
+    records at the end (after the n_header records in the header) which are
+    only zeros."""
+    records = memmap(filename, dtype=EDF_FORMAT, mode='r', offset=offset,
+                     shape=(n_on_disk, record_n_smp))
+    for n in range(n_on_disk, n_header, -1):
+        if records[n - 1].any():
+            return n
+    return n_header
+
+
+class EdfReader():
+    """Read EDF files (such as those written by ExportEdf) without loading
+    them in memory.
+
+    Parameters
+    ----------
+    filename : str
+        path to the EDF file
+
+    Attributes
+    ----------
+    header : dict
+        values in the header ('subject', 'recording', 'start_time',
+        'n_records', 'record_length')
+    labels : list of str
+        name of each channel
+    units : list of str
+        physical dimension of each channel
+    s_freq : ndarray
+        sampling frequency of each channel
+
+    Notes
+    -----
+    The data is memory-mapped, so only the samples which are requested are
+    read from disk. If the file was not closed, the header has fewer records
+    than the file (or -1): the records after those in the header are also
+    read, except the records at the end which are only zeros (the extent
+    preallocated by ExportEdf, not written yet).
+    """
+    def __init__(self, filename):
+        self.filename = filename
+
+        with open(filename, 'rb') as f:
+            hdr = f.read(256).decode('ascii')
+            n_chan = int(hdr[252:256])
+            chans = f.read(256 * n_chan).decode('ascii')
+
+        def _field(start, size):
+            """Values of one field for all the channels."""
+            start *= n_chan
+            return [chans[start + i * size:start + (i + 1) * size].strip()
+                    for i in range(n_chan)]
+
+        self.labels = _field(0, 16)
+        self.units = _field(16 + 80, 8)
+        physical_min = asarray(_field(16 + 80 + 8, 8), dtype=float)
+        physical_max = asarray(_field(16 + 80 + 16, 8), dtype=float)
+        digital_min = asarray(_field(16 + 80 + 24, 8), dtype=float)
+        digital_max = asarray(_field(16 + 80 + 32, 8), dtype=float)
+        self.n_smp = asarray(_field(16 + 80 + 40 + 80, 8), dtype=int)
+
+        header_n_bytes = int(hdr[184:192])
+        record_length = float(hdr[244:252])
+        record_n_smp = self.n_smp.sum()
+        n_records = int(hdr[236:244])
+        n_on_disk = ((getsize(filename) - header_n_bytes) //
+                     (record_n_smp * 2))
+        if n_on_disk > n_records:  # not closed
+            n_records = _count_records(filename, header_n_bytes,
+                                       record_n_smp, max(n_records, 0),
+                                       n_on_disk)
+
+        self.header = {'subject': hdr[8:88].strip(),
+                       'recording': hdr[88:168].strip(),
+                       'start_time': datetime.strptime(hdr[168:184],
+                                                       '%d.%m.%y%H.%M.%S'),
+                       'n_records': n_records,
+                       'record_length': record_length,
+                       }
+        self.s_freq = self.n_smp / record_length
+        self.gain = ((physical_max - physical_min) /
+                     (digital_max - digital_min))
+        self.offset = physical_min - self.gain * digital_min
+
+        self.records = memmap(filename, dtype=EDF_FORMAT, mode='r',
+                              offset=header_n_bytes,
+                              shape=(n_records, record_n_smp))
+        self.chan_start = cumsum(self.n_smp) - self.n_smp
+
+    def raw(self, chan):
+        """Samples of one channel in each record, without copying.
+
+        Parameters
+        ----------
+        chan : int
+            index of the channel
+
+        Returns
+        -------
+        ndarray
+            n_records X n_samples (per record) view of the file (int16)
+        """
+        start = self.chan_start[chan]
+        return self.records[:, start:start + self.n_smp[chan]]
+
+    def read(self, chan, start=0, end=None, physical=True):
+        """Samples of one channel in a time range.
+
+        Parameters
+        ----------
+        chan : int
+            index of the channel
+        start : float
+            start time, in s from the beginning of the recording
+        end : float
+            end time, in s (the end of the recording, if None)
+        physical : bool
+            convert the samples to physical units (only the samples which are
+            returned are converted)
+
+        Returns
+        -------
+        ndarray
+            vector with the samples. If physical is False and the time range
+            is within one record, it's a view of the file; otherwise only the
+            samples in the time range are read.
         """
-        with open(self.filename, 'rb+') as f:
-            f.seek(236)  # where n_records is
-            f.write('{:<8}'.format(self.n_records).encode('ascii'))
+        n_smp = self.n_smp[chan]
+        x = self.raw(chan)
+        i_start = max(int(round(start * self.s_freq[chan])), 0)
+        if end is None:
+            i_end = x.shape[0] * n_smp
+        else:
+            i_end = min(int(round(end * self.s_freq[chan])),
+                        x.shape[0] * n_smp)
+
+        first = i_start // n_smp
+        last = max((i_end - 1) // n_smp + 1, first)
+        x = x[first:last].reshape(-1)  # copy only if more than one record
+        x = x[i_start - first * n_smp:i_end - first * n_smp]
+
+        if physical:
+            x = x * self.gain[chan] + self.offset[chan]
+        return x
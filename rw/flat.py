@@ -0,0 +1,412 @@
+"""Flat binary files with a JSON sidecar, for recordings with sampling
+frequencies or numbers of channels that EDF does not handle efficiently.
+"""
+from datetime import datetime
+from json import dump, load
+from os import fsync, replace
+from os.path import basename, dirname, getsize, join, splitext
+from threading import Lock
+
+from numpy import (asarray, clip, concatenate, dtype as np_dtype, empty,
+                   fromfile, memmap, rint, vstack)
+
+from .calibration import load_calibration
+from .digital import EDF_WORD, digital_ports, digital_rows
+from .pyramid import ExportPyramid, pyramid_factors
+from .raw import EDF_OFFSET
+from ..proc import FilterBank
+from ..proc.detect import EVENT_DTYPE
+
+FORMAT = 'OpBoxPhys flat'
+VERSION = 1
+
+
+def sidecar_name(filename):
+    """Name of the JSON sidecar ('rec.bin' -> 'rec.json')."""
+    return splitext(filename)[0] + '.json'
+
+
+def events_name(filename):
+    """Name of the file with the events ('rec.bin' -> 'rec_events.bin')."""
+    root, ext = splitext(filename)
+    return root + '_events' + ext
+
+
+class ExportFlat():
+    """Export data to a flat binary file, with the same interface as
+    ExportEdf.
+
+    Notes
+    -----
+    The samples are written as they are in the buffers (float64 in V, or the
+    int16 counts of the ADC if args.raw, see RawScale), sample-major: all the
+    channels of the first sample, then all the channels of the second
+    sample, and so on. So each file is a n_samples X n_chan matrix, which can
+    be opened with numpy.memmap (see FlatReader). Each buffer is transposed
+    into a preallocated matrix and written with one write.
+
+    The JSON sidecar ('rec.json' for 'rec.bin') describes the channels
+    (label, unit, and the gain and offset which convert the values into
+    physical units), the data type, the sampling frequency, the start time
+    and the segments. It's replaced atomically when a segment starts and when
+    the file is closed. If the recordings did not end properly, the number of
+    samples of the last segment is computed from the size of the file.
+
+    args.edf_segment and args.edf_segment_size split the recordings into
+    numbered files as in ExportEdf, but a segment can start at any sample.
+    args.edf_flush and args.edf_fsync count buffers (instead of records).
+    args.edf_filter filters the analog channels as in ExportEdf.
+
+    The events passed to add_events are appended to 'rec_events.bin' (with
+    the dtype of proc.detect.EVENT_DTYPE, and the sample since the beginning
+    of the recordings).
+
+    If args.pyramid is not None, the min and max of the buffers are also
+    written at several levels (see ExportPyramid), for the overview.
+    """
+    def __init__(self):
+        self.filename = None
+        self.f = None
+        self.filter = None
+        self.pending = None
+        self.f_events = None
+        self.n_events_dropped = 0  # there is no limit on the events
+        self.segments = []
+        self.n_samples = 0
+        self.n_buffers = 0
+        self.buffer = None
+        self.pyramid = None
+
+    def open(self, args, raw=None, calibration=None):
+        """Create the first segment and the sidecar.
+
+        Parameters
+        ----------
+        args : argparse.Namespace
+            arguments specified by the user
+        raw : instance of RawScale
+            if the data is in counts of the ADC, the layout of the buffers and
+            the scaling of each channel
+        calibration : instance of Calibration
+            description of the analog channels (if None, it's loaded from
+            args.calibration)
+        """
+        self.start_time = datetime.now()
+        self.filename = args.edf
+        self.s_freq = args.s_freq
+        if calibration is None:
+            calibration = load_calibration(args)
+        self.raw = raw
+        self.channels = _describe_channels(args, raw, calibration)
+        self.dtype = np_dtype('<i2' if raw is not None else '<f8')
+        n_chan = len(self.channels)
+
+        self.n_filtered = args.n_chan - digital_rows(args)
+        if args.edf_filter is not None:
+            self.filter = FilterBank(self.n_filtered, args.s_freq,
+                                     args.edf_filter)
+
+        self.flush = args.edf_flush
+        self.fsync = args.edf_fsync
+
+        # maximum number of samples in each segment (0 means no limit)
+        self.max_samples = int(args.edf_segment * args.s_freq)
+        if args.edf_segment_size:
+            by_size = int(args.edf_segment_size * 1024 ** 2 //
+                          (n_chan * self.dtype.itemsize))
+            if not self.max_samples or by_size < self.max_samples:
+                self.max_samples = max(by_size, 1)
+
+        if args.detect is not None:
+            self.pending = []
+            self.lock = Lock()
+            self.f_events = open(events_name(self.filename), 'wb')
+
+        if args.pyramid is not None:
+            self.pyramid = ExportPyramid(self.filename, pyramid_factors(args),
+                                         self.s_freq, self.channels,
+                                         self.dtype)
+
+        self.segments = []
+        self.n_samples = 0
+        self._open_segment()
+
+    def segment_name(self, segment):
+        """Name of the file of one segment ('rec.bin' if there are no
+        segments, otherwise 'rec_000.bin', 'rec_001.bin', ...)."""
+        if not self.max_samples:
+            return self.filename
+        root, ext = splitext(self.filename)
+        return '{}_{:03d}{}'.format(root, segment, ext)
+
+    def add_events(self, events):
+        """Add the events to write (see ExportEdf.add_events)."""
+        with self.lock:
+            self.pending.append(events)
+
+    @property
+    def events_dropped(self):
+        return self.n_events_dropped
+
+    def write(self, data):
+        """Append the data to the file.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_chan X n_samples matrix (or, if the data is in counts, n_rows X
+            n_samples, see RawScale)
+        """
+        if self.filter is not None:
+            analog = self.filter.apply(data[:self.n_filtered])
+            if self.raw is not None:
+                analog = clip(rint(analog), -EDF_OFFSET, EDF_OFFSET - 1)
+            data = vstack((analog, data[self.n_filtered:]))
+        if self.pyramid is not None:
+            self.pyramid.write(data)
+
+        n_smp = data.shape[1]
+        if self.buffer is None or self.buffer.shape[0] < n_smp:
+            self.buffer = empty((n_smp, data.shape[0]), dtype=self.dtype)
+
+        i = 0
+        while i < n_smp:
+            segment = self.segments[-1]
+            if self.max_samples and segment['n_samples'] == self.max_samples:
+                self._close_segment()
+                self._open_segment()
+                segment = self.segments[-1]
+            n = n_smp - i
+            if self.max_samples:
+                n = min(n, self.max_samples - segment['n_samples'])
+
+            buf = self.buffer[:n]
+            buf[:] = data[:, i:i + n].T
+            self.f.write(memoryview(buf).cast('B'))
+            segment['n_samples'] += n
+            self.n_samples += n
+            i += n
+
+        if self.pending is not None:
+            with self.lock:
+                pending, self.pending = self.pending, []
+            if pending:
+                self.f_events.write(concatenate(pending).tobytes())
+
+        self.n_buffers += 1
+        if self.flush and self.n_buffers % self.flush == 0:
+            self.f.flush()
+            if self.f_events is not None:
+                self.f_events.flush()
+        if self.fsync and self.n_buffers % self.fsync == 0:
+            self.f.flush()
+            fsync(self.f.fileno())
+
+    def close(self):
+        """Close the file and write the final sidecar."""
+        if self.f is None:
+            return
+        self._close_segment()
+        if self.f_events is not None:
+            self.f_events.close()
+            self.f_events = None
+        if self.pyramid is not None:
+            self.pyramid.close()
+        self._write_sidecar()
+
+    def _open_segment(self):
+        name = self.segment_name(len(self.segments))
+        self.f = open(name, 'wb')
+        self.segments.append({'file': basename(name),
+                              'first_sample': self.n_samples,
+                              'n_samples': 0,
+                              })
+        self._write_sidecar(closed=False)
+
+    def _close_segment(self):
+        self.f.close()
+        self.f = None
+
+    def _write_sidecar(self, closed=True):
+        """Replace the sidecar (the number of samples of the last segment is
+        None while it's being written)."""
+        segments = [dict(s) for s in self.segments]
+        if not closed:
+            segments[-1]['n_samples'] = None
+        sidecar = {'format': FORMAT,
+                   'version': VERSION,
+                   'start_time': self.start_time.isoformat(),
+                   's_freq': self.s_freq,
+                   'dtype': self.dtype.str,
+                   'order': 'sample-major',
+                   'n_chan': len(self.channels),
+                   'n_samples': self.n_samples if closed else None,
+                   'channels': self.channels,
+                   'filter': (None if self.filter is None else
+                              ' '.join(self.filter.labels)),
+                   'segments': segments,
+                   'events': (None if self.pending is None else
+                              {'file': basename(events_name(self.filename)),
+                               'dtype': EVENT_DTYPE}),
+                   }
+        name = sidecar_name(self.filename)
+        with open(name + '.tmp', 'w') as f:
+            dump(sidecar, f, indent=1)
+        replace(name + '.tmp', name)
+
+
+def _describe_channels(args, raw, calibration):
+    """Label, unit, kind, gain and offset (physical value = gain * value +
+    offset) of each row of the buffers."""
+    channels = []
+    for i in range(len(calibration)):
+        gain = float(calibration.gain[i])
+        offset = float(calibration.offset[i])
+        if raw is not None:  # counts to V, then V to physical units
+            offset += gain * float(raw.offset[i])
+            gain *= float(raw.gain[i])
+        channels.append({'label': calibration.labels[i],
+                         'unit': calibration.units[i],
+                         'kind': 'analog',
+                         'gain': gain,
+                         'offset': offset,
+                         })
+
+    ports = []
+    if args.digital_mode == 'port':
+        ports = digital_ports(args)
+    n_lines = args.n_chan - len(ports) - len(calibration)
+    for i in range(n_lines):
+        channels.append({'label': str(len(calibration) + i),
+                         'unit': '',
+                         'kind': 'line',
+                         'gain': 1.,
+                         'offset': 0.,
+                         })
+
+    for i, lines in enumerate(ports):
+        if raw is None:  # one row with the word
+            channels.append({'label': 'D{}'.format(i),
+                             'unit': '',
+                             'kind': 'port',
+                             'lines': lines,
+                             'gain': 1.,
+                             'offset': 0.,
+                             })
+            continue
+        for j in range(len(raw.word_rows[i])):  # 16 bits in each row
+            channels.append({'label': 'D{}[{}:{}]'.format(
+                                i, j * EDF_WORD, (j + 1) * EDF_WORD - 1),
+                             'unit': '',
+                             'kind': 'port',
+                             'lines': lines,
+                             'shift': j * EDF_WORD,
+                             'gain': 1.,
+                             'offset': float(EDF_OFFSET),
+                             })
+    return channels
+
+
+class FlatReader():
+    """Read the files written by ExportFlat, without loading them in memory.
+
+    Parameters
+    ----------
+    filename : str
+        path to the data file ('rec.bin') or to the sidecar ('rec.json')
+
+    Attributes
+    ----------
+    header : dict
+        content of the sidecar
+    labels : list of str
+        name of each channel
+    units : list of str
+        physical unit of each channel
+    s_freq : float
+        sampling frequency
+    segments : list of ndarray
+        n_samples X n_chan memory-mapped matrix of each segment
+    n_samples : int
+        number of samples in all the segments
+    """
+    def __init__(self, filename):
+        with open(sidecar_name(filename)) as f:
+            self.header = load(f)
+        if self.header.get('format') != FORMAT:
+            raise ValueError(filename + ' was not written by ExportFlat')
+
+        chans = self.header['channels']
+        self.labels = [c['label'] for c in chans]
+        self.units = [c['unit'] for c in chans]
+        self.gain = asarray([c['gain'] for c in chans])
+        self.offset = asarray([c['offset'] for c in chans])
+        self.s_freq = self.header['s_freq']
+        self.dtype = np_dtype(self.header['dtype'])
+        n_chan = self.header['n_chan']
+        self.path = dirname(sidecar_name(filename))
+
+        self.segments = []
+        self.first_sample = []
+        for segment in self.header['segments']:
+            path = join(self.path, segment['file'])
+            n = segment['n_samples']
+            if n is None:  # not closed
+                n = getsize(path) // (n_chan * self.dtype.itemsize)
+            if n == 0:
+                continue
+            self.segments.append(memmap(path, dtype=self.dtype, mode='r',
+                                        shape=(n, n_chan)))
+            self.first_sample.append(segment['first_sample'])
+        self.n_samples = sum(len(x) for x in self.segments)
+
+    def read(self, chan, start=0, end=None, physical=True):
+        """Samples of one channel in a time range.
+
+        Parameters
+        ----------
+        chan : int
+            index of the channel
+        start : float
+            start time, in s from the beginning of the recording
+        end : float
+            end time, in s (the end of the recording, if None)
+        physical : bool
+            convert the samples to physical units
+
+        Returns
+        -------
+        ndarray
+            vector with the samples (only the samples in the time range are
+            read from disk)
+        """
+        i_start = max(int(round(start * self.s_freq)), 0)
+        i_end = self.n_samples
+        if end is not None:
+            i_end = min(int(round(end * self.s_freq)), self.n_samples)
+
+        parts = []
+        for first, x in zip(self.first_sample, self.segments):
+            a = max(i_start - first, 0)
+            b = min(i_end - first, len(x))
+            if a < b:
+                parts.append(x[a:b, chan])
+        x = concatenate(parts) if parts else empty(0, dtype=self.dtype)
+
+        if physical:
+            x = x * self.gain[chan] + self.offset[chan]
+        return x
+
+    def events(self):
+        """Events which were detected during the recordings.
+
+        Returns
+        -------
+        ndarray
+            events (see proc.Detector), empty if no events were detected
+        """
+        info = self.header['events']
+        if info is None:
+            return empty(0, dtype=EVENT_DTYPE)
+        return fromfile(join(self.path, info['file']),
+                        dtype=[tuple(x) for x in info['dtype']])
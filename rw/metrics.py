@@ -0,0 +1,318 @@
+from csv import writer
+from time import perf_counter, time
+
+from numpy import cumsum, logspace, searchsorted, zeros
+
+# error when the device buffer was overwritten before the samples were read
+DAQmxErrorSamplesNoLongerAvailable = -200279
+DURATION_EDGES = logspace(-4, 1, 26)  # from 0.1 ms to 10 s
+PERCENTILES = (50, 90, 99)
+
+
+def duration_percentile(summary, q):
+    """Duration of the callbacks below which there are q% of the callbacks,
+    from the histogram (so it's the upper edge of a bin).
+
+    Parameters
+    ----------
+    summary : dict
+        see Metrics.summary
+    q : float
+        percentile (between 0 and 100)
+
+    Returns
+    -------
+    float
+        duration in s (at most max_duration, 0 if there are no callbacks)
+    """
+    hist = summary['duration_hist']
+    if hist.sum() == 0:
+        return 0.
+    i = searchsorted(cumsum(hist), q / 100 * hist.sum())
+    if i == len(DURATION_EDGES):  # longer than the last edge
+        return summary['max_duration']
+    return min(DURATION_EDGES[i], summary['max_duration'])
+
+
+class Metrics():
+    """Keep track of the timing of the callbacks and of the state of the
+    tasks.
+
+    Parameters
+    ----------
+    task_names : list of str
+        name of each task
+    period : float
+        expected time (in s) between two callbacks
+    csv_file : str
+        if not None, one line for each callback is written to this file, with
+        the histogram of the durations until then (number of callbacks up to
+        each value of DURATION_EDGES, then longer than the last one)
+
+    Notes
+    -----
+    For each callback, call start(), then read() (or error()) for each task
+    and finally stop().
+    """
+    def __init__(self, task_names, period, csv_file=None):
+        self.task_names = task_names
+        self.period = period
+
+        self.n_callbacks = 0
+        self.duration_hist = zeros(len(DURATION_EDGES) + 1, dtype=int)
+        self.max_duration = 0.
+        self.mean_duration = 0.
+
+        # Welford's algorithm for the mean and variance of the jitter
+        self.n_intervals = 0
+        self.mean_jitter = 0.
+        self.m2_jitter = 0.
+        self.max_jitter = 0.
+
+        self.tasks = {name: {'read': 0,
+                             'requested': 0,
+                             'short_reads': 0,
+                             'backlog': 0,
+                             'max_backlog': 0,
+                             'errors': 0,
+                             'overflows': 0,
+                             } for name in task_names}
+
+        self.t_start = None
+        self.t_previous = None
+        self.row = []
+
+        self.csv_file = None
+        self.csv = None
+        if csv_file is not None:
+            self.csv_file = open(csv_file, 'w', newline='')
+            self.csv = writer(self.csv_file)
+            header = ['time', 'duration', 'interval']
+            for name in task_names:
+                header.extend([name + ' read', name + ' backlog',
+                               name + ' errors'])
+            header.extend(['duration <= {:g} ms'.format(x * 1000)
+                           for x in DURATION_EDGES])
+            header.append('duration > {:g} ms'.format(
+                DURATION_EDGES[-1] * 1000))
+            self.csv.writerow(header)
+
+    def start(self):
+        """Call at the beginning of the callback."""
+        self.t_start = perf_counter()
+        interval = 0.
+        if self.t_previous is not None:
+            interval = self.t_start - self.t_previous
+            jitter = interval - self.period
+            self.n_intervals += 1
+            delta = jitter - self.mean_jitter
+            self.mean_jitter += delta / self.n_intervals
+            self.m2_jitter += delta * (jitter - self.mean_jitter)
+            self.max_jitter = max(self.max_jitter, abs(jitter))
+        self.t_previous = self.t_start
+        self.row = [time(), 0., interval]
+
+    def read(self, name, n_read, n_requested, backlog):
+        """Call after reading the data of one task.
+
+        Parameters
+        ----------
+        name : str
+            name of the task
+        n_read : int
+            number of samples (per channel) that were read
+        n_requested : int
+            number of samples (per channel) that should have been read
+        backlog : int
+            number of samples (per channel) still in the device buffer
+        """
+        task = self.tasks[name]
+        task['read'] += n_read
+        task['requested'] += n_requested
+        if n_read < n_requested:
+            task['short_reads'] += 1
+        task['backlog'] = backlog
+        task['max_backlog'] = max(task['max_backlog'], backlog)
+        self.row.extend([n_read, backlog, task['errors']])
+
+    def error(self, name, err):
+        """Call when reading one task raised DAQError.
+
+        Parameters
+        ----------
+        name : str
+            name of the task
+        err : DAQError
+            the error (with the error code in err.error)
+        """
+        task = self.tasks[name]
+        task['errors'] += 1
+        if getattr(err, 'error', None) == DAQmxErrorSamplesNoLongerAvailable:
+            task['overflows'] += 1
+
+    def stop(self):
+        """Call at the end of the callback."""
+        duration = perf_counter() - self.t_start
+        self.n_callbacks += 1
+        self.duration_hist[searchsorted(DURATION_EDGES, duration)] += 1
+        self.max_duration = max(self.max_duration, duration)
+        self.mean_duration += ((duration - self.mean_duration) /
+                               self.n_callbacks)
+
+        if self.csv is not None:
+            self.row[1] = duration
+            # tasks after an error were not read
+            n_missing = 3 + 3 * len(self.task_names) - len(self.row)
+            self.csv.writerow(self.row + [''] * n_missing +
+                              self.duration_hist.tolist())
+
+    def summary(self):
+        """Summary of the metrics.
+
+        Returns
+        -------
+        dict
+            'callbacks', 'mean_duration', 'max_duration' (in s),
+            'duration_hist' (number of callbacks between each value of
+            DURATION_EDGES), 'mean_jitter', 'std_jitter', 'max_jitter' (in s,
+            difference between the interval between callbacks and the expected
+            period) and 'tasks' (for each task, the number of samples read and
+            requested, the number of short reads, the current and max backlog,
+            and the number of errors and overflows).
+        """
+        std_jitter = 0.
+        if self.n_intervals > 1:
+            std_jitter = (self.m2_jitter / (self.n_intervals - 1)) ** .5
+        return {'callbacks': self.n_callbacks,
+                'mean_duration': self.mean_duration,
+                'max_duration': self.max_duration,
+                'duration_hist': self.duration_hist.copy(),
+                'mean_jitter': self.mean_jitter,
+                'std_jitter': std_jitter,
+                'max_jitter': self.max_jitter,
+                'tasks': {name: dict(v) for name, v in self.tasks.items()},
+                }
+
+    def close(self):
+        """Close the CSV file."""
+        if self.csv_file is not None:
+            self.csv_file.close()
+            self.csv_file = None
+            self.csv = None
+
+
+def reader_status(reader):
+    """State of the acquisition, of the EDF file and of the detection of the
+    events, such as it's shown in HealthPanel.
+
+    Parameters
+    ----------
+    reader : instance of DAQmxReader or EdfPlayer
+        the reader
+
+    Returns
+    -------
+    dict
+        'metrics' (see Metrics.summary), 'edf' (see AsyncWriter.stats, with
+        'filter' (see FilterBank.stats), 'events_dropped' and 'compression'
+        (see ExportArchive.compression, None for the other formats)), 'detector'
+        (see Detector.stats), 'stream' (see Subscriber.stats, for each
+        client). 'edf', 'detector' and 'stream' are None if they are not used.
+    """
+    status = {'metrics': reader.metrics.summary(),
+              'edf': None,
+              'detector': None,
+              'stream': None,
+              }
+    if reader.edf is not None:
+        edf = reader.edf.stats()
+        edf['filter'] = None
+        if reader.edf.filter is not None:
+            edf['filter'] = reader.edf.filter.stats()
+        edf['events_dropped'] = reader.edf.events_dropped
+        edf['compression'] = getattr(reader.edf, 'compression', None)
+        status['edf'] = edf
+    if reader.detector is not None:
+        status['detector'] = reader.detector.stats()
+    if reader.stream is not None:
+        status['stream'] = reader.stream.stats()
+    return status
+
+
+def format_status(status):
+    """Describe the state of the acquisition in words.
+
+    Parameters
+    ----------
+    status : dict
+        see reader_status (and AcquisitionProcess.status)
+
+    Returns
+    -------
+    list of str
+        one line for each part of the acquisition
+    """
+    if 'error' in status:
+        return ['error: ' + status['error'].strip().split('\n')[-1]]
+
+    m = status['metrics']
+    lines = ['callbacks: {}'.format(m['callbacks']),
+             'duration: {:.1f} ms (max {:.1f} ms)'.format(
+                 m['mean_duration'] * 1000, m['max_duration'] * 1000),
+             'duration percentiles: ' + ', '.join(
+                 '{}% <= {:.1f} ms'.format(
+                     q, duration_percentile(m, q) * 1000)
+                 for q in PERCENTILES),
+             'jitter: {:.1f} ms (max {:.1f} ms)'.format(
+                 m['std_jitter'] * 1000, m['max_jitter'] * 1000),
+             ]
+    for name, task in m['tasks'].items():
+        lines.append('{}: backlog {} (max {}), short reads {}, errors {} '
+                     '(overflows {})'.format(name, task['backlog'],
+                                             task['max_backlog'],
+                                             task['short_reads'],
+                                             task['errors'],
+                                             task['overflows']))
+
+    w = status['edf']
+    if w is not None:
+        lines.append('EDF: queue {} (max {}), latency max {:.0f} ms, '
+                     'blocked {}, dropped {}'.format(
+                         w['depth'], w['max_depth'], w['max_latency'] * 1000,
+                         w['blocked'], w['dropped']))
+        if w['error'] is not None:
+            lines.append('EDF error: {} ({} buffers not written)'.format(
+                w['error'], w['failed']))
+        if w['filter'] is not None:
+            lines.append('EDF filter: {:.1f} ms per buffer (max {:.1f} ms)'
+                         ''.format(w['filter']['mean_cost'] * 1000,
+                                   w['filter']['max_cost'] * 1000))
+        c = w['compression']
+        if c is not None:
+            lines.append('archive: ratio {:.2f}, {} chunks (pending {}), '
+                         '{:.1f} ms per chunk (max {:.1f} ms)'.format(
+                             c['ratio'], c['chunks'], c['pending'],
+                             c['mean_cost'] * 1000, c['max_cost'] * 1000))
+
+    e = status['detector']
+    if e is not None:
+        lines.append('events: {} ({:.1f} ms per buffer, max {:.1f} ms)'
+                     ''.format(e['events'], e['mean_cost'] * 1000,
+                               e['max_cost'] * 1000))
+        if w is not None:
+            lines.append('events not in EDF: {}'.format(w['events_dropped']))
+
+    if status['stream'] is not None:
+        lines.append('stream: {} clients'.format(len(status['stream'])))
+        for i, c in enumerate(status['stream']):
+            lines.append('  client {}: {} channels, lag {} (max {}), latency '
+                         'max {:.0f} ms, sent {}, dropped {}'.format(
+                             i, c['channels'], c['lag'], c['max_lag'],
+                             c['max_latency'] * 1000, c['sent'],
+                             c['dropped']))
+
+    s = status.get('shared')
+    if s is not None:
+        lines.append('shared memory: read {}, lost {}, skipped {}'.format(
+            s['read'], s['lost'], s['skipped']))
+    return lines
@@ -0,0 +1,208 @@
+from threading import Event, Thread, current_thread
+from time import perf_counter, time
+
+from numpy import arange, newaxis
+
+from .digital import EDF_WORD, digital_rows
+from .edf import EdfReader
+from .metrics import Metrics, reader_status
+from .pool import FramePool
+from ..proc import Detector
+
+
+class PlaybackError(Exception):
+    """Error while playing back an EDF file."""
+
+
+def _ports(labels):
+    """Group the 16-bit channels of the packed digital ports ('D0[0:15]',
+    'D0[16:31]', ...) by port.
+
+    Returns
+    -------
+    list of list of int
+        index of the channels of each port, the lowest bits first
+    """
+    ports = {}
+    for i, label in enumerate(labels):
+        if label.startswith('D') and '[' in label:
+            ports.setdefault(int(label[1:label.index('[')]), []).append(i)
+    return [ports[k] for k in sorted(ports)]
+
+
+def playback_args(args):
+    """Set the arguments which describe the recordings (sampling frequency,
+    number of channels, digital ports) from the header of the EDF file.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments specified by the user, with args.play as the EDF file
+    """
+    edf = EdfReader(args.play)
+    ports = _ports(edf.labels)
+    n_analog = len(edf.labels) - sum(len(p) for p in ports)
+
+    args.s_freq = int(edf.s_freq[0])
+    args.minval = float(edf.offset[0] + edf.gain[0] * -2 ** 15)
+    args.maxval = float(edf.offset[0] + edf.gain[0] * (2 ** 15 - 1))
+    args.n_chan = n_analog + len(ports)
+    args.edf = None
+    args.raw = False  # the file is played back in physical units
+    args.calibration = None
+    args.file_format = 'edf'
+
+    # packed ports are described as the digital inputs of master and slave
+    lines = ['0:{}'.format(len(p) * EDF_WORD - 1) for p in ports]
+    args.digital_mode = 'port' if ports else 'line'
+    args.digitalinput = lines[0] if len(lines) > 0 else None
+    args.slave = 'play' if len(lines) > 1 else None
+    args.slave_digitalinput = lines[1] if len(lines) > 1 else None
+
+
+class EdfPlayer():
+    """Play back an EDF file (such as those written by ExportEdf) as if the
+    data was acquired, with the same interface as DAQmxReader.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments specified by the user (args.play is the EDF file, args.speed
+        how many times faster than real time, 0 for as fast as possible)
+    funct : function
+        function called with the data of each buffer and the time when the
+        buffer was read (see DAQmxReader). funct should call
+        pool.release(data) when it does not need the data anymore.
+    events_funct : function
+        if args.detect is not None, function called with the events detected
+        in each buffer (see DAQmxReader)
+
+    Notes
+    -----
+    The buffers have the same layout as those of DAQmxReader: analog channels
+    first and then the packed digital ports (which are stored in EDF as 16-bit
+    channels).
+    """
+    Error = PlaybackError
+
+    def __init__(self, args, funct, events_funct=None):
+        self.funct = funct
+        self.speed = args.speed
+        self.edf_file = EdfReader(args.play)
+        self.edf = None
+        self.raw = None
+
+        labels = self.edf_file.labels
+        n_smp = self.edf_file.n_smp
+        if (n_smp != n_smp[0]).any():
+            raise PlaybackError('All the channels should have the same '
+                                'sampling frequency')
+        self.s_freq = self.edf_file.s_freq[0]
+        self.buffer_size = int(self.s_freq * args.buffer_size)
+
+        self.ports = _ports(labels)
+        self.n_analog = len(labels) - sum(len(p) for p in self.ports)
+        n_chan = self.n_analog + len(self.ports)
+        self.n_total = self.edf_file.header['n_records'] * n_smp[0]
+
+        self.pool = FramePool(n_chan, self.buffer_size)
+        self.metrics = Metrics(['edf'], args.buffer_size, args.metrics_csv)
+
+        self.n_users = 1
+        self.stream = None
+        if args.stream is not None:
+            from .stream import StreamServer
+            self.stream = StreamServer(args.stream, n_chan, args.stream_queue,
+                                       release=self.pool.release)
+            self.n_users += 1
+
+        self.detector = None
+        self.events_funct = events_funct
+        if args.detect is not None:
+            self.n_detect = n_chan - digital_rows(args)
+            self.detector = Detector(self.n_detect, self.s_freq, args.detect,
+                                     args.refractory / 1000,
+                                     args.detect_filter)
+
+        self.thread = None
+        self.stopping = Event()
+
+    def StartTask(self):
+        self.stopping.clear()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def StopTask(self):
+        self.stopping.set()
+        if self.thread is not None and self.thread is not current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def ClearTask(self):
+        self.StopTask()
+        self.metrics.close()
+        if self.stream is not None:
+            self.stream.close()
+
+    def status(self):
+        """State of the playback (see metrics.reader_status)."""
+        return reader_status(self)
+
+    def read(self, start, data):
+        """Read the samples from the file into data.
+
+        Parameters
+        ----------
+        start : int
+            index of the first sample
+        data : ndarray
+            n_chan X n_samples matrix, with the analog channels (in physical
+            units) and the packed digital ports
+        """
+        edf = self.edf_file
+        spr = edf.n_smp[0]
+        n = data.shape[1]
+        first = start // spr
+        last = (start + n - 1) // spr + 1
+
+        # n_chan X n_samples of the records which are needed
+        x = edf.records[first:last].reshape(last - first, len(edf.labels),
+                                            spr)
+        x = x.transpose(1, 0, 2).reshape(len(edf.labels), -1)
+        x = x[:, start - first * spr:start - first * spr + n]
+
+        a = self.n_analog
+        data[:a] = x[:a] * edf.gain[:a, newaxis] + edf.offset[:a, newaxis]
+        for i, chans in enumerate(self.ports):
+            words = x[chans] * edf.gain[chans, newaxis]
+            words += edf.offset[chans, newaxis]
+            shifts = 2. ** (EDF_WORD * arange(len(chans)))
+            data[a + i] = (words * shifts[:, newaxis]).sum(axis=0)
+
+    def _run(self):
+        """Send one buffer at a time, at the speed of the recordings times
+        self.speed."""
+        t0 = perf_counter()
+        duration = self.buffer_size / self.s_freq
+        for k, start in enumerate(range(0, self.n_total - self.buffer_size + 1,
+                                        self.buffer_size)):
+            if self.speed > 0:
+                wait = t0 + (k + 1) * duration / self.speed - perf_counter()
+                if wait > 0 and self.stopping.wait(wait):
+                    break
+            if self.stopping.is_set():
+                break
+
+            self.metrics.start()
+            data = self.pool.get(self.n_users)
+            self.read(start, data)
+            self.metrics.read('edf', self.buffer_size, self.buffer_size, 0)
+            if self.detector is not None:
+                events = self.detector.detect(data[:self.n_detect])
+                if self.events_funct is not None:
+                    self.events_funct(events)
+            timestamp = time()
+            if self.stream is not None:
+                self.stream.write(data, timestamp)
+            self.funct(data, timestamp)
+            self.metrics.stop()
@@ -0,0 +1,75 @@
+from threading import Lock
+
+from numpy import empty
+
+
+class FramePool():
+    """Preallocated frames, which are reused once all the consumers have
+    released them.
+
+    Parameters
+    ----------
+    n_chan : int
+        number of channels
+    n_smp : int
+        number of samples in each frame
+    n_frames : int
+        number of frames to allocate at the beginning
+    dtype : str
+        data type of the frames
+
+    Notes
+    -----
+    If all the frames are in use, a new frame is allocated, so that the
+    acquisition never waits for the consumers. n_allocated keeps track of how
+    many frames were allocated in total.
+
+    Consumers should release the frame itself (not a view of it).
+    """
+    def __init__(self, n_chan, n_smp, n_frames=4, dtype='float64'):
+        self.shape = (n_chan, n_smp)
+        self.dtype = dtype
+        self.free = [empty(self.shape, dtype=dtype) for _ in range(n_frames)]
+        self.n_allocated = n_frames
+        self.users = {}  # id of the frame: [frame, number of consumers]
+        self.lock = Lock()
+
+    def get(self, n_users):
+        """Get a frame which is not used by any consumer.
+
+        Parameters
+        ----------
+        n_users : int
+            number of consumers who will release this frame
+
+        Returns
+        -------
+        ndarray
+            n_chan X n_smp matrix (with old values)
+        """
+        with self.lock:
+            if self.free:
+                frame = self.free.pop()
+            else:
+                frame = empty(self.shape, dtype=self.dtype)
+                self.n_allocated += 1
+            self.users[id(frame)] = [frame, n_users]
+        return frame
+
+    def release(self, frame):
+        """Release a frame. When all the consumers have released it, it can
+        be used again.
+
+        Parameters
+        ----------
+        frame : ndarray
+            frame returned by get
+        """
+        with self.lock:
+            users = self.users.get(id(frame))
+            if users is None:
+                return
+            users[1] -= 1
+            if users[1] == 0:
+                del self.users[id(frame)]
+                self.free.append(frame)
@@ -0,0 +1,224 @@
+from multiprocessing import get_context
+from queue import Empty
+from threading import Thread
+from time import sleep
+from traceback import format_exc
+
+from .digital import digital_rows
+from .pool import FramePool
+from .raw import RawScale, raw_rows
+from .shared import SharedRing
+
+STATUS_INTERVAL = 0.5  # s between two updates of the status
+POLL_INTERVAL = 0.005  # s between two checks for new frames
+
+
+class AcquisitionError(Exception):
+    """Error in the acquisition process."""
+
+
+def _acquire(args, name, stopping, status, events):
+    """Acquire the data and write EDF, in a separate process.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments specified by the user
+    name : str
+        name of the shared memory with the ring buffer
+    stopping : multiprocessing.Event
+        set it to stop the acquisition
+    status : multiprocessing.Queue
+        where the state of the acquisition (see metrics.reader_status) is
+        sent regularly, with 'error' if the acquisition failed
+    events : multiprocessing.Queue
+        where the detected events are sent (if args.detect is not None)
+    """
+    from .daqmx import DAQmxReader
+    from .playback import EdfPlayer
+
+    ring = SharedRing(name=name)
+
+    def funct(data, timestamp):
+        ring.write(data, timestamp)
+        reader.pool.release(data)
+
+    try:
+        if args.play is not None:
+            reader = EdfPlayer(args, funct, events.put)
+        else:
+            reader = DAQmxReader(args, funct, events.put)
+        if reader.raw is not None:  # before the first frame
+            ring.scaling[0, :reader.raw.n_analog] = reader.raw.offset
+            ring.scaling[1, :reader.raw.n_analog] = reader.raw.gain
+        reader.StartTask()
+    except Exception:
+        status.put({'error': format_exc()})
+        ring.close()
+        return
+
+    while not stopping.wait(STATUS_INTERVAL):
+        status.put(reader.status())
+
+    out = {}
+    try:
+        reader.StopTask()
+    except reader.Error:
+        out['error'] = format_exc()
+    finally:
+        try:
+            if reader.edf is not None:
+                reader.edf.close()
+            reader.ClearTask()
+        finally:
+            ring.close()
+    out.update(reader.status())
+    status.put(out)
+
+
+class AcquisitionProcess():
+    """Acquire the data and write EDF in a separate process, with the same
+    interface as DAQmxReader.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments specified by the user (args.shared_slots is the number of
+        buffers in shared memory)
+    funct : function
+        function called with the data of each buffer and the time when the
+        buffer was read (see DAQmxReader). funct should call
+        pool.release(data) when it does not need the data anymore.
+    events_funct : function
+        if args.detect is not None, function called with the events detected
+        in each buffer (see DAQmxReader)
+
+    Notes
+    -----
+    The reader (DAQmxReader or EdfPlayer) and the EDF file are in the other
+    process, which copies each buffer into a ring buffer in shared memory
+    (see SharedRing). This process only reads from the ring buffer, in a
+    thread, so it cannot delay the acquisition.
+
+    If the buffers are not released (because the GUI is busy), they are
+    skipped, so that they don't accumulate in memory.
+
+    If args.raw, the buffers are in counts (see RawScale) also in shared
+    memory, and raw is created when the first buffer arrives, with the scaling
+    of the device in the other process.
+    """
+    Error = AcquisitionError
+
+    def __init__(self, args, funct, events_funct=None):
+        self.args = args
+        self.funct = funct
+        self.events_funct = events_funct
+        self.buffer_size = int(args.s_freq * args.buffer_size)
+        self.n_slots = args.shared_slots
+        self.edf = None  # the EDF file is written by the other process
+        self.raw = None
+
+        n_rows = args.n_chan
+        dtype = 'float64'
+        if args.raw:
+            n_rows = raw_rows(args)
+            dtype = 'int16'
+        self.ring = SharedRing(n_rows, self.buffer_size, self.n_slots,
+                               dtype=dtype)
+        self.pool = FramePool(n_rows, self.buffer_size, dtype=dtype)
+        self.n_skipped = 0
+
+        ctx = get_context('spawn')
+        self.stopping = ctx.Event()
+        self.status_queue = ctx.Queue()
+        self.events_queue = ctx.Queue()
+        self.process = ctx.Process(target=_acquire,
+                                   args=(args, self.ring.name, self.stopping,
+                                         self.status_queue,
+                                         self.events_queue),
+                                   # daemon processes cannot start the pool
+                                   # which compresses the archive
+                                   daemon=args.file_format != 'archive')
+        self.last_status = None
+        self.thread = None
+
+    def StartTask(self):
+        self.process.start()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def StopTask(self):
+        # the queues are emptied, otherwise the process cannot end
+        self.stopping.set()
+        while self.process.is_alive():
+            self.status()
+            self._events()
+            self.process.join(POLL_INTERVAL)
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        error = self.status().get('error')
+        if error is not None:
+            raise AcquisitionError(error)
+
+    def ClearTask(self):
+        self.ring.close()
+        self.ring.unlink()
+
+    def status(self):
+        """State of the acquisition in the other process (see
+        metrics.reader_status), with 'shared' (number of buffers read from
+        shared memory, lost because they were overwritten, and skipped
+        because they were not released) and 'error' if the acquisition
+        failed.
+
+        Returns
+        -------
+        dict
+            empty if the other process has not sent the state yet
+        """
+        while True:
+            try:
+                self.last_status = self.status_queue.get_nowait()
+            except Empty:
+                break
+        if self.last_status is None:
+            return {}
+        status = dict(self.last_status)
+        status['shared'] = {'read': self.ring.n_read,
+                            'lost': self.ring.n_lost,
+                            'skipped': self.n_skipped,
+                            }
+        return status
+
+    def _events(self):
+        """Pass the events sent by the other process to events_funct."""
+        while True:
+            try:
+                events = self.events_queue.get_nowait()
+            except Empty:
+                break
+            if self.events_funct is not None:
+                self.events_funct(events)
+
+    def _run(self):
+        """Pass the buffers in shared memory to funct."""
+        while not self.stopping.is_set():
+            self._events()
+
+            if len(self.pool.users) >= self.n_slots:  # funct is behind
+                self.n_skipped += self.ring.skip()
+                sleep(POLL_INTERVAL)
+                continue
+
+            data = self.pool.get(1)
+            timestamp = self.ring.read(data)
+            if timestamp is None:
+                self.pool.release(data)
+                sleep(POLL_INTERVAL)
+                continue
+            if self.args.raw and self.raw is None:
+                n_analog = self.args.n_chan - digital_rows(self.args)
+                offset, gain = self.ring.scaling[:, :n_analog].copy()
+                self.raw = RawScale(self.args, offset, gain)
+            self.funct(data, timestamp)
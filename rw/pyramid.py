@@ -0,0 +1,223 @@
+"""Min/max pyramid of the recordings, written next to them, so that any time
+span can be drawn at the resolution of the screen without reading all the
+samples.
+"""
+from json import dump, load
+from os import replace
+from os.path import basename, dirname, exists, getsize, join, splitext
+
+from numpy import (arange, asarray, dtype as np_dtype, empty, memmap,
+                   newaxis)
+
+from ..proc import MinMaxPyramid
+
+FORMAT = 'OpBoxPhys pyramid'
+VERSION = 1
+
+
+def pyramid_name(filename):
+    """Name of the description of the pyramid ('rec.edf' ->
+    'rec_pyramid.json')."""
+    return splitext(filename)[0] + '_pyramid.json'
+
+
+def level_name(filename, factor):
+    """Name of the file of one level ('rec.edf' -> 'rec_pyramid_100.bin')."""
+    return '{}_pyramid_{}.bin'.format(splitext(filename)[0], factor)
+
+
+def pyramid_factors(args):
+    """Factors of the levels in args.pyramid (such as '10,100,1000')."""
+    return [int(x) for x in args.pyramid.split(',')]
+
+
+class ExportPyramid():
+    """Write the min and max of the recordings at several levels.
+
+    Parameters
+    ----------
+    filename : str
+        path to the recordings (such as 'rec.edf')
+    factors : list of int
+        number of samples in each block, for each level (see MinMaxPyramid)
+    s_freq : float
+        sampling frequency
+    channels : list of dict
+        'label', 'unit', 'gain' and 'offset' of each row (physical value =
+        gain * value + offset)
+    dtype : str or dtype
+        data type of the values
+
+    Notes
+    -----
+    Each level is a file ('rec_pyramid_10.bin', 'rec_pyramid_100.bin', ...)
+    with a n_blocks X n_chan X 2 matrix (the min and max of each block of
+    each channel), which is appended as the data is written, with the same
+    data type as the recordings. 'rec_pyramid.json' describes the levels and
+    the channels. The pyramid covers the whole recordings, also if they are
+    split into segments.
+    """
+    def __init__(self, filename, factors, s_freq, channels, dtype):
+        self.dtype = np_dtype(dtype).newbyteorder('<')
+        self.pyramid = MinMaxPyramid(len(channels), factors, self.dtype)
+        self.files = [open(level_name(filename, f), 'wb') for f in factors]
+
+        description = {'format': FORMAT,
+                       'version': VERSION,
+                       'recordings': basename(filename),
+                       's_freq': s_freq,
+                       'dtype': self.dtype.str,
+                       'n_chan': len(channels),
+                       'channels': [{k: c[k] for k in ('label', 'unit', 'gain',
+                                                       'offset')}
+                                    for c in channels],
+                       'levels': [{'factor': f,
+                                   'file': basename(level_name(filename, f))}
+                                  for f in factors],
+                       }
+        name = pyramid_name(filename)
+        with open(name + '.tmp', 'w') as f:
+            dump(description, f, indent=1)
+        replace(name + '.tmp', name)
+
+    def write(self, data):
+        """Add the data to the pyramid.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_chan X n_samples matrix
+        """
+        self._append(self.pyramid.push(asarray(data, dtype=self.dtype)))
+
+    def close(self):
+        """Write the last, incomplete, blocks and close the files."""
+        self._append(self.pyramid.flush())
+        for f in self.files:
+            f.close()
+
+    def _append(self, levels):
+        for f, blocks in zip(self.files, levels):
+            if blocks.shape[0]:
+                f.write(memoryview(blocks).cast('B'))
+                f.flush()
+
+
+class PyramidReader():
+    """Read the min/max pyramid of the recordings.
+
+    Parameters
+    ----------
+    filename : str
+        path to the recordings (such as 'rec.edf') or to the description of
+        the pyramid ('rec_pyramid.json')
+
+    Attributes
+    ----------
+    header : dict
+        content of the description
+    labels : list of str
+        name of each channel
+    units : list of str
+        physical unit of each channel
+    s_freq : float
+        sampling frequency
+    factors : list of int
+        number of samples in each block, for each level
+
+    Notes
+    -----
+    The levels are opened again at each read, so the pyramid can be read
+    while it's being written.
+    """
+    def __init__(self, filename):
+        if not filename.endswith('_pyramid.json'):
+            filename = pyramid_name(filename)
+        if not exists(filename):
+            raise FileNotFoundError(filename + ' does not exist (record with '
+                                    '--pyramid)')
+        with open(filename) as f:
+            self.header = load(f)
+        if self.header.get('format') != FORMAT:
+            raise ValueError(filename + ' was not written by ExportPyramid')
+
+        self.dirname = dirname(filename)
+        self.labels = [c['label'] for c in self.header['channels']]
+        self.units = [c['unit'] for c in self.header['channels']]
+        self.gain = asarray([c['gain'] for c in self.header['channels']])
+        self.offset = asarray([c['offset'] for c in self.header['channels']])
+        self.s_freq = self.header['s_freq']
+        self.dtype = np_dtype(self.header['dtype'])
+        self.factors = [level['factor'] for level in self.header['levels']]
+
+    @property
+    def duration(self):
+        """Duration (in s) of the recordings, up to the last block of the
+        finest level."""
+        return self.level(0).shape[0] * self.factors[0] / self.s_freq
+
+    def level(self, i):
+        """Blocks of one level.
+
+        Returns
+        -------
+        ndarray
+            n_blocks X n_chan X 2 matrix (memory-mapped)
+        """
+        path = join(self.dirname, self.header['levels'][i]['file'])
+        n_chan = len(self.labels)
+        n_blocks = getsize(path) // (n_chan * 2 * self.dtype.itemsize)
+        if n_blocks == 0:
+            return empty((0, n_chan, 2), dtype=self.dtype)
+        return memmap(path, dtype=self.dtype, mode='r',
+                      shape=(n_blocks, n_chan, 2))
+
+    def read(self, start=0, end=None, n_cols=1000, chans=None):
+        """Min and max of a time span, from the coarsest level which has at
+        least n_cols blocks in the span.
+
+        Parameters
+        ----------
+        start : float
+            start time, in s from the beginning of the recordings
+        end : float
+            end time, in s (the end of the recordings, if None)
+        n_cols : int
+            number of columns of pixels
+        chans : list of int
+            index of the channels (all the channels, if None)
+
+        Returns
+        -------
+        ndarray
+            vector with the time of each block, repeated twice
+        ndarray
+            n_chans X (2 * n_blocks) matrix, in physical units, with the min
+            and max of each block alternating (as returned by minmax)
+        int
+            factor of the level
+        """
+        if chans is None:
+            chans = list(range(len(self.labels)))
+        if end is None:
+            end = self.duration
+        n_smp = max(end - start, 0) * self.s_freq
+
+        i = 0
+        for i_level, factor in enumerate(self.factors):
+            if n_smp / factor >= n_cols:
+                i = i_level
+        factor = self.factors[i]
+        blocks = self.level(i)
+
+        first = min(max(int(start * self.s_freq // factor), 0),
+                    blocks.shape[0])
+        last = min(max(int(-(-end * self.s_freq // factor)), first),
+                   blocks.shape[0])
+        x = empty(2 * (last - first))
+        x[0::2] = x[1::2] = arange(first, last) * factor / self.s_freq
+
+        y = blocks[first:last, chans, :].transpose(1, 0, 2).reshape(
+            len(chans), -1)
+        y = y * self.gain[chans, newaxis] + self.offset[chans, newaxis]
+        return x, y, factor
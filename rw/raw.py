@@ -0,0 +1,168 @@
+"""Buffers of raw counts of the ADC (args.raw), which are written to EDF as
+they are and converted to physical units only for display.
+"""
+from numpy import asarray, empty, int32, newaxis, uint32
+
+from .digital import (EDF_WORD, digital_ports, digital_rows, expand_lines,
+                      n_edf_words)
+
+EDF_OFFSET = 2 ** (EDF_WORD - 1)  # 16-bit word stored as EDF digital value
+
+
+def raw_rows(args):
+    """Number of rows of the buffers of counts (see RawScale)."""
+    n_rows = args.n_chan - digital_rows(args)
+    if args.digital_mode == 'port':
+        return n_rows + sum(n_edf_words(lines) for lines in digital_ports(args))
+    return args.n_chan
+
+
+def adc_scaling(task, dev, channels):
+    """Offset and gain of the ADC for each analog channel of a task.
+
+    Parameters
+    ----------
+    task : Task
+        analog task (of PyDAQmx or of the simulated device)
+    dev : str
+        name of the device (such as 'Dev1')
+    channels : str
+        analog channels (such as '0:7,16:23')
+
+    Returns
+    -------
+    list of float
+        offset (in V) of each channel
+    list of float
+        gain (in V per count) of each channel
+
+    Notes
+    -----
+    NI-DAQmx returns a polynomial (up to the third order) for each channel.
+    EDF can only store a linear scaling, so the higher-order coefficients
+    (which are very small) are ignored.
+    """
+    offset, gain = [], []
+    coeff = empty(4)
+    for chan in expand_lines(channels):
+        name = '{}/ai{}'.format(dev, chan).encode('utf-8')
+        task.GetAIDevScalingCoeff(name, coeff, len(coeff))
+        offset.append(float(coeff[0]))
+        gain.append(float(coeff[1]))
+    return offset, gain
+
+
+class RawScale():
+    """Layout of the buffers of raw counts and conversion to physical units.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments specified by the user
+    offset : list of float
+        offset (in V) of each analog channel
+    gain : list of float
+        gain (in V per count) of each analog channel
+
+    Attributes
+    ----------
+    n_analog : int
+        number of analog channels (the first rows)
+    n_rows : int
+        number of rows of the buffers
+    ports : list of list of int
+        lines of each packed digital port
+    word_rows : list of list of int
+        rows with the 16-bit words of each packed port, lowest bits first
+
+    Notes
+    -----
+    The rows of the buffers are the channels of the EDF file: the analog
+    channels (counts of the ADC), then the digital lines (0 or 1) or, if the
+    ports are packed, one row for each 16 bits of each port (stored as in
+    EDF, from -32768 for 0 to 32767 for 65535). So the buffers are written to
+    EDF without any conversion.
+    """
+    def __init__(self, args, offset, gain):
+        self.n_chan = args.n_chan
+        self.n_analog = args.n_chan - digital_rows(args)
+        self.offset = asarray(offset, dtype=float)
+        self.gain = asarray(gain, dtype=float)
+
+        self.ports = []
+        if args.digital_mode == 'port':
+            self.ports = digital_ports(args)
+        self.word_rows = []
+        i = self.n_analog
+        for lines in self.ports:
+            self.word_rows.append(list(range(i, i + n_edf_words(lines))))
+            i += n_edf_words(lines)
+        self.n_rows = raw_rows(args)
+
+    def pack(self, words, out):
+        """Split the words of one port into 16-bit rows.
+
+        Parameters
+        ----------
+        words : ndarray
+            vector with the value of the port for each sample (uint32)
+        out : ndarray
+            n_words X n_samples matrix (int16), such as the rows of one port
+        """
+        for j in range(out.shape[0]):
+            w = (words >> uint32(j * EDF_WORD)).astype(int32)
+            w &= 2 ** EDF_WORD - 1
+            w -= EDF_OFFSET
+            out[j] = w
+
+    def analog(self, data):
+        """Analog channels in V.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_rows X n_samples matrix of counts
+
+        Returns
+        -------
+        ndarray
+            n_analog X n_samples matrix
+        """
+        x = data[:self.n_analog] * self.gain[:, newaxis]
+        x += self.offset[:, newaxis]
+        return x
+
+    def physical(self, data):
+        """Convert the buffer into the same layout as ReadAnalogF64.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_rows X n_samples matrix of counts
+
+        Returns
+        -------
+        ndarray
+            n_chan X n_samples matrix, with the analog channels in V, then the
+            digital lines or the packed words of the ports
+        """
+        out = empty((self.n_chan, data.shape[1]))
+        out[:self.n_analog] = self.analog(data)
+        if not self.ports:
+            out[self.n_analog:] = data[self.n_analog:]
+            return out
+
+        for k, rows in enumerate(self.word_rows):
+            words = out[self.n_analog + k]
+            words[:] = 0
+            for j, row in enumerate(rows):
+                words += (data[row].astype(int32) + EDF_OFFSET) * 2. ** (
+                    j * EDF_WORD)
+        return out
+
+    def physical_range(self):
+        """Physical minimum and maximum of the analog channels, for the EDF
+        header (the values of the counts -32768 and 32767)."""
+        physical_min = self.offset + self.gain * -EDF_OFFSET
+        physical_max = self.offset + self.gain * (EDF_OFFSET - 1)
+        return physical_min, physical_max
@@ -0,0 +1,125 @@
+"""Record without the GUI (so without importing Qt)."""
+from datetime import datetime
+from signal import SIGINT, SIGTERM, signal
+from threading import Event
+from time import perf_counter
+
+from .daqmx import DAQmxReader
+from .playback import EdfPlayer
+
+
+def status_line(status, elapsed):
+    """Summary of the state of the acquisition in one line.
+
+    Parameters
+    ----------
+    status : dict
+        see metrics.reader_status
+    elapsed : float
+        time (in s) since the beginning of the recordings
+
+    Returns
+    -------
+    str
+        one line with the most important values
+    """
+    m = status['metrics']
+    tasks = m['tasks'].values()
+    line = ('{} {:.0f} s, {} buffers, duration max {:.1f} ms, backlog max {}, '
+            'errors {}'.format(datetime.now().strftime('%H:%M:%S'), elapsed,
+                               m['callbacks'], m['max_duration'] * 1000,
+                               max(t['max_backlog'] for t in tasks),
+                               sum(t['errors'] for t in tasks)))
+    w = status['edf']
+    if w is not None:
+        line += ', EDF queue {} (max {}) dropped {}'.format(
+            w['depth'], w['max_depth'], w['dropped'])
+        if w['error'] is not None:
+            line += ', EDF error ({} not written)'.format(w['failed'])
+        if w['compression'] is not None:
+            line += ', ratio {:.2f}'.format(w['compression']['ratio'])
+    if status['detector'] is not None:
+        line += ', events {}'.format(status['detector']['events'])
+    if status['stream'] is not None:
+        line += ', clients {} (dropped {})'.format(
+            len(status['stream']),
+            sum(c['dropped'] for c in status['stream']))
+    return line
+
+
+def record(args):
+    """Acquire the data (or play back the EDF file) and write it to EDF,
+    until SIGINT (Ctrl+C) or SIGTERM, or until args.duration.
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments specified by the user
+
+    Returns
+    -------
+    int
+        exit code (0 if there were no errors)
+
+    Notes
+    -----
+    The state of the acquisition is printed every args.status_interval
+    seconds. The data is not used in this process, so each buffer is
+    released as soon as it's read.
+    """
+    stopping = Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal(SIGINT, stop)
+    signal(SIGTERM, stop)
+
+    def funct(data, timestamp):
+        reader.pool.release(data)
+
+    if args.play is not None:
+        reader = EdfPlayer(args, funct)
+    else:
+        reader = DAQmxReader(args, funct)
+
+    exit_code = 0
+    t0 = perf_counter()
+    reader.StartTask()
+    try:  # the file is closed also if there is an error
+        print('recording (Ctrl+C to stop)', flush=True)
+        t_status = t0
+        while True:
+            wait = t_status + args.status_interval - perf_counter()
+            if args.duration:
+                wait = min(wait, t0 + args.duration - perf_counter())
+            if stopping.wait(max(wait, 0)):
+                break
+
+            now = perf_counter()
+            if now - t_status >= args.status_interval:
+                print(status_line(reader.status(), now - t0), flush=True)
+                t_status = now
+            if args.duration and now - t0 >= args.duration:
+                break
+            if args.play is not None and not reader.thread.is_alive():
+                break  # end of the file
+    finally:
+        try:
+            reader.StopTask()
+        except reader.Error as err:
+            print('error while stopping: {}'.format(err), flush=True)
+            exit_code = 1
+        if reader.edf is not None:
+            reader.edf.close()
+        reader.ClearTask()
+
+    status = reader.status()
+    print('stopped: ' + status_line(status, perf_counter() - t0), flush=True)
+    if any(t['errors'] for t in status['metrics']['tasks'].values()):
+        exit_code = 1
+    if status['edf'] is not None and status['edf']['error'] is not None:
+        print('EDF error: {} ({} buffers not written)'.format(
+            status['edf']['error'], status['edf']['failed']), flush=True)
+        exit_code = 1
+    return exit_code
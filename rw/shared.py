@@ -0,0 +1,169 @@
+from multiprocessing.shared_memory import SharedMemory
+
+from numpy import dtype as np_dtype, float64, int64, ndarray
+
+HEADER = 5  # int64 in the header: head, n_chan, n_smp, n_slots, dtype
+WRITING = -1  # sequence number of a slot while it's being written
+
+
+class SharedRing():
+    """Ring buffer of frames in shared memory, written by one process and
+    read by any number of processes.
+
+    Parameters
+    ----------
+    n_chan : int
+        number of channels (only to create the ring buffer)
+    n_smp : int
+        number of samples in each frame (only to create the ring buffer)
+    n_slots : int
+        number of frames in the ring buffer (only to create it)
+    name : str
+        name of the shared memory, to attach to an existing ring buffer
+    dtype : str
+        data type of the frames (only to create the ring buffer)
+
+    Attributes
+    ----------
+    name : str
+        name of the shared memory (to pass to the other processes)
+    scaling : ndarray
+        2 X n_chan matrix with the offset and gain of each channel, if the
+        frames are in counts (written once by the writer, before the first
+        frame)
+    next_seq : int
+        sequence number of the next frame to read
+    n_read : int
+        number of frames read
+    n_lost : int
+        number of frames which were overwritten before they could be read
+
+    Notes
+    -----
+    Each frame has a sequence number (0 for the first frame written, 1 for
+    the second, ...) and it's stored in the slot seq % n_slots. The writer
+    marks the slot as being written, copies the frame and then stores its
+    sequence number in the slot and increases the number of frames written
+    (head). The writer never waits for the readers: a reader that falls
+    behind loses the oldest frames (and it knows how many), and a reader
+    checks that the sequence number of the slot did not change while it was
+    copying the frame.
+    """
+    def __init__(self, n_chan=None, n_smp=None, n_slots=32, name=None,
+                 dtype='float64'):
+        if name is None:
+            dtype = np_dtype(dtype)
+            size = (8 * (HEADER + 2 * n_slots + 2 * n_chan) +
+                    dtype.itemsize * n_slots * n_chan * n_smp)
+            self.shm = SharedMemory(create=True, size=size)
+            header = ndarray(HEADER, dtype=int64, buffer=self.shm.buf)
+            header[:] = 0, n_chan, n_smp, n_slots, ord(dtype.char)
+        else:
+            self.shm = SharedMemory(name=name)
+            header = ndarray(HEADER, dtype=int64, buffer=self.shm.buf)
+            n_chan, n_smp, n_slots = (int(x) for x in header[1:4])
+            dtype = np_dtype(chr(header[4]))
+
+        self.name = self.shm.name
+        self.n_slots = n_slots
+        self.header = header
+        offset = 8 * HEADER
+        self.seq = ndarray(n_slots, dtype=int64, buffer=self.shm.buf,
+                           offset=offset)
+        offset += 8 * n_slots
+        self.time = ndarray(n_slots, dtype=float64, buffer=self.shm.buf,
+                            offset=offset)
+        offset += 8 * n_slots
+        self.scaling = ndarray((2, n_chan), dtype=float64, buffer=self.shm.buf,
+                               offset=offset)
+        offset += 8 * 2 * n_chan
+        self.frames = ndarray((n_slots, n_chan, n_smp), dtype=dtype,
+                              buffer=self.shm.buf, offset=offset)
+        if name is None:
+            self.seq[:] = WRITING
+
+        self.next_seq = 0
+        self.n_read = 0
+        self.n_lost = 0
+
+    @property
+    def head(self):
+        """Number of frames written."""
+        return int(self.header[0])
+
+    def write(self, data, timestamp):
+        """Copy one frame into the ring buffer.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_chan X n_smp matrix
+        timestamp : float
+            time when the frame was read
+        """
+        seq = self.head
+        slot = seq % self.n_slots
+        self.seq[slot] = WRITING
+        self.frames[slot] = data
+        self.time[slot] = timestamp
+        self.seq[slot] = seq
+        self.header[0] = seq + 1
+
+    def read(self, out):
+        """Copy the next frame, if there is one.
+
+        Parameters
+        ----------
+        out : ndarray
+            n_chan X n_smp matrix where the frame is copied
+
+        Returns
+        -------
+        float
+            time when the frame was read, or None if there are no new frames
+        """
+        while True:
+            head = self.head
+            if self.next_seq >= head:
+                return None
+
+            # the oldest slot might be written right now
+            oldest = head - self.n_slots + 1
+            if self.next_seq < oldest:
+                self.n_lost += oldest - self.next_seq
+                self.next_seq = oldest
+
+            slot = self.next_seq % self.n_slots
+            out[:] = self.frames[slot]
+            timestamp = float(self.time[slot])
+            if self.seq[slot] == self.next_seq:
+                self.next_seq += 1
+                self.n_read += 1
+                return timestamp
+
+            # the frame was overwritten while it was copied
+            self.n_lost += 1
+            self.next_seq += 1
+
+    def skip(self):
+        """Skip all the frames which were not read yet.
+
+        Returns
+        -------
+        int
+            number of frames which were skipped
+        """
+        head = self.head
+        n_skipped = max(head - self.next_seq, 0)
+        self.next_seq += n_skipped
+        return n_skipped
+
+    def close(self):
+        """Detach from the shared memory."""
+        self.header = self.seq = self.time = self.scaling = None
+        self.frames = None
+        self.shm.close()
+
+    def unlink(self):
+        """Free the shared memory (only the process which created it)."""
+        self.shm.unlink()
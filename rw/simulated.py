@@ -0,0 +1,370 @@
+"""Software device with the same Task surface as PyDAQmx, so that the
+acquisition can run without NI hardware.
+
+This module can be used in place of PyDAQmx: it exports a Task class, the
+DAQError exception, the ctypes types and the DAQmx_Val_* constants used by
+DAQmxReader. The values of the constants are the same as in NIDAQmx.h.
+
+Notes
+-----
+The signals only depend on the index of the sample, so two acquisitions with
+the same parameters produce exactly the same data. Tasks which use the sample
+clock of another task (such as '/Dev1/ai/SampleClock') share that clock, so
+they are synchronized in the same way as the slave tasks on the real devices.
+"""
+from ctypes import (c_double as float64,
+                    c_int16 as int16,
+                    c_int32 as int32,
+                    c_uint32 as uInt32,
+                    c_uint32 as bool32,
+                    )
+from re import match
+from threading import Event, Thread, current_thread
+from time import perf_counter
+from traceback import print_exc
+
+from numpy import arange, array, asarray, clip, newaxis, pi, rint, sin, uint32
+
+DAQmx_Val_Diff = 10106
+DAQmx_Val_RSE = 10083
+DAQmx_Val_Volts = 10348
+DAQmx_Val_Rising = 10280
+DAQmx_Val_ContSamps = 10123
+DAQmx_Val_Acquired_Into_Buffer = 1
+DAQmx_Val_GroupByChannel = 0
+DAQmx_Val_GroupByScanNumber = 1
+DAQmx_Val_Auto = -1
+DAQmx_Val_ChanPerLine = 0
+DAQmx_Val_ChanForAllLines = 1
+
+DAQmxErrorSamplesNoLongerAvailable = -200279
+DAQmxErrorSamplesNotYetAvailable = -200284
+DAQmxErrorInvalidRoutingSourceTerminalName_Routing = -89120
+DAQmxErrorPhysicalChanDoesNotExist = -200170
+
+PORT_WIDTH = 32  # lines in one port, when the lines are not specified
+DIGITAL_DIV = 10  # the digital word increases by one every DIGITAL_DIV samples
+SPIKE_PERIOD = 997  # samples between two spikes on the same channel
+ADC_BITS = 16
+ADC_OVERRANGE = 1.05  # the counts cover slightly more than minval to maxval
+
+_clocks = {}  # sample clocks which can be used by other tasks, by terminal
+
+
+class DAQError(Exception):
+    """Error of the simulated device, with the same attributes as the
+    DAQError of PyDAQmx."""
+    def __init__(self, error, mess, fname):
+        self.error = error
+        self.mess = mess
+        self.fname = fname
+
+    def __str__(self):
+        return '{} in function {}'.format(self.mess, self.fname)
+
+
+class _Clock():
+    """Sample clock, which starts counting samples when its task starts."""
+    def __init__(self, rate):
+        self.rate = rate
+        self.t0 = None
+
+    def start(self):
+        self.t0 = perf_counter()
+
+    def stop(self):
+        self.t0 = None
+
+    def samples(self):
+        if self.t0 is None:
+            return 0
+        return int((perf_counter() - self.t0) * self.rate)
+
+
+def _expand_range(s):
+    """Convert '0:7' into [0, 1, ..., 7] and '3' into [3]."""
+    s = s.split(':')
+    return list(range(int(s[0]), int(s[-1]) + 1))
+
+
+def _parse_analog(physical):
+    """Return the name of each channel in a string such as
+    'Dev1/ai0:7, Dev1/ai16:23'."""
+    names = []
+    for one in physical.split(','):
+        m = match(r'\s*/?(\w+)/ai([\d:]+)\s*$', one)
+        if m is None:
+            raise DAQError(DAQmxErrorPhysicalChanDoesNotExist,
+                           'Physical channel specified does not exist: ' +
+                           one, 'CreateAIVoltageChan')
+        names.extend(m.group(1) + '/ai' + str(i)
+                     for i in _expand_range(m.group(2)))
+    return names
+
+
+def _parse_digital(lines, line_grouping):
+    """Return the name and bit mask of each channel in a string such as
+    'Dev1/port0/line0:31'."""
+    chans = []
+    for one in lines.split(','):
+        m = match(r'\s*/?(\w+)/port(\d+)(?:/line([\d:]+))?\s*$', one)
+        if m is None:
+            raise DAQError(DAQmxErrorPhysicalChanDoesNotExist,
+                           'Physical channel specified does not exist: ' +
+                           one, 'CreateDIChan')
+        port = m.group(1) + '/port' + m.group(2)
+        if m.group(3) is None:
+            bits = list(range(PORT_WIDTH))
+        else:
+            bits = _expand_range(m.group(3))
+
+        if line_grouping == DAQmx_Val_ChanPerLine:
+            chans.extend((port + '/line' + str(b), 1 << b) for b in bits)
+        else:
+            chans.append((port, sum(1 << b for b in bits)))
+    return chans
+
+
+def analog_signal(idx, n_chan, s_freq):
+    """Synthetic analog signal, in V.
+
+    Parameters
+    ----------
+    idx : ndarray
+        index of the samples
+    n_chan : int
+        number of channels
+    s_freq : float
+        sampling frequency
+
+    Returns
+    -------
+    ndarray
+        n_chan X n_samples matrix with a sine wave (with a different frequency
+        for each channel), line noise, spikes and deterministic noise.
+    """
+    chan = arange(n_chan)[:, newaxis]
+    t = idx / s_freq
+    x = 0.3 * sin(2 * pi * (1 + chan % 40) * t + chan)
+    x += 0.05 * sin(2 * pi * 60 * t)
+    x += 0.6 * ((idx + 37 * chan) % SPIKE_PERIOD < max(1, s_freq // 1000))
+    x += 0.02 * ((sin(idx * 12.9898 + chan * 78.233) * 43758.5453) % 1 - 0.5)
+    return x
+
+
+def digital_signal(idx, masks):
+    """Synthetic digital signal (a counter which increases by one every
+    DIGITAL_DIV samples), with the bits selected by the mask of each channel.
+    """
+    word = (idx // DIGITAL_DIV).astype(uint32)
+    return word[newaxis, :] & asarray(masks, dtype=uint32)[:, newaxis]
+
+
+class Task():
+    """Simulated task, with the same methods as PyDAQmx.Task.
+
+    Notes
+    -----
+    The device buffer is as large as the one allocated by NI-DAQmx for
+    continuous acquisitions. If the samples are not read fast enough, reading
+    raises the same error as the real device.
+    """
+    def __init__(self):
+        self.analog = None
+        self.channels = []
+        self.masks = []
+        self.minval = array([])  # input range of each analog channel
+        self.maxval = array([])
+        self.clock = None
+        self.own_clock = False
+        self.buffer = 0
+        self.pos = 0
+        self.every_n = None
+        self.thread = None
+        self.stopping = Event()
+
+    def CreateAIVoltageChan(self, physicalChannel, nameToAssignToChannel,
+                            terminalConfig, minVal, maxVal, units,
+                            customScaleName):
+        self.analog = True
+        names = _parse_analog(physicalChannel.decode())
+        self.channels.extend(names)
+        self.minval = array(list(self.minval) + [minVal] * len(names))
+        self.maxval = array(list(self.maxval) + [maxVal] * len(names))
+        return 0
+
+    def CreateDIChan(self, lines, nameToAssignToLines, lineGrouping):
+        self.analog = False
+        for name, mask in _parse_digital(lines.decode(), lineGrouping):
+            self.channels.append(name)
+            self.masks.append(mask)
+        return 0
+
+    def CfgSampClkTiming(self, source, rate, activeEdge, sampleMode,
+                         sampsPerChan):
+        source = source.decode()
+        if source in ('', 'OnboardClock'):
+            self.clock = _Clock(rate)
+            self.own_clock = True
+            dev = self.channels[0].split('/')[0]
+            kind = 'ai' if self.analog else 'di'
+            _clocks['/{}/{}/SampleClock'.format(dev, kind)] = self.clock
+        else:
+            if source not in _clocks:
+                raise DAQError(DAQmxErrorInvalidRoutingSourceTerminalName_Routing,
+                               'Source terminal to be routed could not be '
+                               'found on the device: ' + source,
+                               'CfgSampClkTiming')
+            self.clock = _clocks[source]
+
+        # same rule as NI-DAQmx to choose the size of the buffer
+        if rate <= 100:
+            default = 1000
+        elif rate <= 10000:
+            default = 10000
+        elif rate <= 1000000:
+            default = 100000
+        else:
+            default = 1000000
+        self.buffer = max(sampsPerChan, default)
+        return 0
+
+    def AutoRegisterEveryNSamplesEvent(self, everyNsamplesEventType,
+                                       nSamples, options,
+                                       name='EveryNCallback'):
+        self.every_n = (nSamples, name)
+        return 0
+
+    def AutoRegisterDoneEvent(self, options, name='DoneCallback'):
+        # Done events only occur on finite acquisitions, never simulated
+        return 0
+
+    def StartTask(self):
+        self.pos = 0
+        if self.own_clock:
+            self.clock.start()
+        if self.every_n is not None:
+            self.stopping.clear()
+            self.thread = Thread(target=self._run, daemon=True)
+            self.thread.start()
+        return 0
+
+    def StopTask(self):
+        self.stopping.set()
+        if self.thread is not None and self.thread is not current_thread():
+            self.thread.join()
+        self.thread = None
+        if self.own_clock:
+            self.clock.stop()
+        return 0
+
+    def ClearTask(self):
+        self.StopTask()
+        for k, v in list(_clocks.items()):
+            if v is self.clock and self.own_clock:
+                del _clocks[k]
+        return 0
+
+    def GetReadAvailSampPerChan(self, data):
+        data._obj.value = max(self.clock.samples() - self.pos, 0)
+        return 0
+
+    def ReadAnalogF64(self, numSampsPerChan, timeout, fillMode, readArray,
+                      arraySizeInSamps, sampsPerChanRead, reserved):
+        n, out = self._read(numSampsPerChan, timeout, fillMode, readArray,
+                            arraySizeInSamps, 'ReadAnalogF64')
+        x = analog_signal(arange(self.pos, self.pos + n), len(self.channels),
+                          self.clock.rate)
+        out[:] = clip(x, self.minval[:, newaxis], self.maxval[:, newaxis])
+        self.pos += n
+        sampsPerChanRead._obj.value = n
+        return 0
+
+    def ReadBinaryI16(self, numSampsPerChan, timeout, fillMode, readArray,
+                      arraySizeInSamps, sampsPerChanRead, reserved):
+        n, out = self._read(numSampsPerChan, timeout, fillMode, readArray,
+                            arraySizeInSamps, 'ReadBinaryI16')
+        x = analog_signal(arange(self.pos, self.pos + n), len(self.channels),
+                          self.clock.rate)
+        offset, gain = self._scaling()
+        x = clip(x, self.minval[:, newaxis], self.maxval[:, newaxis])
+        out[:] = rint((x - offset[:, newaxis]) / gain[:, newaxis])
+        self.pos += n
+        sampsPerChanRead._obj.value = n
+        return 0
+
+    def GetAIDevScalingCoeff(self, channel, data, arraySizeInElements):
+        """Polynomial which converts the counts of the ADC into V (only
+        offset and gain, the ADC of the simulated device is linear)."""
+        name = channel.decode().lstrip('/')
+        if name not in self.channels:
+            raise DAQError(DAQmxErrorPhysicalChanDoesNotExist,
+                           'Physical channel specified does not exist: ' +
+                           channel.decode(), 'GetAIDevScalingCoeff')
+        i = self.channels.index(name)
+        offset, gain = self._scaling()
+        data[:arraySizeInElements] = 0
+        data[:2] = offset[i], gain[i]
+        return 0
+
+    def _scaling(self):
+        """Offset (in V) and gain (in V per count) of the ADC, for each
+        channel."""
+        offset = (self.maxval + self.minval) / 2
+        gain = (self.maxval - self.minval) * ADC_OVERRANGE / 2 ** ADC_BITS
+        return offset, gain
+
+    def ReadDigitalU32(self, numSampsPerChan, timeout, fillMode, readArray,
+                       arraySizeInSamps, sampsPerChanRead, reserved):
+        n, out = self._read(numSampsPerChan, timeout, fillMode, readArray,
+                            arraySizeInSamps, 'ReadDigitalU32')
+        out[:] = digital_signal(arange(self.pos, self.pos + n), self.masks)
+        self.pos += n
+        sampsPerChanRead._obj.value = n
+        return 0
+
+    def _read(self, numSampsPerChan, timeout, fillMode, readArray,
+              arraySizeInSamps, fname):
+        """Wait until the samples are available and return the number of
+        samples to read and a n_chan X n_samples view of readArray."""
+        n_chan = len(self.channels)
+        readArray = readArray.reshape(-1)
+        avail = self.clock.samples() - self.pos
+        if avail > self.buffer:
+            raise DAQError(DAQmxErrorSamplesNoLongerAvailable,
+                           'The application is not able to keep up with the '
+                           'hardware acquisition.', fname)
+
+        if numSampsPerChan == DAQmx_Val_Auto:
+            n = avail
+        else:
+            n = numSampsPerChan
+            t_end = perf_counter() + timeout
+            while self.clock.samples() - self.pos < n:
+                if perf_counter() > t_end:
+                    raise DAQError(DAQmxErrorSamplesNotYetAvailable,
+                                   'Some or all of the samples requested have '
+                                   'not yet been acquired.', fname)
+                self.stopping.wait(n / self.clock.rate / 10)
+        n = min(n, arraySizeInSamps // n_chan)
+
+        if fillMode == DAQmx_Val_GroupByChannel:
+            out = readArray[:n * n_chan].reshape(n_chan, n)
+        else:
+            out = readArray[:n * n_chan].reshape(n, n_chan).T
+        return n, out
+
+    def _run(self):
+        """Call the EveryNCallback every time N samples are acquired."""
+        n_samples, name = self.every_n
+        i = 1
+        while not self.stopping.is_set():
+            if self.clock.samples() < n_samples * i:
+                wait = ((n_samples * i) - self.clock.samples()) / self.clock.rate
+                self.stopping.wait(max(wait, 0))
+                continue
+            i += 1
+            try:
+                getattr(self, name)()
+            except Exception:
+                print_exc()
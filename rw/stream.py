@@ -0,0 +1,360 @@
+"""Stream the data to other programs, over a local TCP or Unix socket.
+
+A client connects and sends the channels it wants: the number of channels
+(uint32, 0 for all the channels) followed by the index of each channel
+(uint16), all little-endian. Then the server sends each buffer as a header
+(see HEADER: magic, sequence number, time when the buffer was read, number of
+channels, number of samples and dtype) followed by the samples (n_chan X
+n_samples, C order).
+"""
+from queue import Empty, Full, Queue
+from os import remove
+from os.path import exists
+from socket import (AF_INET, SHUT_RDWR, SOCK_STREAM, SOL_SOCKET,
+                    SO_REUSEADDR, socket)
+try:
+    from socket import AF_UNIX
+except ImportError:  # Windows
+    AF_UNIX = None
+from struct import Struct
+from threading import Lock, Thread
+from time import time
+
+from numpy import arange, array, dtype, frombuffer
+
+HEADER = Struct('<4sQdII4s')  # magic, seq, time, n_chan, n_smp, dtype
+MAGIC = b'OPBX'
+N_CHAN = Struct('<I')
+CHAN = Struct('<H')
+
+
+def _open_socket(address):
+    """TCP socket if the address is 'host:port', otherwise Unix socket."""
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        return socket(AF_INET, SOCK_STREAM), (host, int(port))
+    if AF_UNIX is None:
+        raise ValueError('Unix sockets are not available on this system, the '
+                         'address should be host:port (such as '
+                         'localhost:5555), not "{}"'.format(address))
+    return socket(AF_UNIX, SOCK_STREAM), address
+
+
+def _recv(sock, n_bytes):
+    """Receive exactly n_bytes."""
+    buf = bytearray(n_bytes)
+    view = memoryview(buf)
+    i = 0
+    while i < n_bytes:
+        n = sock.recv_into(view[i:])
+        if n == 0:
+            raise ConnectionError('connection closed')
+        i += n
+    return buf
+
+
+class Subscriber():
+    """One client of the StreamServer, with its own queue and thread, so that
+    a slow client does not delay the others (or the acquisition).
+
+    Parameters
+    ----------
+    sock : socket
+        connection with the client
+    channels : ndarray
+        index of the channels to send
+    max_size : int
+        maximum number of buffers waiting to be sent (the buffers are dropped
+        when the queue is full)
+    done : function
+        function called with the data once it has been sent or dropped
+    """
+    def __init__(self, sock, channels, max_size, done):
+        self.sock = sock
+        self.channels = channels
+        self.done = done
+        self.queue = Queue(max_size)
+
+        # channels which are consecutive are sent without copying
+        self.rows = None
+        if (len(channels) > 0 and
+                (channels == arange(channels[0],
+                                    channels[0] + len(channels))).all()):
+            self.rows = slice(channels[0], channels[0] + len(channels))
+
+        self.n_sent = 0
+        self.n_dropped = 0
+        self.max_depth = 0
+        self.max_latency = 0.
+        self.closed = False
+        self.lock = Lock()
+
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def put(self, seq, timestamp, data):
+        """Add one buffer to the queue, unless it's full.
+
+        Returns
+        -------
+        bool
+            True if the buffer will be sent (and done will be called), False
+            if it was dropped.
+        """
+        with self.lock:
+            if self.closed:
+                return False
+            try:
+                self.queue.put_nowait((seq, timestamp, data))
+            except Full:
+                self.n_dropped += 1
+                return False
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def close(self):
+        """Stop the thread, without waiting if the queue is full (the socket
+        should be shut down first, so that a pending send returns)."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                self.queue.put_nowait(None)
+            except Full:  # _run stops anyway, because the socket is closed
+                pass
+
+    def stats(self):
+        """Statistics about this client.
+
+        Returns
+        -------
+        dict
+            'channels' (number of channels), 'lag' (buffers in the queue),
+            'max_lag', 'max_latency' (in s, between reading the buffer and
+            sending it), 'sent' and 'dropped' (number of buffers).
+        """
+        return {'channels': len(self.channels),
+                'lag': self.queue.qsize(),
+                'max_lag': self.max_depth,
+                'max_latency': self.max_latency,
+                'sent': self.n_sent,
+                'dropped': self.n_dropped,
+                }
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            seq, timestamp, data = item
+            try:
+                self._send(seq, timestamp, data)
+            except OSError:  # the client disconnected
+                break
+            finally:
+                self.done(data)
+
+        # release the buffers which were not sent
+        with self.lock:
+            self.closed = True
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except Empty:
+                break
+            if item is not None:
+                self.done(item[2])
+        self.sock.close()
+
+    def _send(self, seq, timestamp, data):
+        if self.rows is not None:
+            x = data[self.rows]
+        else:
+            x = data[self.channels]
+        header = HEADER.pack(MAGIC, seq, timestamp, x.shape[0], x.shape[1],
+                             x.dtype.str.encode('ascii'))
+        payload = memoryview(x).cast('B')
+        try:
+            sendmsg = self.sock.sendmsg
+        except AttributeError:  # Windows
+            self.sock.sendall(header)
+            self.sock.sendall(payload)
+        else:
+            n = sendmsg([header, payload])
+            n_total = len(header) + len(payload)
+            if n < len(header):
+                self.sock.sendall(header[n:])
+                n = len(header)
+            if n < n_total:
+                self.sock.sendall(payload[n - len(header):])
+
+        self.n_sent += 1
+        self.max_latency = max(self.max_latency, time() - timestamp)
+
+
+class StreamServer():
+    """Send the data to the clients which are connected to a socket.
+
+    Parameters
+    ----------
+    address : str
+        'host:port' for TCP (such as 'localhost:5555'), otherwise the path of
+        a Unix socket
+    n_chan : int
+        number of channels in the data
+    max_size : int
+        maximum number of buffers waiting to be sent to each client
+    release : function
+        function called with the data once it has been sent to all the
+        clients (such as FramePool.release)
+
+    Notes
+    -----
+    write only puts the data in the queue of each client, without copying
+    it. The data is released once all the clients have sent (or dropped) it.
+    """
+    def __init__(self, address, n_chan, max_size=20, release=None):
+        self.n_chan = n_chan
+        self.max_size = max_size
+        self.release = release
+
+        self.subscribers = []
+        self.seq = 0
+        self.users = {}  # id of the data: [data, number of clients]
+        self.lock = Lock()
+
+        self.sock, address = _open_socket(address)
+        self.path = None
+        if self.sock.family == AF_UNIX:
+            self.path = address
+            if exists(address):  # left by a previous recording
+                remove(address)
+        else:
+            self.sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        self.sock.bind(address)
+        self.sock.listen()
+        self.thread = Thread(target=self._accept, daemon=True)
+        self.thread.start()
+
+    def write(self, data, timestamp):
+        """Send the data to all the clients.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_chan X n_samples matrix (it should not be modified until it's
+            released)
+        timestamp : float
+            time when the data was read
+        """
+        with self.lock:
+            self.subscribers = [s for s in self.subscribers if not s.closed]
+            subscribers = list(self.subscribers)
+            self.users[id(data)] = [data, 1]
+        for subscriber in subscribers:
+            with self.lock:
+                self.users[id(data)][1] += 1
+            if not subscriber.put(self.seq, timestamp, data):
+                self._done(data)
+        self.seq += 1
+        self._done(data)
+
+    def close(self):
+        try:
+            self.sock.shutdown(SHUT_RDWR)  # so that accept returns
+        except OSError:
+            pass
+        self.sock.close()
+        if self.path is not None and exists(self.path):
+            remove(self.path)
+        with self.lock:
+            subscribers, self.subscribers = self.subscribers, []
+        # a client which does not read would block its thread in send
+        for subscriber in subscribers:
+            try:
+                subscriber.sock.shutdown(SHUT_RDWR)
+            except OSError:
+                pass
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def stats(self):
+        """Statistics of each client (see Subscriber.stats)."""
+        return [s.stats() for s in self.subscribers]
+
+    def _done(self, data):
+        with self.lock:
+            users = self.users[id(data)]
+            users[1] -= 1
+            if users[1] > 0:
+                return
+            del self.users[id(data)]
+        if self.release is not None:
+            self.release(data)
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self.sock.accept()
+            except OSError:  # closed
+                break
+            try:
+                n = N_CHAN.unpack(_recv(sock, N_CHAN.size))[0]
+                channels = [CHAN.unpack_from(_recv(sock, CHAN.size))[0]
+                            for _ in range(n)]
+            except (ConnectionError, OSError):
+                sock.close()
+                continue
+            if n == 0:
+                channels = list(range(self.n_chan))
+            if not all(c < self.n_chan for c in channels):
+                sock.close()
+                continue
+            subscriber = Subscriber(sock, array(channels, dtype=int),
+                                    self.max_size, self._done)
+            with self.lock:
+                self.subscribers.append(subscriber)
+
+
+def subscribe(address, channels=None):
+    """Receive the data from StreamServer.
+
+    Parameters
+    ----------
+    address : str
+        'host:port' for TCP, otherwise the path of a Unix socket
+    channels : list of int
+        index of the channels to receive (None for all the channels)
+
+    Yields
+    ------
+    int
+        sequence number of the buffer (consecutive, unless the server
+        dropped some buffers)
+    float
+        time when the buffer was read
+    ndarray
+        n_chan X n_samples matrix
+    """
+    sock, address = _open_socket(address)
+    sock.connect(address)
+    if channels is None:
+        channels = []
+    sock.sendall(N_CHAN.pack(len(channels)) +
+                 b''.join(CHAN.pack(c) for c in channels))
+    try:
+        while True:
+            try:
+                header = _recv(sock, HEADER.size)
+            except ConnectionError:  # the server stopped
+                return
+            magic, seq, timestamp, n_chan, n_smp, dt = HEADER.unpack(header)
+            if magic != MAGIC:
+                raise ConnectionError('not a stream of OpBoxPhys')
+            dt = dtype(dt.rstrip(b'\x00').decode('ascii'))
+            data = frombuffer(_recv(sock, n_chan * n_smp * dt.itemsize),
+                              dtype=dt).reshape(n_chan, n_smp)
+            yield seq, timestamp, data
+    finally:
+        sock.close()
@@ -0,0 +1,151 @@
+from queue import Full, Queue
+from threading import Thread
+from time import perf_counter
+from warnings import warn
+
+POLICIES = ('block', 'grow', 'spill')
+
+
+class AsyncWriter():
+    """Write data to file in a separate thread, so that a slow disk does not
+    delay the acquisition.
+
+    Parameters
+    ----------
+    writer : instance of ExportEdf
+        any object with the methods write(data) and close()
+    max_size : int
+        maximum number of buffers waiting to be written
+    policy : str
+        what to do when the queue is full: 'block' waits until the disk has
+        written one buffer, 'grow' lets the queue grow beyond max_size, and
+        'spill' drops the buffer (so the file will miss those samples).
+    release : function
+        function called with the data once it has been written or dropped
+        (such as FramePool.release)
+
+    Notes
+    -----
+    The data passed to write should not be modified afterwards, because it's
+    written later by the thread.
+
+    If the writer raises an error (such as a full disk), the error is kept
+    (see stats) and reported once as a warning, and the following buffers
+    are released without being written. write never raises, so that the
+    acquisition, the display and the stream go on.
+    """
+    def __init__(self, writer, max_size=50, policy='block', release=None):
+        if policy not in POLICIES:
+            raise ValueError('policy should be one of ' + ', '.join(POLICIES))
+        self.writer = writer
+        self.max_size = max_size
+        self.policy = policy
+        self.release = release
+
+        self.max_depth = 0
+        self.max_latency = 0.
+        self.n_written = 0
+        self.n_blocked = 0
+        self.n_dropped = 0
+        self.n_failed = 0  # not written because of the error
+        self.error = None
+
+        if policy == 'grow':
+            self.queue = Queue()
+        else:
+            self.queue = Queue(max_size)
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def __getattr__(self, name):
+        """Give access to the attributes of the writer (such as n_records)."""
+        if name == 'writer':
+            raise AttributeError(name)
+        return getattr(self.writer, name)
+
+    def write(self, data):
+        """Put the data in the queue to be written.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_chan X n_samples matrix
+        """
+        if self.error is not None:
+            self.n_failed += 1
+            if self.release is not None:
+                self.release(data)
+            return
+
+        item = (data, perf_counter())
+        try:
+            self.queue.put_nowait(item)
+        except Full:
+            if self.policy == 'spill':
+                self.n_dropped += 1
+                if self.release is not None:
+                    self.release(data)
+                return
+            self.n_blocked += 1
+            self.queue.put(item)
+
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def close(self):
+        """Write the data still in the queue, then close the file."""
+        if not self.thread.is_alive():
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.writer.close()
+
+    def stats(self):
+        """Statistics about the queue.
+
+        Returns
+        -------
+        dict
+            'depth' (buffers in the queue), 'max_depth', 'max_latency' (in s,
+            between write and the moment the data is written to disk),
+            'written', 'blocked', 'dropped' and 'failed' (number of buffers),
+            'error' (the error of the writer, None if there was no error).
+        """
+        return {'depth': self.queue.qsize(),
+                'max_depth': self.max_depth,
+                'max_latency': self.max_latency,
+                'written': self.n_written,
+                'blocked': self.n_blocked,
+                'dropped': self.n_dropped,
+                'failed': self.n_failed,
+                'error': None if self.error is None else str(self.error),
+                }
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                self.n_failed += 1
+                if self.release is not None:
+                    self.release(item[0])
+                continue
+
+            data, t_put = item
+            try:
+                self.writer.write(data)
+            except Exception as err:
+                self.error = err
+                self.n_failed += 1
+                warn('The data is not written anymore: {}'.format(err))
+                continue
+            finally:
+                if self.release is not None:
+                    self.release(data)
+
+            self.n_written += 1
+            latency = perf_counter() - t_put
+            if latency > self.max_latency:
+                self.max_latency = latency
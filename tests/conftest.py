@@ -0,0 +1,33 @@
+from argparse import Namespace
+
+from pytest import fixture
+
+
+@fixture
+def make_args(tmp_path):
+    """Arguments as they are created by OpBoxPhys.py, for the simulated
+    device (the keywords replace the default values)."""
+    def _make_args(**kwargs):
+        args = Namespace(backend='sim', dev='Dev1', analoginput='0:3',
+                         digitalinput=None, slave=None,
+                         slave_analoginput=None, slave_digitalinput=None,
+                         digital_mode='line', n_chan=4, s_freq=1000,
+                         buffer_size=0.1, minval=-1, maxval=1,
+                         calibration=None, raw=False, timeout=10,
+                         window_size=5, display='scroll', refresh=30,
+                         fft_length=1, fft_refresh=2, filter=None,
+                         detect=None, detect_filter=None, refractory=1,
+                         events_max=100, edf=str(tmp_path / 'rec.edf'),
+                         file_format='edf', archive_codec='zlib',
+                         archive_level=6, archive_chunk=1, archive_workers=2,
+                         edf_flush=1, edf_fsync=0, edf_filter=None,
+                         edf_header=10, edf_prealloc=0, edf_segment=0,
+                         edf_segment_size=0, edf_queue=50,
+                         edf_policy='block', pyramid=None, average=None,
+                         process=False, shared_slots=32, stream=None,
+                         stream_queue=20, metrics_csv=None, play=None,
+                         headless=False)
+        for k, v in kwargs.items():
+            setattr(args, k, v)
+        return args
+    return _make_args
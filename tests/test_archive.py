@@ -0,0 +1,60 @@
+from numpy import arange, array, int16, sin
+from numpy.random import default_rng
+from numpy.testing import assert_allclose, assert_array_equal
+from pytest import mark
+
+from ..rw.archive import ArchiveReader, ExportArchive, decode, encode
+from ..rw.edf import EdfReader, ExportEdf
+
+
+@mark.parametrize('codec', ['zlib', 'lzma'])
+def test_encode_wraparound(codec):
+    """The differences wrap around in int16, and are decoded exactly."""
+    x = array([32767, -32768, 32767, 0, -32768, -1, 1, 32767], dtype=int16)
+    x = x.repeat(3)
+    assert_array_equal(decode(encode(x, codec, 6), codec, len(x)), x)
+
+    x = default_rng(0).integers(-32768, 32768, 1000).astype(int16)
+    assert_array_equal(decode(encode(x, codec, 1), codec, len(x)), x)
+
+
+def test_encode_empty():
+    x = array([], dtype=int16)
+    out = decode(encode(x), 'zlib', 0)
+    assert out.dtype == int16
+    assert len(out) == 0
+
+
+def test_same_as_edf(make_args, tmp_path):
+    """The archive has the values of the EDF file, also for the incomplete
+    second at the end, and reads any time range of any channels."""
+    t = arange(2500) / 1000
+    data = 0.9 * sin(2 * 3.14 * arange(1, 5)[:, None] * t)
+
+    files = {}
+    for writer in (ExportEdf(), ExportArchive()):
+        ext = 'arc' if isinstance(writer, ExportArchive) else 'edf'
+        args = make_args(edf=str(tmp_path / ('rec.' + ext)), file_format=ext)
+        writer.open(args)
+        for i in range(0, 2500, 100):
+            writer.write(data[:, i:i + 100])
+        writer.close()
+        files[ext] = args.edf
+
+    edf = EdfReader(files['edf'])
+    archive = ArchiveReader(files['arc'])
+    assert archive.n_samples == 2500  # EDF only has the complete records
+    assert archive.labels == [l.strip() for l in edf.labels]
+    assert archive.stats()['chunks'] == 3
+
+    x = archive.read()
+    assert x.shape == (4, 2500)
+    for chan in range(4):
+        assert_array_equal(archive.read([chan], physical=False)[0, :2000],
+                           edf.read(chan, physical=False))
+        assert_allclose(x[chan, :2000], edf.read(chan))
+        assert_allclose(x[chan], data[chan], atol=1e-4)
+
+    part = archive.read([3, 1], 0.95, 2.05)
+    assert_array_equal(part, x[[3, 1], 950:2050])
+    assert archive.read(start=3).shape == (4, 0)
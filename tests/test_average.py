@@ -0,0 +1,53 @@
+from numpy import arange, array, vstack, zeros
+from numpy.testing import assert_allclose, assert_array_equal
+
+from ..proc.average import EventAverager, find_edges
+
+
+def test_find_edges():
+    lines = array([[0, 1, 1, 0, 1],
+                   [1, 1, 0, 0, 1]])
+    previous = array([True, False])
+    line, smp, last = find_edges(lines, previous)
+    assert_array_equal(smp, [0, 1, 4, 4])
+    assert_array_equal(line, [1, 0, 0, 1])
+    assert_array_equal(last, [True, True])
+    line, smp, _ = find_edges(lines, previous, 'falling')
+    assert_array_equal(smp, [0, 2, 3])
+    assert_array_equal(line, [0, 1, 0])
+    _, smp, _ = find_edges(lines, previous, 'both')
+    assert len(smp) == 7
+
+
+def test_edge_alignment():
+    """Each epoch starts pre before the edge, also when the edge is at the
+    border of a buffer and when the epoch wraps around the history."""
+    n_smp = 1000
+    analog = vstack((arange(n_smp), -2 * arange(n_smp))).astype(float)
+    lines = zeros((2, n_smp))
+    lines[0, 5:8] = 1  # too early
+    lines[0, 300:350] = 1
+    lines[0, 699:702] = 1  # in the previous buffer
+    lines[1, 0:3] = 1  # too early
+    lines[1, 450:460] = 1
+    lines[1, 990:] = 1  # not complete at the end
+
+    averager = EventAverager(2, 2, 1000, pre=0.01, post=0.02,
+                             buffer_size=64)
+    for i in range(0, n_smp, 100):
+        averager.push(analog[:, i:i + 100], lines[:, i:i + 100])
+
+    assert_array_equal(averager.time, (arange(30) - 10) / 1000)
+    assert averager.count.tolist() == [2, 1]
+    stats = averager.stats()
+    assert stats['skipped'] == 2
+    assert stats['pending'] == 1
+
+    epoch = arange(-10, 20)
+    mean = averager.mean
+    assert_allclose(mean[0, 0], (300 + 699) / 2 + epoch)
+    assert_allclose(mean[0, 1], -2 * ((300 + 699) / 2 + epoch))
+    assert_allclose(mean[1, 0], 450 + epoch)
+    assert_allclose(averager.var[0, 0], (699 - 300) ** 2 / 2)
+    assert_allclose(averager.var[1], 0)
+    assert_allclose(averager.sem[0, 0], (699 - 300) / 2)
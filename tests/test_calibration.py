@@ -0,0 +1,76 @@
+from numpy import array, empty, int16, linspace, tile
+from numpy.testing import assert_allclose, assert_array_equal
+from pytest import raises
+
+from ..rw.calibration import load_calibration
+from ..rw.edf import DIGITAL_MAX, DIGITAL_MIN, EdfReader, ExportEdf, to_digital
+
+
+def _write_csv(tmp_path, text):
+    filename = tmp_path / 'calibration.csv'
+    filename.write_text(text)
+    return str(filename)
+
+
+def test_load_calibration(make_args, tmp_path):
+    """The missing columns and the empty cells take the default values."""
+    calibration = _write_csv(tmp_path, 'label, unit, maxval, gain\n'
+                                       'EMG, uV, 5, 1000\n'
+                                       ', , , \n'
+                                       'temp, C, , -10\n')
+    args = make_args(analoginput='0:2', n_chan=3, calibration=calibration)
+    cal = load_calibration(args)
+    assert cal.labels == ['EMG', '1', 'temp']
+    assert cal.units == ['uV', 'V', 'C']
+    assert_array_equal(cal.minval, [-1, -1, -1])
+    assert_array_equal(cal.maxval, [5, 1, 1])
+    assert_array_equal(cal.gain, [1000, 1, -10])
+    assert_array_equal(cal.offset, [0, 0, 0])
+    assert_array_equal(cal.physical(-1, 1), ([-1000, -1, 10],
+                                             [1000, 1, -10]))
+
+
+def test_load_calibration_errors(make_args, tmp_path):
+    args = make_args(analoginput='0:1', n_chan=2)
+    args.calibration = _write_csv(tmp_path, 'label, scale\nA, 1\nB, 2\n')
+    with raises(ValueError, match='scale'):
+        load_calibration(args)
+    args.calibration = _write_csv(tmp_path, 'label\nA\n')
+    with raises(ValueError, match='one row for each of the 2'):
+        load_calibration(args)
+
+
+def test_to_digital_saturates():
+    """Values out of range saturate instead of wrapping around in int16."""
+    x = array([[-2., -1., 0., 0.4, 1., 2.],
+               [-1e9, 1e9, 0., 1e-6, 3e-6, -3e-6]])
+    gain = array([[32767.5], [1e6]])
+    offset = array([[-0.5], [0.]])
+    out = empty((2, 8), dtype=int16)
+    work = empty((2, 10))
+    to_digital(x, gain, offset, out[:, 1:7], work)
+    assert_array_equal(out[0, 1:7], [DIGITAL_MIN, -32768, 0, 13106,
+                                     32767, DIGITAL_MAX])
+    assert_array_equal(out[1, 1:7], [DIGITAL_MIN, DIGITAL_MAX, 0, 1, 3, -3])
+
+
+def test_edf_per_channel(make_args, tmp_path):
+    """Each channel has its own range, unit and calibration in the EDF
+    header, and the values read back are in physical units."""
+    calibration = _write_csv(tmp_path, 'label, unit, minval, maxval, gain\n'
+                                       'A, uV, -0.1, 0.1, 1e6\n'
+                                       'B, V, -5, 5, 1\n')
+    args = make_args(analoginput='0:1', n_chan=2, calibration=calibration)
+    edf = ExportEdf()
+    edf.open(args)
+    data = tile(linspace(-0.2, 0.2, 1000), (2, 1))
+    data[1] *= 20
+    edf.write(data)
+    edf.close()
+
+    reader = EdfReader(args.edf)
+    assert reader.labels == ['A', 'B']
+    assert reader.units == ['uV', 'V']
+    a = reader.read(0)
+    assert_allclose(a, (data[0] * 1e6).clip(-1e5, 1e5), atol=5)  # saturates
+    assert_allclose(reader.read(1), data[1], atol=5e-4)
@@ -0,0 +1,42 @@
+from numpy import arange, isnan, nan, nanmax, nanmin
+from numpy.random import default_rng
+from numpy.testing import assert_array_equal
+
+from ..proc.decimate import minmax
+
+
+def test_minmax():
+    """Each column has the min and max of its samples, so a spike of one
+    sample remains visible."""
+    x_axis = arange(1003) / 1000
+    data = default_rng(0).standard_normal((3, 1003))
+    data[1, 517] = 100
+    x, y = minmax(x_axis, data, 100)
+    assert x.shape == (200, )
+    assert y.shape == (3, 200)
+    assert y[1].max() == 100
+
+    start = (arange(100) * 1003) // 100
+    end = list(start[1:]) + [1003]
+    for i, (a, b) in enumerate(zip(start, end)):
+        assert x[2 * i] == x[2 * i + 1] == x_axis[a]
+        assert_array_equal(y[:, 2 * i], data[:, a:b].min(axis=1))
+        assert_array_equal(y[:, 2 * i + 1], data[:, a:b].max(axis=1))
+
+
+def test_minmax_nan():
+    """The part of the window which is not full yet (NaN) is ignored."""
+    data = arange(2000.).reshape(2, 1000)
+    data[:, 700:] = nan
+    x, y = minmax(arange(1000), data, 50)
+    assert_array_equal(y[0, 0:2], [0, 19])
+    assert_array_equal(y[1, 68:70], [1680, 1699])
+    assert isnan(y[:, 70:]).all()  # only NaN in these columns
+    assert nanmin(y[0]) == 0
+    assert nanmax(y[0]) == 699
+
+
+def test_minmax_short():
+    data = arange(10.).reshape(1, 10)
+    x, y = minmax(arange(10), data, 5)
+    assert y is data
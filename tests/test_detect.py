@@ -0,0 +1,34 @@
+from numpy import concatenate
+from numpy.random import default_rng
+
+from ..proc.detect import Detector
+
+
+def _run(detector, x, n_smp=100):
+    return concatenate([detector.detect(x[:, i:i + n_smp])
+                        for i in range(0, x.shape[1], n_smp)])
+
+
+def test_threshold_and_refractory():
+    x = default_rng(0).standard_normal((2, 3000))
+    x[0, 500] = 20  # during the warm-up
+    x[0, [1500, 1505, 1512, 1995, 2003]] = 20  # 1995 and 2003 in two buffers
+    x[1, 1500] = 20
+    x[1, 1600:1605] = 20  # one crossing, several samples long
+    x[1, 2500] = -20  # wrong direction
+
+    detector = Detector(2, 1000, 5, refractory=0.01)
+    events = _run(detector, x)
+    assert events['sample'].tolist() == [1500, 1500, 1512, 1600, 1995]
+    assert events['chan'].tolist() == [0, 1, 0, 1, 0]
+    assert (events['amplitude'] == 20).all()
+    assert detector.stats()['events'] == 5
+
+
+def test_negative_threshold():
+    x = default_rng(1).standard_normal((1, 2000))
+    x[0, [1200, 1300]] = -20
+    x[0, 1400] = 20
+
+    events = _run(Detector(1, 1000, -5), x)
+    assert events['sample'].tolist() == [1200, 1300]
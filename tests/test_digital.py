@@ -0,0 +1,57 @@
+from numpy import array, isnan, nan, uint32, zeros
+from numpy.random import default_rng
+from numpy.testing import assert_array_equal
+
+from ..rw.digital import (digital_ports, digital_rows, expand_lines,
+                          n_edf_words, unpack)
+from ..rw.edf import EdfReader, ExportEdf
+
+
+def test_layout(make_args):
+    args = make_args(digital_mode='port', digitalinput='0:31', slave='Dev2',
+                     slave_analoginput='0:1', slave_digitalinput='0:7',
+                     n_chan=8)
+    assert digital_ports(args) == [list(range(32)), list(range(8))]
+    assert digital_rows(args) == 2
+    assert [n_edf_words(x) for x in digital_ports(args)] == [2, 1]
+    args.digital_mode = 'line'
+    assert digital_rows(args) == 40
+    assert expand_lines('0:3,6') == [0, 1, 2, 3, 6]
+
+
+def test_unpack():
+    words = array([0b101, 0b010, nan, 2 ** 31])
+    lines = unpack(words, [0, 1, 31])
+    assert_array_equal(lines[:, [0, 1, 3]], [[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    assert isnan(lines[:, 2]).all()
+
+
+def test_port_edf_round_trip(make_args):
+    """A port of 32 lines is stored in two 16-bit channels and read back
+    exactly, next to the analog channels."""
+    args = make_args(digital_mode='port', digitalinput='0:31', slave='Dev2',
+                     slave_analoginput='0:1', slave_digitalinput='0:7',
+                     n_chan=8)
+    rng = default_rng(0)
+    words = rng.integers(0, 2 ** 32, (2, 2000), dtype=uint32)
+    words[:, :3] = [[0, 2 ** 32 - 1, 0x12345678], [0, 0xff, 0x80]]
+    words[1] &= 0xff
+    data = zeros((8, 2000))
+    data[:6] = rng.uniform(-1, 1, (6, 2000))
+    data[6:] = words
+
+    edf = ExportEdf()
+    edf.open(args)
+    for i in range(0, 2000, 300):
+        edf.write(data[:, i:i + 300])
+    edf.close()
+
+    reader = EdfReader(args.edf)
+    assert reader.labels[6:] == ['D0[0:15]', 'D0[16:31]', 'D1[0:15]']
+    low, high, slave = (reader.read(i).round().astype(uint32)
+                        for i in range(6, 9))
+    assert_array_equal(low + (high << 16), words[0])
+    assert_array_equal(slave, words[1])
+    assert abs(reader.read(5) - data[5]).max() < 1e-4
+    assert_array_equal(unpack(low + (high << 16), [31])[0],
+                       words[0] >> 31)
@@ -0,0 +1,79 @@
+from numpy import arange, sin, tile
+
+from ..rw.edf import EdfReader, ExportEdf
+
+
+def _n_records(filename):
+    with open(filename, 'rb') as f:
+        return int(f.read(256)[236:244])
+
+
+def test_n_records_unknown_until_updated(make_args):
+    """A file which was not closed says -1 records (not 0) until the header
+    is updated, so that readers count the records from its size."""
+    args = make_args(edf_header=0)
+    edf = ExportEdf()
+    edf.open(args)
+    edf.f.flush()
+    assert _n_records(args.edf) == -1
+
+    data = tile(arange(2500) / 2500 - 0.5, (args.n_chan, 1))
+    edf.write(data)
+    edf.f.flush()
+    assert _n_records(args.edf) == -1
+    assert EdfReader(args.edf).header['n_records'] == 2
+
+    edf.close()
+    assert _n_records(args.edf) == 2
+
+
+def test_n_records_updated_while_writing(make_args):
+    args = make_args(edf_header=1)
+    edf = ExportEdf()
+    edf.open(args)
+    edf.write(tile(arange(3000) / 3000 - 0.5, (args.n_chan, 1)))
+    edf.f.flush()
+    assert _n_records(args.edf) == 3
+    edf.close()
+
+
+def test_preallocated_not_closed(make_args):
+    """After a crash, the zeros of the preallocated extent are not records."""
+    args = make_args(edf_prealloc=1, edf_header=10)
+    edf = ExportEdf()
+    edf.open(args)
+    data = tile(arange(5000) / 5000 - 0.5, (args.n_chan, 1))
+    edf.write(data)
+    edf.f.flush()
+    assert _n_records(args.edf) == 0  # before the first extent
+
+    reader = EdfReader(args.edf)
+    assert reader.header['n_records'] == 5
+    assert abs(reader.read(0) - data[0]).max() < 1e-4
+
+    edf.write(data)  # the header is updated at 10 records
+    edf.f.flush()
+    assert _n_records(args.edf) == 10
+    assert EdfReader(args.edf).header['n_records'] == 10
+    edf.close()
+
+
+def test_partial_buffers(make_args):
+    """Buffers which do not divide the record are carried to the next
+    record, and the incomplete record at the end is not written."""
+    args = make_args(edf_flush=0)
+    edf = ExportEdf()
+    edf.open(args)
+    data = tile(sin(arange(3500) / 50) * 0.9, (args.n_chan, 1))
+    data[1] *= -1
+    for i in range(0, 3500, 370):
+        edf.write(data[:, i:i + 370])
+    assert edf.n_records == 3
+    assert edf.idx == 500
+    edf.close()
+
+    reader = EdfReader(args.edf)
+    assert reader.header['n_records'] == 3
+    for chan in range(args.n_chan):
+        assert abs(reader.read(chan) - data[chan, :3000]).max() < 1e-4
+    assert abs(reader.read(1, 1.2, 2.5) - data[1, 1200:2500]).max() < 1e-4
@@ -0,0 +1,38 @@
+from numpy import cumsum, zeros
+from numpy.random import default_rng
+from numpy.testing import assert_allclose
+
+from ..proc.filters import FilterBank
+
+
+def _direct_form(sos, x):
+    """Filter each sample, one section after the other (Direct Form I)."""
+    y = x.copy()
+    for b0, b1, b2, _, a1, a2 in sos:
+        out = zeros(y.shape)
+        for chan in range(y.shape[0]):
+            x1 = x2 = y1 = y2 = 0.
+            for i, x0 in enumerate(y[chan]):
+                y0 = b0 * x0 + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+                x1, x2, y1, y2 = x0, x1, y0, y1
+                out[chan, i] = y0
+        y = out
+    return y
+
+
+def test_uneven_buffers():
+    """The state is carried between buffers of any size (also shorter than
+    one block, and not multiples of it)."""
+    x = default_rng(0).standard_normal((3, 1000))
+    bank = FilterBank(3, 1000, 'notch:60,bandpass:1:200', block=64)
+    ends = cumsum([100, 37, 500, 1, 362])
+    out = [bank.apply(x[:, start:end])
+           for start, end in zip([0, *ends[:-1]], ends)]
+    assert [o.shape[1] for o in out] == [100, 37, 500, 1, 362]
+
+    expected = _direct_form(bank.sos, x)
+    start = 0
+    for o in out:
+        assert_allclose(o, expected[:, start:start + o.shape[1]], atol=1e-9)
+        start += o.shape[1]
+    assert bank.stats()['buffers'] == 5
@@ -0,0 +1,37 @@
+from numpy import arange, int16
+from numpy.testing import assert_allclose, assert_array_equal
+
+from ..rw.calibration import Calibration
+from ..rw.flat import ExportFlat, FlatReader
+from ..rw.raw import RawScale
+
+
+def test_raw_round_trip(make_args, tmp_path):
+    """The counts are written as they are, in segments, and the sidecar
+    converts them into physical units (ADC, then calibration)."""
+    args = make_args(analoginput='0:1', n_chan=2, raw=True, file_format='flat',
+                     edf=str(tmp_path / 'rec.bin'), edf_segment=1)
+    calibration = Calibration(['a', 'b'], ['uV', 'mV'], [-1, -1], [1, 1],
+                              [1e6, -2], [0, 5])
+    raw = RawScale(args, [0.001, -0.002], [3e-5, 3.1e-5])
+    counts = (arange(2 * 2500).reshape(2, -1) * 7 % 65536 - 32768).astype(int16)
+
+    flat = ExportFlat()
+    flat.open(args, raw, calibration)
+    for i in range(0, 2500, 250):
+        flat.write(counts[:, i:i + 250])
+    flat.f.flush()
+    assert FlatReader(args.edf).n_samples == 2500  # from the size of the file
+    flat.close()
+
+    reader = FlatReader(args.edf)
+    assert reader.n_samples == 2500
+    assert len(reader.segments) == 3
+    assert reader.labels == ['a', 'b']
+    assert reader.units == ['uV', 'mV']
+    for chan in range(2):
+        assert_array_equal(reader.read(chan, physical=False), counts[chan])
+        volt = counts[chan] * raw.gain[chan] + raw.offset[chan]
+        expected = volt * calibration.gain[chan] + calibration.offset[chan]
+        assert_allclose(reader.read(chan), expected)
+        assert_allclose(reader.read(chan, 0.9, 2.1), expected[900:2100])
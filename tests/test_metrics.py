@@ -0,0 +1,80 @@
+from csv import reader
+from time import sleep
+
+from numpy import zeros
+from numpy.testing import assert_allclose
+
+from ..rw.metrics import (DURATION_EDGES, DAQmxErrorSamplesNoLongerAvailable,
+                          Metrics, duration_percentile, format_status)
+
+
+class _DAQError(Exception):
+    def __init__(self, error):
+        self.error = error
+
+
+def _callback(metrics, reads, duration=0.):
+    metrics.start()
+    for name, value in reads.items():
+        if isinstance(value, Exception):
+            metrics.error(name, value)
+        else:
+            metrics.read(name, *value)
+    sleep(duration)
+    metrics.stop()
+
+
+def test_counters(tmp_path):
+    csv_file = tmp_path / 'metrics.csv'
+    metrics = Metrics(['AI', 'DI'], 0.01, str(csv_file))
+    _callback(metrics, {'AI': (100, 100, 5), 'DI': (100, 100, 0)})
+    _callback(metrics, {'AI': (80, 100, 40), 'DI': (100, 100, 3)}, 0.002)
+    _callback(metrics, {'AI': _DAQError(DAQmxErrorSamplesNoLongerAvailable)})
+    _callback(metrics, {'AI': (100, 100, 2), 'DI': _DAQError(-1)})
+    metrics.close()
+
+    m = metrics.summary()
+    assert m['callbacks'] == 4
+    assert m['tasks']['AI'] == {'read': 280, 'requested': 300,
+                                'short_reads': 1, 'backlog': 2,
+                                'max_backlog': 40, 'errors': 1,
+                                'overflows': 1}
+    assert m['tasks']['DI']['read'] == 200
+    assert m['tasks']['DI']['errors'] == 1
+    assert m['tasks']['DI']['overflows'] == 0
+    assert m['duration_hist'].sum() == 4
+    assert m['max_duration'] >= 0.002
+    assert 0 < duration_percentile(m, 50) <= duration_percentile(m, 99)
+    assert duration_percentile(m, 99) <= m['max_duration']
+
+    with open(csv_file, newline='') as f:
+        rows = list(reader(f))
+    assert len(rows) == 5
+    n_cols = 3 + 3 * 2 + len(DURATION_EDGES) + 1
+    assert all(len(row) == n_cols for row in rows)
+    assert rows[2][3:9] == ['80', '40', '0', '100', '3', '0']
+    assert rows[3][6:9] == ['', '', '']  # DI was not read after the error
+    assert [int(x) for x in rows[-1][9:]] == m['duration_hist'].tolist()
+
+
+def test_percentile():
+    hist = zeros(len(DURATION_EDGES) + 1, dtype=int)
+    hist[3] = 9
+    hist[10] = 1
+    m = {'duration_hist': hist, 'max_duration': 1.}
+    assert_allclose(duration_percentile(m, 50), DURATION_EDGES[3])
+    assert_allclose(duration_percentile(m, 99), DURATION_EDGES[10])
+    hist[-1] = 100  # longer than the last edge
+    assert duration_percentile(m, 99) == 1.
+    assert duration_percentile({'duration_hist': hist * 0,
+                                'max_duration': 0.}, 50) == 0.
+
+
+def test_format_status():
+    metrics = Metrics(['AI'], 0.01)
+    _callback(metrics, {'AI': (100, 100, 5)})
+    status = {'metrics': metrics.summary(), 'edf': None, 'detector': None,
+              'stream': None}
+    lines = format_status(status)
+    assert lines[0] == 'callbacks: 1'
+    assert lines[2].startswith('duration percentiles: 50% <= ')
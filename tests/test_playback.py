@@ -0,0 +1,70 @@
+from time import perf_counter, sleep
+
+from numpy import arange, concatenate, sin, uint32, zeros
+from numpy.testing import assert_array_equal
+
+from ..rw.edf import ExportEdf
+from ..rw.playback import EdfPlayer, playback_args
+
+
+def _write_edf(make_args, tmp_path):
+    """3 s with 4 analog channels and a port of 32 lines."""
+    args = make_args(digital_mode='port', digitalinput='0:31', n_chan=5,
+                     edf=str(tmp_path / 'rec.edf'))
+    t = arange(3000) / 1000
+    data = zeros((5, 3000))
+    data[:4] = 0.9 * sin(2 * 3.14 * arange(1, 5)[:, None] * t)
+    data[4] = arange(3000, dtype=uint32) * 1431655  # wraps around 2 ** 32
+    edf = ExportEdf()
+    edf.open(args)
+    edf.write(data)
+    edf.close()
+    return args.edf, data
+
+
+def _play(make_args, filename, speed):
+    args = make_args(play=filename, speed=speed, buffer_size=0.1)
+    playback_args(args)
+    buffers = []
+
+    def funct(data, timestamp):
+        buffers.append(data.copy())
+        player.pool.release(data)
+
+    player = EdfPlayer(args, funct)
+    t0 = perf_counter()
+    player.StartTask()
+    while player.thread.is_alive():
+        sleep(0.01)
+    elapsed = perf_counter() - t0
+    player.ClearTask()
+    return args, player, concatenate(buffers, axis=1), elapsed
+
+
+def test_channels(make_args, tmp_path):
+    """The analog channels are in physical units and the two 16-bit
+    channels of the port are packed again into one row."""
+    filename, data = _write_edf(make_args, tmp_path)
+    args, player, x, _ = _play(make_args, filename, 0)
+
+    assert args.n_chan == 5
+    assert args.s_freq == 1000
+    assert args.digital_mode == 'port'
+    assert args.digitalinput == '0:31'
+    assert args.slave is None
+    assert player.ports == [[4, 5]]
+    assert x.shape == (5, 3000)
+    assert abs(x[:4] - data[:4]).max() < 1e-4
+    assert_array_equal(x[4], data[4])
+    assert player.status()['metrics']['callbacks'] == 30
+
+
+def test_pacing(make_args, tmp_path):
+    """The buffers are sent at the speed of the recordings times speed."""
+    filename, _ = _write_edf(make_args, tmp_path)
+    _, _, x, elapsed = _play(make_args, filename, 4)
+    assert x.shape[1] == 3000
+    assert 0.7 < elapsed < 1.2  # 3 s at 4x
+
+    _, _, _, elapsed = _play(make_args, filename, 0)
+    assert elapsed < 0.5
@@ -0,0 +1,58 @@
+from time import sleep
+
+from ..rw.daqmx import DAQmxReader
+from ..rw.pool import FramePool
+
+
+def test_refcount():
+    """A frame is reused only once all its consumers have released it."""
+    pool = FramePool(2, 10, n_frames=2, dtype='int16')
+    a = pool.get(2)
+    b = pool.get(1)
+    assert a.shape == (2, 10)
+    assert a.dtype == 'int16'
+    assert pool.free == []
+
+    pool.release(a)
+    assert id(a) in pool.users
+    pool.release(b)
+    assert pool.get(1) is b  # b was free, a was not
+
+    pool.release(a)
+    assert pool.get(3) is a
+    assert pool.n_allocated == 2
+    pool.release(a[:, :5])  # a view is ignored
+    assert pool.users[id(a)][1] == 3
+
+
+def test_allocate_when_empty():
+    pool = FramePool(1, 4, n_frames=1)
+    frames = [pool.get(1) for _ in range(3)]
+    assert pool.n_allocated == 3
+    assert len({id(x) for x in frames}) == 3
+    for frame in frames:
+        pool.release(frame)
+        pool.release(frame)  # released twice, only once in free
+    assert len(pool.free) == 3
+    assert pool.users == {}
+
+
+def test_reader_releases(make_args):
+    """The reader, the EDF writer and the consumer share the frames, which
+    are all released at the end."""
+    frames = []
+
+    def funct(data, timestamp):
+        frames.append(id(data))
+        reader.pool.release(data)
+
+    reader = DAQmxReader(make_args(), funct)
+    reader.StartTask()
+    sleep(1)
+    reader.StopTask()
+    reader.edf.close()
+    reader.ClearTask()
+
+    assert len(frames) >= 5
+    assert reader.pool.users == {}
+    assert reader.pool.n_allocated < len(frames)  # they were reused
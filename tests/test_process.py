@@ -0,0 +1,47 @@
+from multiprocessing.shared_memory import SharedMemory
+from time import sleep
+
+from pytest import raises
+
+from ..rw.edf import EdfReader
+from ..rw.process import AcquisitionError, AcquisitionProcess
+
+
+def _run(reader, duration=2):
+    reader.StartTask()
+    sleep(duration)
+    try:
+        reader.StopTask()
+    finally:
+        reader.ClearTask()
+
+
+def test_acquire(make_args):
+    """The buffers come through shared memory, the EDF file is written by
+    the other process, and the shared memory is removed at the end."""
+    frames = []
+
+    def funct(data, timestamp):
+        frames.append(data[0, 0])
+        reader.pool.release(data)
+
+    args = make_args(process=True)
+    reader = AcquisitionProcess(args, funct)
+    _run(reader)
+    assert len(frames) >= 5
+    assert reader.status()['shared']['read'] == len(frames)
+    assert EdfReader(args.edf).header['n_records'] >= 1
+    with raises(FileNotFoundError):
+        SharedMemory(reader.ring.name)
+
+
+def test_error_clears(make_args, tmp_path):
+    """An error in the other process is raised by StopTask, and the shared
+    memory is removed anyway."""
+    args = make_args(process=True, play=str(tmp_path / 'missing.edf'),
+                     speed=1)
+    reader = AcquisitionProcess(args, lambda data, t: None)
+    with raises(AcquisitionError, match='missing.edf'):
+        _run(reader, 0.5)
+    with raises(FileNotFoundError):
+        SharedMemory(reader.ring.name)
@@ -0,0 +1,73 @@
+from numpy import arange, concatenate, sin
+from numpy.random import default_rng
+from numpy.testing import assert_allclose, assert_array_equal
+from pytest import raises
+
+from ..proc.decimate import MinMaxPyramid
+from ..rw.edf import ExportEdf
+from ..rw.pyramid import PyramidReader
+
+
+def test_minmax_pyramid():
+    """The blocks are the same whatever the size of the buffers, and the
+    last incomplete block of each level is computed by flush."""
+    data = default_rng(0).standard_normal((3, 2345))
+    pyramid = MinMaxPyramid(3, [10, 100, 1000])
+    out = [[], [], []]
+    start = 0
+    for n in (37, 250, 13, 1000, 1, 1044):
+        for level, blocks in zip(out, pyramid.push(data[:, start:start + n])):
+            level.append(blocks)
+        start += n
+    for level, blocks in zip(out, pyramid.flush()):
+        level.append(blocks)
+
+    for factor, level in zip((10, 100, 1000), out):
+        blocks = concatenate(level)
+        n_blocks = -(-2345 // factor)
+        assert blocks.shape == (n_blocks, 3, 2)
+        for i in (0, n_blocks // 2, n_blocks - 1):
+            x = data[:, i * factor:(i + 1) * factor]
+            assert_array_equal(blocks[i, :, 0], x.min(axis=1))
+            assert_array_equal(blocks[i, :, 1], x.max(axis=1))
+
+
+def test_factors():
+    with raises(ValueError):
+        MinMaxPyramid(1, [10, 15])
+    with raises(ValueError):
+        MinMaxPyramid(1, [100, 10])
+
+
+def test_reader(make_args):
+    """The reader chooses the coarsest level with enough blocks, and the
+    blocks are in physical units."""
+    args = make_args(pyramid='10,100')
+    t = arange(2500) / 1000
+    data = 0.9 * sin(2 * 3.14 * arange(1, 5)[:, None] * t)
+    data[2, 1234] = -0.99  # spike
+    edf = ExportEdf()
+    edf.open(args)
+    for i in range(0, 2500, 100):
+        edf.write(data[:, i:i + 100])
+    edf.close()
+
+    reader = PyramidReader(args.edf)
+    assert reader.factors == [10, 100]
+    assert reader.duration == 2  # only the complete records
+    assert reader.labels == ['0', '1', '2', '3']
+
+    x, y, factor = reader.read(n_cols=10)
+    assert factor == 100
+    assert y.shape == (4, 40)
+    assert_array_equal(x[::2], arange(20) / 10)
+    assert_allclose(y[:, 0::2], data[:, :2000].reshape(4, 20, 100).min(-1),
+                    atol=1e-4)
+    assert_allclose(y[:, 1::2], data[:, :2000].reshape(4, 20, 100).max(-1),
+                    atol=1e-4)
+
+    x, y, factor = reader.read(1.2, 1.3, n_cols=10, chans=[2])
+    assert factor == 10
+    assert y.shape == (1, 20)
+    assert x[0] == 1.2
+    assert abs(y.min() + 0.99) < 1e-4
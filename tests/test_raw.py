@@ -0,0 +1,52 @@
+from time import sleep
+
+from numpy import arange, array_equal
+
+from ..rw import DAQmxReader, EdfReader, FlatReader
+from ..rw.simulated import digital_signal
+
+
+def _record(args, duration=1.5):
+    reader = DAQmxReader(args, lambda data, t: reader.pool.release(data))
+    reader.StartTask()
+    sleep(duration)
+    reader.StopTask()
+    reader.edf.close()
+    reader.ClearTask()
+
+
+def test_packed_port_8_lines(make_args, tmp_path):
+    """A port with 16 lines or fewer is stored with the EDF offset."""
+    for file_format, ext in (('edf', 'edf'), ('flat', 'bin')):
+        args = make_args(raw=True, digital_mode='port', digitalinput='0:19',
+                         slave='Dev2', slave_analoginput='0:1',
+                         slave_digitalinput='0:7', n_chan=8,
+                         file_format=file_format,
+                         edf=str(tmp_path / ('rec.' + ext)))
+        _record(args)
+
+        if file_format == 'edf':
+            f = EdfReader(args.edf)
+        else:
+            f = FlatReader(args.edf)
+        words = f.read(8)
+        assert f.labels[8] == 'D1[0:15]'
+        expected = digital_signal(arange(len(words)), [0xff])[0]
+        assert len(words) > 0
+        assert array_equal(words, expected)
+
+
+def test_pack_physical(make_args):
+    """Words of a packed port survive pack and RawScale.physical."""
+    from numpy import empty, uint32
+    from ..rw.raw import RawScale
+
+    args = make_args(raw=True, digital_mode='port', digitalinput='0:7',
+                     n_chan=5)
+    raw = RawScale(args, [0.] * 4, [1.] * 4)
+    words = arange(300, dtype=uint32)
+    frame = empty((raw.n_rows, len(words)), dtype='int16')
+    frame[:4] = 0
+    raw.pack(words, frame[4:5])
+    assert frame[4, 0] == -32768
+    assert array_equal(raw.physical(frame)[4], words)
@@ -0,0 +1,21 @@
+from pytest import raises
+
+from ..rw import recorder
+from ..rw.edf import EdfReader
+
+
+def test_file_closed_on_error(make_args, monkeypatch):
+    """An error while recording stops the acquisition and closes the EDF
+    file (its header has the number of records)."""
+    def status_line(status, elapsed):
+        raise RuntimeError('broken status')
+
+    monkeypatch.setattr(recorder, 'status_line', status_line)
+    monkeypatch.setattr(recorder, 'signal', lambda *x: None)  # keep Ctrl+C
+    args = make_args(status_interval=1.2, duration=0, edf_header=0)
+    with raises(RuntimeError):
+        recorder.record(args)
+
+    with open(args.edf, 'rb') as f:
+        assert int(f.read(256)[236:244]) == 1
+    assert EdfReader(args.edf).header['n_records'] == 1
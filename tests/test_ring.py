@@ -0,0 +1,19 @@
+from numpy import arange
+from numpy.testing import assert_array_equal
+
+from ..proc.ring import RingBuffer
+
+
+def test_sample_position():
+    """Each sample is at its index modulo the length of the buffer, also
+    when a write is longer than the buffer."""
+    ring = RingBuffer(2, 10)
+    x = arange(200).reshape(1, -1).repeat(2, axis=0)
+    start = 0
+    for n in (3, 25, 1, 10, 7, 44, 9):
+        ring.write(x[:, start:start + n])
+        start += n
+        assert ring.idx == start % 10
+        last = arange(max(start - 10, 0), start)
+        assert_array_equal(ring.data[0, last % 10], last)
+        assert_array_equal(ring.unrolled()[1, -len(last):], last)
@@ -0,0 +1,63 @@
+from numpy import arange, hanning, pi, sin
+from numpy.random import default_rng
+from numpy.testing import assert_allclose
+from pytest import importorskip
+
+from ..proc.spectrum import Spectrum
+
+
+def _push(spectrum, x, n_smp):
+    """Push the data in buffers of n_smp samples, updating after every three
+    buffers (as the timer of the GUI)."""
+    for i in range(0, x.shape[1], n_smp):
+        spectrum.push(x[:, i:i + n_smp])
+        if i % (3 * n_smp) == 0:
+            spectrum.update()
+    spectrum.update()
+    return spectrum.psd
+
+
+def _signal(n_smp=4000, s_freq=1000):
+    t = arange(n_smp) / s_freq
+    x = default_rng(0).standard_normal((3, n_smp))
+    x[0] += 3 * sin(2 * pi * 50 * t)
+    x[1] += 5
+    return x
+
+
+def test_same_as_welch():
+    signal = importorskip('scipy.signal')
+    x = _signal()
+    spectrum = Spectrum(3, 1000, 256, n_avg=100)
+    psd = _push(spectrum, x, 90)
+
+    n_seg = (4000 - 256) // 128 + 1
+    assert spectrum.n_seg == n_seg
+    freq, expected = signal.welch(x[:, :(n_seg + 1) * 128], 1000,
+                                  window=hanning(256), noverlap=128,
+                                  detrend='constant')
+    assert_allclose(spectrum.freq, freq)
+    assert_allclose(psd, expected, rtol=1e-10, atol=1e-12)
+
+
+def test_power():
+    """The PSD integrates to the variance, and the sine is at 50 Hz."""
+    x = _signal()
+    spectrum = Spectrum(3, 1000, 500, n_avg=100)
+    assert spectrum.update() is None
+    psd = _push(spectrum, x, 100)
+
+    df = spectrum.freq[1]
+    assert_allclose(psd.sum(axis=1) * df, x.var(axis=1), rtol=0.1)
+    assert spectrum.freq[psd[0].argmax()] == 50
+    assert psd[1, 0] < 0.1  # the offset is removed
+
+
+def test_first_spectrum():
+    """The first spectrum is available as soon as there is one segment."""
+    spectrum = Spectrum(1, 1000, 256)
+    spectrum.push(_signal()[:1, :255])
+    assert spectrum.update() is None
+    spectrum.push(_signal()[:1, 255:256])
+    assert spectrum.update() is not None
+    assert spectrum.n_seg == 1
@@ -0,0 +1,73 @@
+from socket import AF_UNIX, SOCK_STREAM, socket
+from threading import Thread
+from time import sleep
+
+from numpy import arange, array_equal, ones
+from pytest import raises
+
+from ..rw import stream
+from ..rw.stream import N_CHAN, StreamServer, subscribe
+
+
+def test_roundtrip(tmp_path):
+    address = str(tmp_path / 'stream.sock')
+    released = []
+    server = StreamServer(address, 4, release=released.append)
+    received = []
+
+    def _client():
+        for seq, timestamp, data in subscribe(address, [1, 3]):
+            received.append((seq, data.copy()))
+            if len(received) == 3:
+                break
+
+    client = Thread(target=_client)
+    client.start()
+    while not server.subscribers:
+        sleep(0.01)
+    frames = [arange(40.).reshape(4, 10) + i for i in range(3)]
+    for frame in frames:
+        server.write(frame, 0.)
+    client.join(5)
+    server.close()
+
+    assert [seq for seq, _ in received] == [0, 1, 2]
+    for (_, data), frame in zip(received, frames):
+        assert array_equal(data, frame[[1, 3]])
+    assert len(released) == 3
+
+
+def test_close_with_stalled_client(tmp_path):
+    """A client which never reads does not block close."""
+    address = str(tmp_path / 'stream.sock')
+    released = []
+    server = StreamServer(address, 64, max_size=5, release=released.append)
+
+    sock = socket(AF_UNIX, SOCK_STREAM)
+    sock.connect(address)
+    sock.sendall(N_CHAN.pack(0))
+    while not server.subscribers:
+        sleep(0.01)
+    for _ in range(200):
+        server.write(ones((64, 10000)), 0.)
+
+    closing = Thread(target=server.close, daemon=True)
+    closing.start()
+    closing.join(5)
+    assert not closing.is_alive()
+    sock.close()
+
+    for _ in range(50):  # the thread of the client releases the buffers
+        if len(released) == 200:
+            break
+        sleep(0.1)
+    assert len(released) == 200
+
+
+def test_no_unix_socket(tmp_path, monkeypatch):
+    """Without Unix sockets (Windows), a path is a clear error, and TCP
+    still works."""
+    monkeypatch.setattr(stream, 'AF_UNIX', None)
+    with raises(ValueError, match='host:port'):
+        StreamServer(str(tmp_path / 'stream.sock'), 4)
+    StreamServer('localhost:0', 4).close()
@@ -0,0 +1,113 @@
+from threading import Event, Thread
+from time import sleep
+
+from numpy import zeros
+from pytest import raises, warns
+
+from ..rw.writer import AsyncWriter
+
+
+class _FailingWriter():
+    """Writer whose disk is full after n_ok buffers."""
+    def __init__(self, n_ok):
+        self.n_ok = n_ok
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        if len(self.written) == self.n_ok:
+            raise OSError(28, 'No space left on device')
+        self.written.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+class _SlowWriter():
+    """Writer which waits until the disk is ready."""
+    def __init__(self):
+        self.ready = Event()
+        self.written = []
+
+    def write(self, data):
+        self.ready.wait()
+        self.written.append(data)
+
+    def close(self):
+        pass
+
+
+def _start(policy, max_size=2):
+    """AsyncWriter whose thread is busy with the first buffer."""
+    released = []
+    writer = _SlowWriter()
+    w = AsyncWriter(writer, max_size, policy, release=released.append)
+    w.write(zeros((2, 5)))
+    while w.queue.qsize():  # taken by the thread
+        sleep(0.001)
+    return w, writer, released
+
+
+def test_spill():
+    w, writer, released = _start('spill')
+    frames = [zeros((2, 5)) for _ in range(5)]
+    for frame in frames:
+        w.write(frame)
+    assert [id(x) for x in released] == [id(x) for x in frames[2:]]
+    writer.ready.set()
+    w.close()
+
+    assert len(writer.written) == 3
+    assert len(released) == 6
+    stats = w.stats()
+    assert (stats['written'], stats['dropped'], stats['blocked']) == (3, 3, 0)
+    assert stats['max_depth'] == 2
+
+
+def test_grow():
+    w, writer, released = _start('grow')
+    for _ in range(5):
+        w.write(zeros((2, 5)))
+    assert w.stats()['max_depth'] == 5
+    writer.ready.set()
+    w.close()
+    assert len(writer.written) == 6
+    stats = w.stats()
+    assert (stats['written'], stats['dropped'], stats['blocked']) == (6, 0, 0)
+
+
+def test_block():
+    w, writer, released = _start('block')
+    t = Thread(target=lambda: [w.write(zeros((2, 5))) for _ in range(3)])
+    t.start()
+    sleep(0.05)
+    assert t.is_alive()  # the third buffer waits for the disk
+    writer.ready.set()
+    t.join(5)
+    w.close()
+    assert len(writer.written) == 4
+    assert w.stats()['blocked'] == 1
+
+
+def test_policy():
+    with raises(ValueError):
+        AsyncWriter(_SlowWriter(), policy='wait')
+
+
+def test_error_does_not_raise():
+    released = []
+    writer = _FailingWriter(3)
+    w = AsyncWriter(writer, max_size=4, release=released.append)
+    with warns(UserWarning):
+        for _ in range(10):
+            w.write(zeros((2, 5)))
+            sleep(0.01)
+        w.close()
+
+    assert len(writer.written) == 3
+    assert len(released) == 10
+    assert writer.closed
+    stats = w.stats()
+    assert stats['written'] == 3
+    assert stats['failed'] == 7
+    assert 'No space left' in stats['error']
@@ -1,2 +1,6 @@
+from .average import AveragePanel
 from .controlpanel import ControlPanel
+from .health import HealthPanel
 from .traces import Traces
+from .mainwindow import MainWindow
+from .overview import Overview
@@ -0,0 +1,65 @@
+from math import ceil, sqrt
+
+from PyQt4.QtCore import Qt, QTimer
+from pyqtgraph import FillBetweenItem, GraphicsLayoutWidget, intColor, mkPen
+
+
+class AveragePanel(GraphicsLayoutWidget):
+    """Widget with the average response of each analog channel around the
+    edges of the digital lines (one color for each line), with the standard
+    error of the mean as a shaded area.
+
+    Parameters
+    ----------
+    widgets : dict
+        widgets of the main window (it uses 'daq')
+    interval : float
+        time (in s) between two updates
+    """
+    def __init__(self, widgets, interval=0.5):
+        super().__init__()
+        self.widgets = widgets
+        averager = widgets['daq'].averager
+        lines = widgets['daq'].average_lines
+
+        self.mean = []  # for each channel, one curve for each line
+        self.lower = []
+        self.upper = []
+        n_cols = ceil(sqrt(averager.n_chan))
+        for chan in range(averager.n_chan):
+            plot = self.addPlot(title=str(chan))
+            plot.addLine(x=0, pen=mkPen('w', width=1, style=Qt.DotLine))
+            mean, lower, upper = [], [], []
+            for i, line in enumerate(lines):
+                color = intColor(i, hues=max(len(lines), 2))
+                lower.append(plot.plot(pen=None))
+                upper.append(plot.plot(pen=None))
+                fill = color.lighter()
+                fill.setAlpha(60)
+                plot.addItem(FillBetweenItem(lower[-1], upper[-1], brush=fill))
+                mean.append(plot.plot(pen=color,
+                                      name='DI {}'.format(line)))
+            self.mean.append(mean)
+            self.lower.append(lower)
+            self.upper.append(upper)
+            if (chan + 1) % n_cols == 0:
+                self.nextRow()
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.update_average)
+        self.timer.start(int(interval * 1000))
+
+    def update_average(self):
+        averager = self.widgets['daq'].averager
+        t = averager.time
+        mean = averager.mean
+        sem = averager.sem
+        for i, n in enumerate(averager.count):
+            if n == 0:
+                continue
+            for chan in range(averager.n_chan):
+                self.mean[chan][i].setData(x=t, y=mean[i, chan])
+                self.lower[chan][i].setData(x=t, y=mean[i, chan] -
+                                            sem[i, chan])
+                self.upper[chan][i].setData(x=t, y=mean[i, chan] +
+                                            sem[i, chan])
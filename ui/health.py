@@ -0,0 +1,67 @@
+from PyQt4.QtCore import QTimer
+from PyQt4.QtGui import (QLabel,
+                         QVBoxLayout,
+                         QWidget,
+                         )
+
+from ..rw.metrics import format_status
+
+
+class HealthPanel(QWidget):
+    """Widget with the timing and the state of the acquisition.
+
+    Parameters
+    ----------
+    widgets : dict
+        widgets of the main window (it uses 'daq')
+    interval : float
+        time (in s) between two updates
+    """
+    def __init__(self, widgets, interval=1):
+        super().__init__()
+        self.widgets = widgets
+
+        self.label = QLabel('Not acquiring')
+        self.label.setStyleSheet('font-family: monospace')
+
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.label)
+        layout.addStretch(1)
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.update_metrics)
+        self.timer.start(int(interval * 1000))
+
+    def update_metrics(self):
+        daq = self.widgets['daq']
+        try:
+            reader = daq.obj.reader
+        except AttributeError:  # not started yet
+            return
+
+        status = reader.status()
+        if not status:  # the acquisition process has not started yet
+            return
+        lines = format_status(status)
+
+        if daq.filter is not None:
+            f = daq.filter.stats()
+            lines.append('display filter: {:.1f} ms per buffer (max {:.1f} '
+                         'ms)'.format(f['mean_cost'] * 1000,
+                                      f['max_cost'] * 1000))
+
+        if daq.averager is not None:
+            a = daq.averager.stats()
+            lines.append('average: epochs {} (pending {}, skipped {}), {:.1f} '
+                         'ms per buffer (max {:.1f} ms)'.format(
+                             ', '.join(str(n) for n in a['epochs']),
+                             a['pending'], a['skipped'],
+                             a['mean_cost'] * 1000, a['max_cost'] * 1000))
+
+        d = daq.stats()
+        lines.append('display: latency {:.0f} ms (max {:.0f} ms), '
+                     'skipped {}'.format(d['latency'] * 1000,
+                                         d['max_latency'] * 1000,
+                                         d['skipped']))
+
+        self.label.setText('\n'.join(lines))
@@ -0,0 +1,67 @@
+from PyQt4.QtCore import (QSettings,
+                          Qt,
+                          )
+from PyQt4.QtGui import (QDockWidget,
+                         QHBoxLayout,
+                         QMainWindow,
+                         QWidget,
+                         )
+
+from .average import AveragePanel
+from .controlpanel import ControlPanel
+from .health import HealthPanel
+from .traces import Traces
+
+settings = QSettings("OpBox", "OpBox")
+VERSION = 2
+
+
+class MainWindow(QMainWindow):
+    """Main Window that holds all the widgets (traces with raw signal, camera
+    and other behavioral data.)
+
+    Parameters
+    ----------
+    args : argparse.Namespace
+        arguments specified by the user
+    """
+    def __init__(self, args):
+        super().__init__()
+
+        daq = Traces(args)
+        dock_daq = QDockWidget('DAQ', self)
+        dock_daq.setWidget(daq)
+        dock_daq.setObjectName('DAQ')
+        dock_daq.setFeatures(QDockWidget.DockWidgetMovable)
+        self.addDockWidget(Qt.TopDockWidgetArea, dock_daq)
+
+        widgets = {'daq': daq,
+                   }
+        if daq.averager is not None:
+            average = AveragePanel(widgets)
+            dock_average = QDockWidget('Average', self)
+            dock_average.setWidget(average)
+            dock_average.setObjectName('Average')
+            dock_average.setFeatures(QDockWidget.DockWidgetMovable)
+            self.addDockWidget(Qt.BottomDockWidgetArea, dock_average)
+            widgets['average'] = average
+        self.controlpanel = ControlPanel(widgets)
+        self.healthpanel = HealthPanel(widgets)
+
+        central = QWidget()
+        layout = QHBoxLayout(central)
+        layout.addWidget(self.controlpanel)
+        layout.addWidget(self.healthpanel, 1)
+        self.setCentralWidget(central)
+
+        window_geometry = settings.value('window/geometry')
+        if window_geometry is not None:
+            self.restoreGeometry(window_geometry)
+        window_state = settings.value('window/state')
+        if window_state is not None:
+            self.restoreState(window_state, float(VERSION))
+
+    def closeEvent(self, event):
+        settings.setValue('window/geometry', self.saveGeometry())
+        settings.setValue('window/state', self.saveState(float(VERSION)))
+        event.accept()
@@ -0,0 +1,73 @@
+from os.path import basename
+from time import time
+
+from numpy import empty
+from PyQt4.QtCore import QTimer
+from PyQt4.QtGui import (QLabel,
+                         QVBoxLayout,
+                         QWidget,
+                         )
+from pyqtgraph import ViewBox
+
+from ..rw.pyramid import PyramidReader
+from .traces import Figure
+
+
+class Overview(QWidget):
+    """Widget to review long recordings from their min/max pyramid (see
+    ExportPyramid).
+
+    Parameters
+    ----------
+    filename : str
+        path to the recordings (such as 'rec.edf') or to the description of
+        the pyramid ('rec_pyramid.json')
+
+    Notes
+    -----
+    All the plots share the x-axis. When the time span changes (zoom or pan
+    with the mouse), the span is read again from the coarsest level which has
+    enough blocks for the width of the plots, so the cost of drawing does not
+    depend on the duration of the recordings.
+    """
+    def __init__(self, filename):
+        super().__init__()
+        self.setWindowTitle(basename(filename))
+        self.pyramid = PyramidReader(filename)
+        n_chan = len(self.pyramid.labels)
+
+        self.figure = Figure(n_chan, empty(0), psd=False)
+        self.label = QLabel('')
+        self.label.setStyleSheet('font-family: monospace')
+        layout = QVBoxLayout(self)
+        layout.addWidget(self.figure, 1)
+        layout.addWidget(self.label)
+
+        # redraw once the zoom is over, not at each step
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.render)
+
+        self.views = [p.getViewBox() for p in self.figure.plot]
+        for i, view in enumerate(self.views):
+            self.figure.getItem(i, 0).setLabel(
+                'left', self.pyramid.labels[i], units=self.pyramid.units[i])
+            if i > 0:
+                view.setXLink(self.views[0])
+        self.views[0].sigXRangeChanged.connect(lambda *x: self.timer.start(50))
+        self.views[0].setXRange(0, self.pyramid.duration, padding=0)
+        for view in self.views:
+            view.disableAutoRange(axis=ViewBox.XAxis)
+
+    def render(self):
+        """Draw the time span which is visible."""
+        start, end = self.views[0].viewRange()[0]
+        n_cols = int(self.views[0].width()) or self.width()
+        t0 = time()
+        x, y, factor = self.pyramid.read(max(start, 0), end, max(n_cols, 1))
+        self.figure.x_axis = x
+        self.figure.update(y)
+        self.label.setText('{:.1f} s to {:.1f} s: min and max of {} samples, '
+                           '{} blocks, {:.0f} ms'.format(
+                               start, end, factor, len(x) // 2,
+                               (time() - t0) * 1000))
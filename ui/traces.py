@@ -1,12 +1,16 @@
-from numpy import arange, zeros, ndarray, NaN, isnan, append, delete
-from PyDAQmx.DAQmxFunctions import DAQError
-from PyQt4.QtCore import Qt, QObject, QThread, pyqtSignal, pyqtSlot
+from time import time
+
+from numpy import arange, concatenate, empty, ndarray, vstack
+from PyQt4.QtCore import Qt, QObject, QThread, QTimer, pyqtSignal, pyqtSlot
 from PyQt4.QtGui import (QHBoxLayout,
                          QWidget,
                          )
 from pyqtgraph import GraphicsLayoutWidget
 
-from ..rw import DAQmxReader
+from ..proc import EventAverager, FilterBank, RingBuffer, Spectrum, minmax
+from ..proc.detect import EVENT_DTYPE
+from ..rw import AcquisitionProcess, DAQmxReader, EdfPlayer
+from ..rw.digital import digital_ports, digital_rows, expand_lines, unpack
 
 
 class Worker(QObject):
@@ -14,6 +18,7 @@ class Worker(QObject):
     data back to Traces to plot them.
     """
     dataReady = pyqtSignal(ndarray, float)
+    eventsReady = pyqtSignal(ndarray)
 
     def __init__(self, args):
         super().__init__()
@@ -21,10 +26,52 @@ class Worker(QObject):
 
     @pyqtSlot()
     def start_task(self):
-        self.reader = DAQmxReader(self.args, self.dataReady.emit)
+        if self.args.process:
+            self.reader = AcquisitionProcess(self.args, self.dataReady.emit,
+                                             self.eventsReady.emit)
+        elif self.args.play is not None:
+            self.reader = EdfPlayer(self.args, self.dataReady.emit,
+                                    self.eventsReady.emit)
+        else:
+            self.reader = DAQmxReader(self.args, self.dataReady.emit,
+                                      self.eventsReady.emit)
         self.reader.StartTask()
 
 
+class SpectrumWorker(QObject):
+    """Thread that computes the spectrum of the recordings at regular
+    intervals, so that the FFT does not slow down the GUI.
+
+    Parameters
+    ----------
+    spectrum : instance of Spectrum
+        where the data is pushed
+    interval : float
+        time (in s) between two updates of the spectrum
+    """
+    psdReady = pyqtSignal(ndarray, ndarray)
+
+    def __init__(self, spectrum, interval):
+        super().__init__()
+        self.spectrum = spectrum
+        self.interval = interval
+
+    @pyqtSlot()
+    def start_timer(self):
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.compute)
+        self.timer.start(int(self.interval * 1000))
+
+    @pyqtSlot()
+    def stop_timer(self):
+        self.timer.stop()
+
+    def compute(self):
+        psd = self.spectrum.update()
+        if psd is not None:
+            self.psdReady.emit(self.spectrum.freq, psd.copy())
+
+
 class Figure(GraphicsLayoutWidget):
     """Widget with the plots of the recordings.
 
@@ -34,17 +81,28 @@ class Figure(GraphicsLayoutWidget):
         number of channels
     x_axis : ndarray
         values to plot on the x-axis (assuming they never change).
+    psd : bool
+        add a plot with the spectrum of each channel
     """
-    def __init__(self, n_chan, x_axis):
+    def __init__(self, n_chan, x_axis, psd=True):
         super().__init__()
         self.plot = []
+        self.events = []
         self.n_chan = n_chan
         self.x_axis = x_axis
+        self.step = 2 if psd else 1  # plots in each row
 
         for i in range(self.n_chan):
-            self.plot.append(self.addPlot().plot())
-            self.plot.append(self.addPlot().plot())
-            self.plot[-1].opts['fftMode'] = True
+            trace_plot = self.addPlot()
+            self.plot.append(trace_plot.plot())
+            self.events.append(trace_plot.plot(pen=None, symbol='t',
+                                               symbolSize=6))
+            if not psd:
+                self.nextRow()
+                continue
+            psd_plot = self.addPlot()
+            psd_plot.setLogMode(y=True)
+            self.plot.append(psd_plot.plot())
             self.nextRow()
 
     def update(self, data):
@@ -54,11 +112,47 @@ class Figure(GraphicsLayoutWidget):
         ----------
         data : ndarray
             nChan x nSampls matrix to plot
+
+        Notes
+        -----
+        The traces are reduced to the min and max for each column of pixels
+        of the plot, so the cost of drawing does not depend on the number of
+        samples.
         """
+        n_cols = int(self.plot[0].getViewBox().width()) or self.width()
+        x_axis, traces = minmax(self.x_axis, data, max(n_cols, 1))
+
         for i in range(self.n_chan):
-            self.plot[i * 2].setData(x=self.x_axis, y=data[i, :])
-            if not isnan(data[i, :]).any():
-                self.plot[i * 2 + 1].setData(x=self.x_axis, y=data[i, :])
+            self.plot[i * self.step].setData(x=x_axis, y=traces[i, :])
+
+    def update_events(self, events, x_events):
+        """Show the events on top of the traces.
+
+        Parameters
+        ----------
+        events : ndarray
+            events (see proc.Detector) in the window
+        x_events : ndarray
+            value on the x-axis of each event
+        """
+        for i in range(len(self.events)):
+            in_chan = events['chan'] == i
+            self.events[i].setData(x=x_events[in_chan],
+                                   y=events['amplitude'][in_chan])
+
+    def update_psd(self, freq, psd):
+        """Update the plots with the power spectral density.
+
+        Parameters
+        ----------
+        freq : ndarray
+            frequency of each value
+        psd : ndarray
+            nChan x nFreq matrix (the spectra of the packed digital ports are
+            not computed, so nChan can be smaller than the number of plots)
+        """
+        for i in range(psd.shape[0]):
+            self.plot[i * 2 + 1].setData(x=freq, y=psd[i, :])
 
 
 class Traces(QWidget):
@@ -68,21 +162,70 @@ class Traces(QWidget):
     ----------
     args : argparse.Namespace
         arguments specified by the user
+
+    Notes
+    -----
+    If args.filter is not None, the analog channels are filtered (see
+    FilterBank) before they are displayed. This does not change the data
+    which is written to EDF (see args.edf_filter).
+
+    If args.detect is not None, the events (which are detected by the reader)
+    in the window are shown as markers on the traces.
+
+    If args.raw, the buffers are in counts of the ADC and they are converted
+    to V here (see RawScale), only for display.
+
+    If args.average is not None, the analog channels (after the display
+    filters) are averaged around the edges of those digital lines (see
+    EventAverager), for AveragePanel.
     """
     def __init__(self, args):
         super().__init__()
         self.args = args
 
-        self.figure = Figure(args.n_chan,
+        # packed digital ports are unpacked into lines only for display
+        self.ports = []
+        if args.digital_mode == 'port':
+            self.ports = digital_ports(args)
+        self.n_analog = args.n_chan - len(self.ports)
+        n_lines = sum(len(lines) for lines in self.ports)
+
+        self.figure = Figure(self.n_analog + n_lines,
                              arange(0, args.window_size, 1 / args.s_freq))
 
         layout = QHBoxLayout()
         layout.addWidget(self.figure, 5)
         self.setLayout(layout)
 
-        self.data = zeros((args.n_chan, int(args.window_size * args.s_freq)))
-        self.data.fill(NaN)
-        self.idx = 0
+        self.data = RingBuffer(args.n_chan, int(args.window_size * args.s_freq))
+        self.spectrum = Spectrum(self.n_analog, args.s_freq,
+                                 int(args.fft_length * args.s_freq))
+
+        self.filter = None
+        self.n_filtered = args.n_chan - digital_rows(args)
+        if args.filter is not None:
+            self.filter = FilterBank(self.n_filtered, args.s_freq, args.filter)
+
+        # epochs around the edges of some digital lines are averaged
+        self.averager = None
+        if args.average is not None:
+            self.average_lines = expand_lines(args.average)
+            self.averager = EventAverager(
+                self.n_filtered, len(self.average_lines), args.s_freq,
+                args.average_pre, args.average_post, args.average_edge,
+                int(args.buffer_size * args.s_freq))
+
+        # the plots are redrawn at a fixed rate, with the most recent data
+        self.events = empty(0, dtype=EVENT_DTYPE)
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.render)
+        self.t_data = None  # time when the most recent buffer was read
+        self.n_pending = 0  # buffers received since the last redraw
+        self.n_rendered = 0
+        self.n_skipped = 0
+        self.latency = 0.
+        self.max_latency = 0.
 
     def start(self):
         """Start acquisition by starting a new thread.
@@ -92,38 +235,162 @@ class Traces(QWidget):
         obj = Worker(self.args)
         self.obj = obj
         obj.dataReady.connect(self.plot_data)
+        obj.eventsReady.connect(self.plot_events)
         obj.moveToThread(thread)
 
         thread.started.connect(obj.start_task)
         thread.start()
         thread.quit()  # why does it go here?
 
+        thread = QThread()
+        self.psd_thread = thread
+        obj = SpectrumWorker(self.spectrum, 1 / self.args.fft_refresh)
+        self.psd_obj = obj
+        obj.psdReady.connect(self.figure.update_psd)
+        obj.moveToThread(thread)
+
+        thread.started.connect(obj.start_timer)
+        thread.start()
+
+        self.timer.start(int(1000 / self.args.refresh))
+
     def stop(self):
         """End acquisition and close edf file if still open.
         """
+        self.timer.stop()
+        self.psd_thread.quit()  # stops the timer of the spectrum
+
         try:
             self.obj.reader.StopTask()
-        except DAQError:
+        except self.obj.reader.Error:
             pass
-        else:
-            if self.obj.reader.edf is not None:
-                self.obj.reader.edf.close()
-            self.obj.reader.ClearTask()
+        finally:
+            try:
+                if self.obj.reader.edf is not None:
+                    self.obj.reader.edf.close()
+            finally:
+                self.obj.reader.ClearTask()  # unlinks the shared memory
 
-    def plot_data(self, data):
-        """Update the data matrix with the recordings and plot it
+    def plot_data(self, data, timestamp=None):
+        """Update the data matrix with the recordings. The plots are redrawn
+        later by render.
 
         Parameters
         ----------
         data : ndarray
             matrix with the incoming recordings
+        timestamp : float
+            time when the recordings were read
+        """
+        frame = data
+        raw = self.obj.reader.raw
+        if raw is not None:
+            data = raw.physical(frame)
+        if self.filter is not None:
+            data = vstack((self.filter.apply(data[:self.n_filtered]),
+                           data[self.n_filtered:]))
+        self.data.write(data)
+        self.spectrum.push(data[:self.n_analog])
+        if self.averager is not None:
+            self.averager.push(data[:self.n_filtered], self.lines(data))
+        self.obj.reader.pool.release(frame)
+
+        self.t_data = timestamp
+        self.n_pending += 1
+
+    def plot_events(self, events):
+        """Keep the events which are in the window. They are shown later by
+        render.
+
+        Parameters
+        ----------
+        events : ndarray
+            events detected in one buffer (see proc.Detector)
+        """
+        self.events = concatenate((self.events, events))
+        first = self.data.n_written - self.data.n_smp
+        self.events = self.events[self.events['sample'] >= first]
+
+    def render(self):
+        """Redraw the plots, if there is new data, and measure how long it
+        took from reading the data to displaying it."""
+        if self.n_pending == 0:
+            return
+        self.n_skipped += self.n_pending - 1
+        self.n_pending = 0
+
+        # sweep displays the buffer as it is, with the cursor moving from left
+        # to right, scroll puts the most recent samples on the right
+        if self.args.display == 'sweep':
+            self.figure.update(self.unpacked(self.data.data))
+            x_events = self.events['sample'] % self.data.n_smp
+        else:
+            self.figure.update(self.unpacked(self.data.unrolled()))
+            x_events = (self.events['sample'] -
+                        (self.data.n_written - self.data.n_smp))
+        if self.args.detect is not None:
+            self.figure.update_events(self.events,
+                                      x_events / self.args.s_freq)
+        self.n_rendered += 1
+
+        if self.t_data is not None:
+            self.latency = time() - self.t_data
+            self.max_latency = max(self.max_latency, self.latency)
+
+    def stats(self):
+        """Statistics about the display.
+
+        Returns
+        -------
+        dict
+            'latency' and 'max_latency' (in s, from reading the data to
+            displaying it), 'rendered' (number of redraws) and 'skipped'
+            (number of buffers which were never displayed on their own,
+            because more recent data arrived before the redraw).
         """
-        self.data = append(self.data, data, axis=1)
-        self.data = delete(self.data, range(data.shape[1]), axis=1)
+        return {'latency': self.latency,
+                'max_latency': self.max_latency,
+                'rendered': self.n_rendered,
+                'skipped': self.n_skipped,
+                }
 
-        # TODO: take into account not integer mod
-        # ? buffer_size = data.shape[1] ?
-        # self.data[:, self.idx:(self.idx + buffer_size)] = data
-        # self.idx = (self.idx + buffer_size) % int(wndw_size * self.args.s_freq)
+    def lines(self, data):
+        """Values of the digital lines in args.average.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_chan X n_samples matrix, with one row for each digital line or
+            for each packed port
 
-        self.figure.update(self.data)
+        Returns
+        -------
+        ndarray
+            n_lines X n_samples matrix with 0 and 1
+        """
+        if not self.ports:
+            return data[[self.n_filtered + i for i in self.average_lines]]
+        port_lines = [(i, line) for i, one_port in enumerate(self.ports)
+                      for line in one_port]
+        return vstack([unpack(data[self.n_analog + port_lines[i][0]],
+                              [port_lines[i][1]])
+                       for i in self.average_lines])
+
+    def unpacked(self, data):
+        """Unpack the lines of the digital ports, if they are packed.
+
+        Parameters
+        ----------
+        data : ndarray
+            n_chan X n_samples matrix, with one row for each packed port
+
+        Returns
+        -------
+        ndarray
+            matrix with one row for each analog channel and digital line
+        """
+        if not self.ports:
+            return data
+        lines = [unpack(data[self.n_analog + i], one_port)
+                 for i, one_port in enumerate(self.ports)]
+        return vstack([data[:self.n_analog]] + lines)